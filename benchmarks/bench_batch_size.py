@@ -0,0 +1,77 @@
+"""Benchmark the model throughput (frames/sec) on CPU for different batch sizes
+
+Usage:
+    python benchmarks/bench_batch_size.py <video-path> [--frames 128] [--batch-sizes 1 4 8 16]
+
+The predictions for every batch size are compared against the ones made with
+the first batch size in the list (1 by default), so it also works as a sanity
+check that batching does not change the results.
+"""
+import argparse
+import time
+
+import cv2
+
+from therapy_aid_tool.models._video_inference import (
+    load_model,
+    preds_from_torch_results,
+    MODEL_SIZE,
+)
+
+
+N_CLASSES = 3
+
+
+def read_frames(source: str, n_frames: int):
+    """Decode the first `n_frames` frames of a video as RGB arrays"""
+    cap = cv2.VideoCapture(source)
+    frames = []
+    for _ in range(n_frames):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame[:, :, ::-1])
+    cap.release()
+    return frames
+
+
+def run(model, frames, batch_size: int):
+    """Run the model over all frames in batches of `batch_size`
+
+    Returns:
+        tuple: (elapsed seconds, list of predictions for each frame)
+    """
+    preds = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        batch = frames[i:i + batch_size]
+        inference = model(batch, size=MODEL_SIZE)
+        for idx in range(len(batch)):
+            preds.append(preds_from_torch_results(inference, N_CLASSES, idx))
+    return time.perf_counter() - start, preds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Video used as input for the model")
+    parser.add_argument("--frames", type=int, default=128,
+                        help="How many frames of the video to use")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    model = load_model(device="cpu")
+    run(model, frames[:1], 1)  # warm up
+
+    reference = None
+    print(f"{'batch size':>10} | {'frames/sec':>10} | "
+          f"same predictions as batch size {args.batch_sizes[0]}")
+    for batch_size in args.batch_sizes:
+        elapsed, preds = run(model, frames, batch_size)
+        if reference is None:
+            reference = preds
+        print(f"{batch_size:>10} | {len(frames) / elapsed:>10.2f} | {preds == reference}")
+
+
+if __name__ == "__main__":
+    main()
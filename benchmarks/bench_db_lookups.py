@@ -0,0 +1,91 @@
+"""Benchmark the DAOs id lookups as the database grows
+
+Usage:
+    python benchmarks/bench_db_lookups.py [--toddlers 10000] [--sessions 100000]
+                                          [--steps 4] [--lookups 1000] [--no-indexes]
+
+The database is filled in `--steps` equal steps up to `--toddlers` toddlers and
+`--sessions` sessions (one video per session). After each step it reports the
+mean latency of the toddler, video and session `_get_id` lookups. With the
+lookup indexes the latency stays flat, `--no-indexes` keeps the schema of
+version 1 to compare with the full table scans.
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from therapy_aid_tool.DAOs._create_db_squema import create_schema, MIGRATIONS
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+
+
+def fill(database, toddlers: range, sessions: range, n_toddlers: int):
+    """Insert toddlers and sessions (with their videos) with the given ids"""
+    con = sqlite3.connect(database)
+    con.executemany("INSERT INTO toddlers(id, name) VALUES(?, ?)",
+                    [(i, f"toddler {i}") for i in toddlers])
+    con.executemany("INSERT INTO videos(id, filepath, closeness, interactions, interactions_statistics) "
+                    "VALUES(?, ?, '{}', '{}', '{}')",
+                    [(i, f"videos/{i}.mp4") for i in sessions])
+    # Sessions are spread over the toddlers inserted so far
+    con.executemany("INSERT INTO sessions(id, toddler_id, video_id, date) VALUES(?, ?, ?, ?)",
+                    [(i, i % n_toddlers + 1, i, f"day {i}") for i in sessions])
+    con.commit()
+    con.close()
+
+
+def mean_latency(lookup, keys):
+    start = time.perf_counter()
+    for key in keys:
+        assert lookup(*key) is not None
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--toddlers", type=int, default=10_000)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--no-indexes", action="store_true",
+                        help="Only create the tables, without the lookup indexes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp)/"bench.db"
+        if args.no_indexes:
+            con = sqlite3.connect(database)
+            MIGRATIONS[1](con.cursor())
+            con.close()
+        else:
+            create_schema(database)
+
+        print(f"{'toddlers':>8} | {'sessions':>8} | {'toddler (us)':>12} | "
+              f"{'video (us)':>10} | {'session (us)':>12}")
+        n_toddlers = n_sessions = 0
+        for step in range(1, args.steps + 1):
+            toddlers = range(n_toddlers + 1, args.toddlers * step // args.steps + 1)
+            sessions = range(n_sessions + 1, args.sessions * step // args.steps + 1)
+            n_toddlers, n_sessions = toddlers.stop - 1, sessions.stop - 1
+            fill(database, toddlers, sessions, n_toddlers)
+
+            manager = ConnectionManager(database)
+            ids = random.Random(step).choices(sessions, k=args.lookups)
+            toddler = mean_latency(ToddlerDAO(manager)._get_id,
+                                   [(f"toddler {i % n_toddlers + 1}",) for i in ids])
+            video = mean_latency(VideoDAO(manager)._get_id,
+                                 [(f"videos/{i}.mp4",) for i in ids])
+            session = mean_latency(SessionDAO(manager)._get_id,
+                                   [(f"toddler {i % n_toddlers + 1}", f"day {i}") for i in ids])
+            manager.close_all()
+            print(f"{n_toddlers:>8} | {n_sessions:>8} | {toddler * 1e6:>12.1f} | "
+                  f"{video * 1e6:>10.1f} | {session * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
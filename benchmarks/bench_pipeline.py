@@ -0,0 +1,299 @@
+"""Time each stage of the video analysis pipeline on a synthetic video
+
+Usage:
+    python benchmarks/bench_pipeline.py [--frames 900] [--width 640] [--height 480]
+        [--fps 30] [--batch-size 1] [--detector stub|torch] [--repeat 3]
+        [--output results.json] [--baseline results.json [--threshold 0.2]]
+
+A video of actors (colored boxes) moving over a noisy background is generated
+in a temporary directory, so nothing has to be downloaded. With the `stub`
+detector (the default) the model is replaced by a deterministic one returning
+the boxes drawn in the video, so the timings only depend on this code. With
+`torch` it is the real model (the weights in the `detect.cfg` file).
+
+Each stage is timed on its own, and the best of --repeat runs is kept:
+    decode:         decoding the frames (see `prefetch_frames`)
+    inference:      the model calls, decoding excluded
+    postprocess:    the best prediction of each class (`detections_from_torch_results`)
+    metrics:        everything the Video holds (`VideoBuilder.from_detections`)
+    closeness:      its `__closeness`
+    interactions:   its `__interactions` and `__interactions_intervals`
+    statistics:     its `__interactions_statistics`
+    serialize:      the Video to the stored values (`VideoDAO._adapt_values`,
+                    the binary codec and the JSON of the statistics)
+    deserialize:    the stored values back (`VideoDAO._convert_values`)
+    dao_add:        `VideoDAO.add` in a fresh database
+    dao_get:        `VideoDAO.get`
+
+The results go to --output as JSON. With a --baseline (the output of an earlier
+run, with the same video and detector) the run fails when a stage takes more
+than --threshold (a fraction) longer per frame than it did.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from therapy_aid_tool.DAOs._create_db_squema import create_schema
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.models._video_inference import (
+    detections_from_torch_results,
+    load_detector,
+    MODEL_BATCH_SIZE,
+    MODEL_SIZE,
+)
+from therapy_aid_tool.models.video import VideoBuilder
+from therapy_aid_tool.utils.video import prefetch_frames
+
+
+N_CLASSES = 3
+# BGR colors of the toddler, caretaker and plusme boxes drawn in the video
+COLORS = [(60, 60, 220), (220, 120, 60), (60, 200, 60)]
+# Stages faster than this (seconds) are too noisy to tell a regression
+MIN_REGRESSION = 1e-3
+
+
+def actor_boxes(frame_idx: int):
+    """Return the normalized x, y, w, h, conf of each actor in a frame
+
+    The actors move along slow closed paths, approaching each other now and
+    then, so there are interactions of every type. Every 11th frame the plusme
+    is not detected.
+    """
+    t = frame_idx / 30
+    boxes = np.array([
+        [0.5 + 0.25 * np.sin(t / 3), 0.5 + 0.2 * np.cos(t / 4), 0.25, 0.4, 0.9],
+        [0.5 + 0.25 * np.cos(t / 5), 0.5 + 0.2 * np.sin(t / 2), 0.3, 0.5, 0.85],
+        [0.5 + 0.3 * np.sin(t / 7), 0.6 + 0.1 * np.sin(t), 0.15, 0.2, 0.8],
+    ])
+    return boxes if frame_idx % 11 else boxes[:2]
+
+
+def write_video(filepath: str, n_frames: int, width: int, height: int, fps: float):
+    """Write a synthetic video with the boxes of `actor_boxes` over a noisy background"""
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for frame_idx in range(n_frames):
+            # The background slides so the encoder can not just repeat the frames
+            frame = np.roll(background, frame_idx * 4, axis=1)
+            for (x, y, w, h, _), color in zip(actor_boxes(frame_idx), COLORS):
+                top_left = int((x - w / 2) * width), int((y - h / 2) * height)
+                bottom_right = int((x + w / 2) * width), int((y + h / 2) * height)
+                cv2.rectangle(frame, top_left, bottom_right, color, thickness=-1)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+class StubResults:
+    """The part of the YOLOv5 results `detections_from_torch_results` uses"""
+
+    def __init__(self, xywhn):
+        self.xywhn = xywhn
+
+
+class StubDetector:
+    """Deterministic stand-in of the model, predicting the boxes of `actor_boxes`
+
+    The frames are not looked at, the prediction depends only on how many frames
+    it was called with before, so it has to see the frames of the video in order.
+    """
+
+    def __init__(self):
+        self.frame_idx = 0
+
+    def __call__(self, frames: list, size: int = MODEL_SIZE):
+        xywhn = []
+        for _ in frames:
+            boxes = actor_boxes(self.frame_idx)
+            classes = np.arange(len(boxes), dtype=np.float32)[:, None]
+            xywhn.append(torch.from_numpy(np.hstack([boxes.astype(np.float32), classes])))
+            self.frame_idx += 1
+        return StubResults(xywhn)
+
+
+def timed(func, *args):
+    """Return the result of func(*args) and how long it took"""
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+def time_decode(filepath: str, n_frames: int):
+    cap = cv2.VideoCapture(filepath)
+    start = time.perf_counter()
+    for _ in prefetch_frames(cap, n_frames):
+        pass
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed
+
+
+def time_detection(filepath: str, n_frames: int, model, batch_size: int):
+    """Run the model on the whole video, timing its calls and the postprocessing apart
+
+    Returns:
+        tuple: (inference seconds, postprocess seconds, (frames, classes, 5) detections)
+    """
+    inference = postprocess = 0.0
+    detections = []
+
+    def run(batch):
+        nonlocal inference, postprocess
+        # How TorchDetector.detect runs it, without autograd
+        with getattr(torch, "inference_mode", torch.no_grad)():
+            results, elapsed = timed(model, batch, MODEL_SIZE)
+            inference += elapsed
+            batch_detections, elapsed = timed(detections_from_torch_results,
+                                              results, N_CLASSES)
+            postprocess += elapsed
+        detections.append(batch_detections)
+
+    cap = cv2.VideoCapture(filepath)
+    batch = []
+    for frame in prefetch_frames(cap, n_frames):
+        batch.append(frame[:, :, ::-1])
+        if len(batch) == batch_size:
+            run(batch)
+            batch = []
+    if batch:
+        run(batch)
+    cap.release()
+    return inference, postprocess, np.concatenate(detections)
+
+
+def run_stages(filepath: str, n_frames: int, fps: float, model, batch_size: int,
+               database: Path, run_idx: int):
+    """Time every stage once
+
+    Returns:
+        dict: Seconds taken by each stage
+    """
+    timings = {"decode": time_decode(filepath, n_frames)}
+    timings["inference"], timings["postprocess"], detections = time_detection(
+        filepath, n_frames, model, batch_size)
+
+    builder, timings["metrics"] = timed(VideoBuilder.from_detections,
+                                        filepath, detections, fps)
+    _, timings["closeness"] = timed(builder._VideoBuilder__closeness)
+    start = time.perf_counter()
+    builder._VideoBuilder__interactions()
+    intervals = builder._VideoBuilder__interactions_intervals()
+    timings["interactions"] = time.perf_counter() - start
+    _, timings["statistics"] = timed(builder._VideoBuilder__interactions_statistics,
+                                     intervals)
+
+    video = builder.build()
+    video.filepath = f"videos/run{run_idx}.mp4"  # a new row each run
+    dao = VideoDAO(ConnectionManager(database))
+    values, timings["serialize"] = timed(dao._adapt_values, video)
+    _, timings["deserialize"] = timed(dao._convert_values, values)
+    _, timings["dao_add"] = timed(dao.add, video)
+    stored, timings["dao_get"] = timed(dao.get, video.filepath)
+    dao.manager.close_all()
+    assert np.array_equal(stored.interactions_intervals["td_ct"],
+                          video.interactions_intervals["td_ct"])
+    return timings
+
+
+def regressions(results: dict, baseline: dict, threshold: float):
+    """Return the stages that take more than `threshold` longer per frame than in the baseline
+
+    Returns:
+        list[tuple[str, float, float]]: (stage, baseline, current) seconds per frame
+    """
+    slower = []
+    n_frames, baseline_frames = results["config"]["frames"], baseline["config"]["frames"]
+    for stage, current in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        before = baseline["stages"][stage]["seconds"] / baseline_frames
+        now = current["seconds"] / n_frames
+        if now > before * (1 + threshold) and (now - before) * n_frames > MIN_REGRESSION:
+            slower.append((stage, before, now))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=900, help="Length of the video")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--batch-size", type=int, default=MODEL_BATCH_SIZE)
+    parser.add_argument("--detector", choices=["stub", "torch"], default="stub",
+                        help="The deterministic stub or the real model")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs of every stage, the fastest one is kept")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Fail when a stage is this fraction slower than the baseline")
+    args = parser.parse_args()
+
+    config = {"frames": args.frames, "width": args.width, "height": args.height,
+              "fps": args.fps, "batch_size": args.batch_size, "detector": args.detector}
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        different = {key for key in ("width", "height", "batch_size", "detector")
+                     if baseline["config"].get(key) != config[key]}
+        if different:
+            parser.error(f"The baseline was run with other {', '.join(sorted(different))}")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = str(Path(tmp)/"synthetic.mp4")
+        write_video(filepath, args.frames, args.width, args.height, args.fps)
+        database = Path(tmp)/"bench.db"
+        create_schema(database)
+        for run_idx in range(args.repeat):
+            if args.detector == "stub":
+                model = StubDetector()
+            else:  # the AutoShape model TorchDetector.detect calls
+                model = load_detector("torch").model
+            runs.append(run_stages(filepath, args.frames, args.fps, model,
+                                   args.batch_size, database, run_idx))
+
+    stages = {stage: {"seconds": min(run[stage] for run in runs),
+                      "runs": [run[stage] for run in runs]}
+              for stage in runs[0]}
+    results = {
+        "host": {"node": platform.node(), "machine": platform.machine(),
+                 "processor": platform.processor(), "cpus": os.cpu_count(),
+                 "python": platform.python_version(), "torch": torch.__version__},
+        "config": config,
+        "stages": stages,
+    }
+
+    print(f"{'stage':>12} | {'total (ms)':>10} | {'per frame (us)':>14}")
+    for stage, res in stages.items():
+        print(f"{stage:>12} | {res['seconds'] * 1e3:>10.2f} | "
+              f"{res['seconds'] / args.frames * 1e6:>14.2f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"--> {args.output}")
+
+    if baseline is not None:
+        slower = regressions(results, baseline, args.threshold)
+        for stage, before, now in slower:
+            print(f"--> {stage} regressed: {before * 1e6:.2f} -> {now * 1e6:.2f} us per frame "
+                  f"(+{(now / before - 1) * 100:.0f}%)")
+        if slower:
+            sys.exit(1)
+        print(f"--> No stage regressed more than {args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
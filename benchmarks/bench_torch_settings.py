@@ -0,0 +1,120 @@
+"""Benchmark the model throughput (frames/sec) on CPU with each torch setting
+
+Usage:
+    python benchmarks/bench_torch_settings.py <video-path> [--frames 128] [--batch-size 1]
+        [--threads 1 2 4] [--inter-op-threads 1] [--letterbox] [--compile]
+
+Each setting is added on top of the previous ones:
+    autograd:       the model with autograd enabled
+    inference_mode: every call in torch.inference_mode
+    channels_last:  the network in the channels last memory format
+    compile:        the network compiled with torch.compile (only with --compile,
+                    it takes minutes), warmed up before timing
+
+Then the last setting is run with each number of intra-op --threads. The
+predictions of every run are compared against the first one, so it also works
+as a sanity check that no setting changes the results.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from therapy_aid_tool.models._video_inference import (
+    TorchDetector,
+    load_model,
+    set_torch_threads,
+    MODEL_SIZE,
+)
+from therapy_aid_tool.utils.video import letterbox
+
+
+N_CLASSES = 3
+
+
+def read_frames(source: str, n_frames: int):
+    """Decode the first `n_frames` frames of a video as BGR arrays"""
+    cap = cv2.VideoCapture(source)
+    frames = []
+    for _ in range(n_frames):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(detector, frames, batch_size: int, use_letterbox: bool):
+    """Run the detector over all frames in batches of `batch_size`
+
+    Returns:
+        tuple: (elapsed seconds, (frames, classes, 5) detections)
+    """
+    height, width = frames[0].shape[:2]
+    box = letterbox(width, height, MODEL_SIZE, detector.stride)
+    inputs = box.buffer(batch_size)
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        batch = frames[i:i + batch_size]
+        if use_letterbox:
+            for j, frame in enumerate(batch):
+                box.fill(inputs[j], box.resize(frame))
+            detections.append(detector.detect_letterboxed(inputs[:len(batch)], box, N_CLASSES))
+        else:
+            detections.append(detector.detect([frame[:, :, ::-1] for frame in batch],
+                                              N_CLASSES))
+    return time.perf_counter() - start, np.concatenate(detections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Video used as input for the model")
+    parser.add_argument("--frames", type=int, default=128,
+                        help="How many frames of the video to use")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4],
+                        help="Intra-op threads tried with the last setting")
+    parser.add_argument("--inter-op-threads", type=int, default=0,
+                        help="Inter-op threads of the whole run (0 = torch default)")
+    parser.add_argument("--letterbox", action="store_true",
+                        help="Letterbox the frames instead of the AutoShape resizing")
+    parser.add_argument("--compile", action="store_true", help="Also try torch.compile")
+    args = parser.parse_args()
+
+    set_torch_threads(0, args.inter_op_threads)
+    default_threads = torch.get_num_threads()
+    frames = read_frames(args.video, args.frames)
+
+    settings = [
+        ("autograd", dict(inference_mode=False)),
+        ("inference_mode", dict()),
+        ("channels_last", dict(channels_last=True)),
+    ]
+    if args.compile:
+        settings.append(("compile", dict(channels_last=True, compile=True)))
+    runs = [(name, kwargs, default_threads) for name, kwargs in settings]
+    runs += [(settings[-1][0], settings[-1][1], threads) for threads in args.threads]
+
+    reference = None
+    print(f"inter-op threads: {torch.get_num_interop_threads()}, "
+          f"{'letterbox' if args.letterbox else 'autoshape'}, batch size {args.batch_size}")
+    print(f"{'setting':>15} | {'threads':>7} | {'frames/sec':>10} | same detections")
+    for name, kwargs, threads in runs:
+        set_torch_threads(threads)
+        kwargs = dict(dict(inference_mode=True, channels_last=False, compile=False), **kwargs)
+        detector = TorchDetector(load_model(device="cpu"), **kwargs)
+        # warm up (and compile)
+        run(detector, frames[:args.batch_size], args.batch_size, args.letterbox)
+        elapsed, detections = run(detector, frames, args.batch_size, args.letterbox)
+        if reference is None:
+            reference = detections
+        same = np.allclose(detections, reference, atol=1e-4, equal_nan=True)
+        print(f"{name:>15} | {threads:>7} | {len(frames) / elapsed:>10.2f} | {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare the speed and the closeness of the detector backends on a video
+
+Usage:
+    python benchmarks/compare_backends.py <video-path> [--frames 300] [--batch-size 1]
+        [--onnx nn/3objs/weights/full1-yolov5s-img256-bs1.onnx ...]
+
+Every backend runs on the same letterboxed frames. The first row is the
+reference, the torch model on the frames resized by its own AutoShape wrapper
+(what the app does with letterbox=0). For each backend it reports:
+    fps:        frames per second of the model alone (decoding excluded)
+    closeness:  mean absolute difference of the per frame closeness, for the
+                frames where both found the pair
+    found:      fraction of frames where both found the pair, or both did not
+    agreement:  fraction of frames where both tell the same interaction
+"""
+from pathlib import Path
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from therapy_aid_tool.models._video_inference import (
+    load_detector,
+    MODEL_ONNX_WEIGHTS,
+    MODEL_SIZE,
+)
+from therapy_aid_tool.models._detections import closeness_from_detections
+from therapy_aid_tool.models.video import VideoBuilder
+from therapy_aid_tool.utils.video import letterbox
+
+
+N_CLASSES = 3
+
+
+def read_frames(source: str, n_frames: int):
+    """Decode the first `n_frames` frames of a video as BGR arrays"""
+    cap = cv2.VideoCapture(source)
+    frames = []
+    for _ in range(n_frames):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(detect, frames, batch_size: int):
+    """Run `detect` over the frames in batches of `batch_size`
+
+    Returns:
+        tuple: (elapsed seconds, (frames, classes, 5) detections)
+    """
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detections.append(detect(frames[i:i + batch_size]))
+    return time.perf_counter() - start, np.concatenate(detections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Video used as input for the models")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="How many frames of the video to use")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--onnx", nargs="*", default=[MODEL_ONNX_WEIGHTS],
+                        help="ONNX models (e.g. float and INT8) run on onnxruntime")
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    height, width = frames[0].shape[:2]
+
+    def letterboxed(detector):
+        # Each model pads to its own stride
+        box = letterbox(width, height, MODEL_SIZE, detector.stride)
+        inputs = box.buffer(args.batch_size)
+
+        def detect(batch):
+            for i, frame in enumerate(batch):
+                box.fill(inputs[i], box.resize(frame))
+            return detector.detect_letterboxed(inputs[:len(batch)], box, N_CLASSES)
+        return detect
+
+    torch_detector = load_detector("torch", device="cpu")
+    runs = [("torch autoshape", lambda batch: torch_detector.detect(
+                [frame[:, :, ::-1] for frame in batch], N_CLASSES)),
+            ("torch letterbox", letterboxed(torch_detector))]
+    for onnx_weights in args.onnx:
+        try:
+            detector = load_detector("onnxruntime", weights=onnx_weights)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"--> skipping {onnx_weights}: {e}")
+            continue
+        runs.append((f"onnx {Path(onnx_weights).name}", letterboxed(detector)))
+
+    threshold = VideoBuilder.CLOSENESS_THRESHOLD
+    reference = None
+    print(f"{'backend':>40} | {'fps':>7} | {'type':>5} | {'closeness':>9} | "
+          f"{'found':>6} | {'agreement':>9}")
+    for name, detect in runs:
+        run(detect, frames[:1], 1)  # warm up
+        elapsed, detections = run(detect, frames, args.batch_size)
+        closeness = closeness_from_detections(detections)
+        if reference is None:
+            reference = closeness
+        for pair, values in closeness.items():
+            ref = reference[pair]
+            both = ~np.isnan(values) & ~np.isnan(ref)
+            diff = np.abs(values[both] - ref[both]).mean() if both.any() else float("nan")
+            found = (np.isnan(values) == np.isnan(ref)).mean()
+            with np.errstate(invalid="ignore"):
+                agreement = ((values > threshold) == (ref > threshold)).mean()
+            print(f"{name:>40} | {len(frames) / elapsed:>7.2f} | {pair:>5} | "
+                  f"{diff:>9.4f} | {found:>6.3f} | {agreement:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
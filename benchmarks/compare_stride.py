@@ -0,0 +1,49 @@
+"""Compare the interactions found with a frame stride against the stride 1 output
+
+Usage:
+    python benchmarks/compare_stride.py <video-path> [--strides 2 3 5 10]
+
+For each stride and interaction type it reports:
+    intervals:  number of interaction intervals (stride 1 -> stride k)
+    agreement:  fraction of frames where both outputs agree
+    iou:        intersection over union of the interaction frames
+    boundary:   mean distance (in frames) from each stride k interval
+                start/end to the closest stride 1 start/end
+    speedup:    build time of stride 1 / build time of stride k
+"""
+import argparse
+import time
+
+from therapy_aid_tool.models.video import VideoBuilder
+from therapy_aid_tool.models._intervals import compare_intervals
+
+
+def timed_build(filepath: str, frame_stride: int):
+    start = time.perf_counter()
+    video = VideoBuilder(filepath, frame_stride=frame_stride).build()
+    return video, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="Video to process")
+    parser.add_argument("--strides", type=int, nargs="+", default=[2, 3, 5, 10])
+    args = parser.parse_args()
+
+    reference, reference_time = timed_build(args.video, 1)
+
+    print(f"{'stride':>6} | {'type':>5} | {'intervals':>10} | {'agreement':>9} | "
+          f"{'iou':>5} | {'boundary':>8} | {'speedup':>7}")
+    for stride in args.strides:
+        video, elapsed = timed_build(args.video, stride)
+        for key, intervals in reference.interactions_intervals.items():
+            n_frames = len(reference.interactions[key])
+            res = compare_intervals(intervals, video.interactions_intervals[key], n_frames)
+            n_intervals = f"{res['n_reference']} -> {res['n_other']}"
+            print(f"{stride:>6} | {key:>5} | {n_intervals:>10} | "
+                  f"{res['agreement']:>9.4f} | {res['iou']:>5.3f} | "
+                  f"{res['boundary']:>8.2f} | {reference_time / elapsed:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
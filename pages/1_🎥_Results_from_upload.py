@@ -1,6 +1,7 @@
 import streamlit as st
 
 from pathlib import Path
+import time
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,15 +9,20 @@ from copy import deepcopy
 
 # TODO: avoid using any Model or DAO in the View
 from therapy_aid_tool.models.toddler import Toddler
-from therapy_aid_tool.models.video import VideoBuilder
 from therapy_aid_tool.DAOs._create_db_squema import create_schema
 
 from st_controll import (
-    VIDEOS_DIR,
-    save_user_video,
+    save_session_upload,
+    discard_session_upload,
+    store_session_video,
+    enqueue_video,
+    get_job,
+    job_video,
+    JOB_POLL_INTERVAL,
     video_fp_from_toddler_date,
     add_session,
     toddlers_names,
+    show_interactions_statistics,
     DATABASE,
 )
 
@@ -52,13 +58,39 @@ st.markdown("---")
 # ==================================================
 # Process video
 if user_video:
-    save_user_video(user_video, "user_video.mp4")
+    upload, sha256 = save_session_upload(user_video)
 
     # Build video one time only
     if 'video' not in st.session_state:
-        with st.spinner("It may take a while..."):
-            video = VideoBuilder("user_video.mp4").build()
-            st.session_state['video'] = video
+        # The video is processed by the job workers, reruns follow the same job
+        if 'job' not in st.session_state:
+            st.session_state['job'] = enqueue_video(upload, sha256)
+        job_id = st.session_state['job']
+
+        progress_bar = st.progress(0.0)
+        progress_text = st.empty()
+        while (job := get_job(job_id)).state in ("queued", "running"):
+            if job.state == "queued":
+                progress_text.caption("Waiting for the other videos to be processed...")
+            else:
+                done = job.frames_done / max(job.total_frames, 1)
+                elapsed = max(job.updated - job.started, 1e-6)
+                throughput = job.frames_done / elapsed
+                eta = (job.total_frames - job.frames_done) / throughput if throughput else 0
+                progress_bar.progress(min(done, 1.0))
+                progress_text.caption(
+                    f"{job.frames_done}/{job.total_frames} frames · "
+                    f"{throughput:.1f} frames/s · ETA {eta:.0f}s")
+            time.sleep(JOB_POLL_INTERVAL)
+
+        progress_bar.empty()
+        progress_text.empty()
+        if job.state == "failed":
+            st.session_state.pop('job')
+            st.error(f"The video could not be processed: {job.error}")
+            st.stop()
+        video = job_video(job_id)
+        st.session_state['video'] = video
     else:
         video = st.session_state['video']
 
@@ -77,31 +109,31 @@ if user_video:
 
     # ==================================================
     # Choose what type of closeness to plot
-    type = "td_ct"  # default
+    pair = "td_ct"  # default
     title = "Toddler-Caretaker"
     if button_td_ct:
-        type = "td_ct"
+        pair = "td_ct"
         title = "Toddler-Caretaker"
 
     elif button_td_pm:
-        type = "td_pm"
+        pair = "td_pm"
         title = "Toddler-Plusme"
 
     elif button_ct_pm:
-        type = "ct_pm"
+        pair = "ct_pm"
         title = "Caretaker-Plusme"
 
     # ==================================================
     # Image ::: Plot Closeness and Interaction bar
     # (8,1) is the perfect size to match streamlit video dimensions on the centered layout
     CLOSENESS_THRESHOLD = 0.6
-    x = np.arange(len(video.closeness[type]))
+    x = np.arange(len(video.closeness[pair]))
     fig, ax = plt.subplots(figsize=(8, 1))
-    ax.stackplot(x, video.closeness[type], alpha=0.8, color='lightsteelblue')
-    ax.fill_between(x, video.closeness[type], alpha=0.5, color='red',
-                    where=video.interactions[type])
+    ax.stackplot(x, video.closeness[pair], alpha=0.8, color='lightsteelblue')
+    ax.fill_between(x, video.closeness[pair], alpha=0.5, color='red',
+                    where=video.interactions[pair])
     ax.set_ylim(top=1)
-    ax.set_xlim(left=0, right=len(video.closeness[type]))
+    ax.set_xlim(left=0, right=len(video.closeness[pair]))
     ax.vlines(0, 0, 1)
     ax.vlines(len(x), 0, 1)
     ax.yaxis.set_ticks([])
@@ -114,7 +146,7 @@ if user_video:
     # ==================================================
     # Widget ::: Interactions Statistics
     st.markdown("### Interactions Statistics")
-    st.dataframe(video.interactions_statistics, use_container_width=True)
+    show_interactions_statistics(video.interactions_statistics, pair, title)
     st.markdown("#")
     st.markdown("---")
 
@@ -133,7 +165,7 @@ if user_video:
             date = str(st.date_input("What is this session date?", key="1"))
             if st.form_submit_button("submit") and all([toddler, date]):
                 video.filepath = video_fp_from_toddler_date(toddler, date)
-                save_user_video(user_video, VIDEOS_DIR/video.filepath)
+                store_session_video(upload, video.filepath)
                 add_session(toddler, video, date)
 
     with add_existing:
@@ -143,9 +175,12 @@ if user_video:
             date = str(st.date_input("What is this session date?", key="2"))
             if st.form_submit_button("submit") and all([toddler, date]):
                 video.filepath = video_fp_from_toddler_date(toddler, date)
-                save_user_video(user_video, VIDEOS_DIR/video.filepath)
+                store_session_video(upload, video.filepath)
                 add_session(toddler, video, date)
 
 else:
     if 'video' in st.session_state:
         st.session_state.pop('video')
+    if 'job' in st.session_state:
+        st.session_state.pop('job')
+    discard_session_upload()
@@ -12,6 +12,7 @@ from st_controll import (
     toddlers_names,
     dates_from_name,
     dates_from_name,
+    show_interactions_statistics,
     DATABASE,
 )
 
@@ -64,34 +65,30 @@ st.video(video.filepath)
 
 # ==================================================
 # Choose what type of closeness to plot
-td_ct = np.array(video.closeness['td_ct'])
-td_pm = np.array(video.closeness['td_pm'])
-ct_pm = np.array(video.closeness['ct_pm'])
-
-y_closeness = td_ct  # default
+interaction = "td_ct"  # default
 title = "Toddler-Caretaker"
 if button_td_ct:
-    y_closeness = td_ct
+    interaction = "td_ct"
     title = "Toddler-Caretaker"
 
 elif button_td_pm:
-    y_closeness = td_pm
+    interaction = "td_pm"
     title = "Toddler-Plusme"
 
 elif button_ct_pm:
-    y_closeness = ct_pm
+    interaction = "ct_pm"
     title = "Caretaker-Plusme"
 
+y_closeness = np.array(video.closeness[interaction])
+
 # ==================================================
 # Image ::: Plot Closeness and Interaction bar
 # (8,1) is the perfect size to match streamlit video dimensions on the centered layout
-CLOSENESS_THRESHOLD = 0.6
 x = np.arange(len(y_closeness))
 fig, ax = plt.subplots(figsize=(8, 1))
 ax.stackplot(x, y_closeness, alpha=0.8, color='lightsteelblue')
-# TODO: use interactions to fill_between instead of thresholding the closeness
-ax.fill_between(x, y_closeness, alpha=0.5, color='red',
-                where=y_closeness > CLOSENESS_THRESHOLD)
+for start, end in video.interactions_intervals[interaction]:
+    ax.fill_between(x[start:end], y_closeness[start:end], alpha=0.5, color='red')
 ax.set_ylim(top=1)
 ax.set_xlim(left=0, right=len(y_closeness))
 ax.vlines(0, 0, 1)
@@ -106,4 +103,4 @@ st.markdown("---")
 # ==================================================
 # Widget ::: Interactions Statistics
 st.markdown("### Interactions Statistics")
-st.dataframe(video.interactions_statistics, use_container_width=True)
+show_interactions_statistics(video.interactions_statistics, interaction, title)
@@ -1,9 +1,10 @@
 import streamlit as st
 
-from copy import deepcopy
 from io import BufferedReader
 from pathlib import Path
 from typing import Union
+from uuid import uuid4
+import time
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -11,32 +12,156 @@ import matplotlib.pyplot as plt
 from therapy_aid_tool.models.toddler import Toddler
 from therapy_aid_tool.models.video import Video
 from therapy_aid_tool.models.session import Session
+from therapy_aid_tool.jobs import JobQueue, start_workers
+from therapy_aid_tool.jobs import POLL_INTERVAL as JOB_POLL_INTERVAL
 
+from therapy_aid_tool.DAOs.connection import get_connection_manager
 from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
 from therapy_aid_tool.DAOs.video_dao import VideoDAO
 from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
+
+from therapy_aid_tool.utils.filepaths import save_stream, link_or_copy
 
 
 ROOT = Path(__file__).parents[0].resolve()
 
 DATABASE_DIR = ROOT/"database"
 DATABASE = DATABASE_DIR/"sessions.db"
+# Every DAO borrows the connection of its thread from here
+DB_MANAGER = get_connection_manager(DATABASE)
 
 VIDEOS_DIR = DATABASE_DIR/"videos"
+# The videos uploaded in each Streamlit session, until it uploads another one
+UPLOADS_DIR = DATABASE_DIR/"uploads"
+# A session that just ends leaves its upload behind, it is removed after this many seconds
+UPLOAD_MAX_AGE = 24 * 60 * 60
+
+# Uploaded videos waiting to be processed by the job workers
+JOB_QUEUE = JobQueue()
 
 
 def save_user_video(video: BufferedReader, location: Union[str, Path]):
     """Save the user uploaded video
 
     The type of the streamlit uploaded video is a "UploadedFile" but respects
-    the Buffer protocol
+    the Buffer protocol. It is copied in chunks, so the memory used does not
+    depend on the size of the video, and replaces `location` atomically.
 
     Args:
         video (BufferedReader): The user uploaded video to the streamlit app
         location (Union[str, Path]): Where to save this video
+
+    Returns:
+        str: SHA-256 of the video, computed while it is saved
+    """
+    return save_stream(video, location)
+
+
+def save_session_upload(video: BufferedReader):
+    """Save the user uploaded video to a file of the Streamlit session
+
+    Each session has its own file, so concurrent users never overwrite each
+    other's upload. The video is saved once per upload, not on every rerun, and
+    a new upload replaces the previous one with its results.
+
+    Args:
+        video (BufferedReader): The user uploaded video to the streamlit app
+
+    Returns:
+        tuple[Path, str]: The saved video and its SHA-256
+    """
+    file_id = getattr(video, "file_id", None) or (video.name, video.size)
+    upload = st.session_state.get('upload')
+    if upload is None or upload[0] != file_id:
+        discard_session_upload()
+        remove_stale_uploads()
+        # The results shown were of the previous upload
+        st.session_state.pop('video', None)
+        st.session_state.pop('job', None)
+        location = UPLOADS_DIR/f"{uuid4().hex}{Path(video.name).suffix or '.mp4'}"
+        upload = (file_id, location, save_user_video(video, location))
+        st.session_state['upload'] = upload
+    return upload[1], upload[2]
+
+
+def discard_session_upload():
+    """Remove the video saved by `save_session_upload`, if any"""
+    upload = st.session_state.pop('upload', None)
+    if upload is not None:
+        Path(upload[1]).unlink(missing_ok=True)
+
+
+def remove_stale_uploads(max_age: float = UPLOAD_MAX_AGE):
+    """Remove the uploads of the sessions that ended without discarding them
+
+    Args:
+        max_age (float, optional): Remove the uploads saved more than this many
+            seconds ago. Defaults to a day.
+
+    Returns:
+        int: How many uploads were removed
+    """
+    if not UPLOADS_DIR.is_dir():
+        return 0
+    removed = 0
+    oldest = time.time() - max_age
+    for path in UPLOADS_DIR.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < oldest:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:  # removed by another session meanwhile
+            continue
+    return removed
+
+
+def store_session_video(location: Union[str, Path], filepath: Union[str, Path]):
+    """Make a saved upload the video of a session, without writing it again
+
+    Args:
+        location (Union[str, Path]): The saved upload (see `save_session_upload`)
+        filepath (Union[str, Path]): The video path of the session
+            (see `video_fp_from_toddler_date`)
+    """
+    link_or_copy(location, VIDEOS_DIR/filepath)
+
+
+@st.cache_resource(show_spinner=False)
+def start_job_workers():
+    """Start the processes that run the jobs of `JOB_QUEUE`, once for the whole server
+
+    How many there are, and how many jobs they run at the same time, is set in
+    the [jobs] section of the `detect.cfg` file.
+
+    Returns:
+        list[multiprocessing.Process]: The worker processes
     """
-    with open(location, "wb") as f:
-        f.write(video.read())
+    return start_workers(database=JOB_QUEUE.database)
+
+
+def enqueue_video(location: Union[str, Path], sha256: str = None):
+    """Add a job to process a saved user video, or return the job it already has
+
+    Args:
+        location (Union[str, Path]): Where the video was saved
+        sha256 (str, optional): SHA-256 of the video, if known. Defaults to None.
+
+    Returns:
+        int: The job id
+    """
+    start_job_workers()
+    return JOB_QUEUE.enqueue(location, sha256)
+
+
+def get_job(job_id: int):
+    """Return the job `job_id` (see `Job`) to follow its state and progress"""
+    return JOB_QUEUE.get(job_id)
+
+
+def job_video(job_id: int):
+    """Return the Video of a done job, None if it is not done"""
+    return JOB_QUEUE.result(job_id)
 
 
 def video_fp_from_toddler_date(toddler: Toddler, date: str):
@@ -61,15 +186,18 @@ def add_session(toddler: Toddler, video: Video, date: str):
     the database, the addition is not made and no error or
     exception is returned
 
+    The three additions are made in a single transaction
+
     Args:
         toddler (Toddler): The toddler in the session
         video (Video): The video of the session
         date (str): The date of the session
     """
     session = Session(toddler, video, date)
-    ToddlerDAO(DATABASE).add(toddler)
-    VideoDAO(DATABASE).add(video)
-    SessionDAO(DATABASE).add(session)
+    with DB_MANAGER.transaction():
+        ToddlerDAO(DB_MANAGER).add(toddler)
+        VideoDAO(DB_MANAGER).add(video)
+        SessionDAO(DB_MANAGER).add(session)
 
 
 def toddlers_names():
@@ -78,7 +206,7 @@ def toddlers_names():
     Returns:
         list[str]: the toddlers' names
     """
-    return ToddlerDAO(DATABASE).get_all_names()
+    return ToddlerDAO(DB_MANAGER).get_all_names()
 
 
 def dates_from_name(name: str):
@@ -87,7 +215,7 @@ def dates_from_name(name: str):
     Returns:
         list[str]: The session dates where a toddler appears
     """
-    return SessionDAO(DATABASE).get_dates_from_name(name)
+    return SessionDAO(DB_MANAGER).get_dates_from_name(name)
 
 
 def get_session(toddler_name: str, date: str):
@@ -98,73 +226,38 @@ def get_session(toddler_name: str, date: str):
     Returns:
         Session: The Session
     """
-    return SessionDAO(DATABASE).get(toddler_name, date)
-
-
-def __sessions_from_name(toddler_name: str):
-    """Get list of all the sessions that a toddler is present
-
-    Args:
-        toddler_name (str): The name o the toddler   
-
-    Returns:
-        list[Session]: The sessions the toddler is present
-    """
-    return SessionDAO(DATABASE).get_all_from_name(toddler_name)
-
+    return SessionDAO(DB_MANAGER).get(toddler_name, date)
 
-def __statistics_from_all_sessions(toddler_name: str):
-    """Get statistics from all sessions that a toddler is present
 
-    It returns a dictionary of statistics where the keys are
-    the three interactions classes (td_ct, td_pm, ct_pm) and
-    the value for each key is a dictionary of lists, where
-    those keys are the type of statistics and their value a list
-    of that statistic over the sessions.
+def show_interactions_statistics(statistics: dict, interaction: str, title: str):
+    """Show the statistics of the interactions of a video and the histogram of
+    the durations of one type of interaction
 
-    Return example for 4 existing sessions:
-        statistics = {
-            'td_ct': {'n_interactions': [int, int, int, int],
-                      'min_time': [float, float, float, float],
-                      'max_time': [float, float, float, float],
-                      'mean_time': [float, float, float, float]},
-            'td_pm': ...,
-            'ct_pm': ...,
-        }
+    The videos stored before the percentiles and histograms were added only
+    have the other statistics.
 
     Args:
-        toddler_name (str): The name of the toddler   
-
-    Returns:
-        dict[str, dict[str, list[Unknown]]]: The statistics for all sessions
+        statistics (dict): The `interactions_statistics` of a video
+        interaction (str): The type of interaction of the histogram, like 'td_ct'
+        title (str): The title of the histogram
     """
-    sessions = __sessions_from_name(toddler_name)
-    sessions = sorted(sessions, key=lambda ses: ses.date)
-    
-    # interactions statisics for each session
-    separated_statistics = [session.video.interactions_statistics
-                            for session in sessions]
-
-    data_template = {
-        "n_interactions": [],
-        "total_time": [],
-        "min_time": [],
-        "max_time": [],
-        "mean_time": [],
-    }
-    statistics = {
-        "td_ct": deepcopy(data_template),
-        "td_pm": deepcopy(data_template),
-        "ct_pm": deepcopy(data_template),
-    }
-
-    # Merge separated statistics for a class into lists over the sessions
-    for sep_stat in separated_statistics:
-        for inter_type, stat_group in sep_stat.items():
-            for type_stat, stat_value in stat_group.items():
-                statistics[inter_type][type_stat].append(stat_value)
-                # Example: statistics['td_ct']['min_time'].append(float)
-    return statistics
+    # The histograms are not single values, they do not fit in the table
+    table = {inter_type: {stat: value for stat, value in stat_group.items()
+                          if stat != 'histogram'}
+             for inter_type, stat_group in statistics.items()}
+    st.dataframe(table, use_container_width=True)
+
+    histogram = statistics[interaction].get('histogram')
+    if histogram is None:
+        return
+    edges = np.array(histogram['edges'])
+    fig, ax = plt.subplots(figsize=(8, 2))
+    ax.bar(edges[:-1], histogram['counts'], width=np.diff(edges), align="edge",
+           color='lightsteelblue', edgecolor='black')
+    ax.set_title(f"{title} interactions duration", {'fontsize': 10})
+    ax.set_xlabel("Seconds")
+    ax.set_ylabel("Count")
+    st.pyplot(fig)
 
 
 def plot_sessions_progress(toddler_name: str):
@@ -176,7 +269,8 @@ def plot_sessions_progress(toddler_name: str):
     Args:
         toddler_name (str): The name o the toddler
     """
-    statistics = __statistics_from_all_sessions(toddler_name)
+    # Kept up to date by the SessionDAO, one row per session and interaction type
+    statistics = ProgressDAO(DB_MANAGER).get(toddler_name)
 
     titles = {
         'td_ct': 'Toddler-Caretaker',
@@ -0,0 +1,46 @@
+from therapy_aid_tool.autotune import select, set_config_values, size_from_weights
+import pytest
+
+
+RESULTS = {
+    "small": {"fps": 100.0, "agreement": 0.90},
+    "medium": {"fps": 50.0, "agreement": 0.97},
+    "large": {"fps": 20.0, "agreement": 1.0},
+}
+
+
+def test_size_from_weights():
+    assert size_from_weights("nn/3objs/weights/full1-yolov5n6-img1280-bs1.pt") == 1280
+    with pytest.raises(ValueError):
+        size_from_weights("yolov5s.pt")
+
+
+def test_select_within_budget():
+    # The fastest agreeing enough
+    assert select(RESULTS) == "medium"
+    assert select(RESULTS, min_agreement=0.8) == "small"
+    assert select(RESULTS, min_agreement=1.01) is None
+    # The most agreeing fast enough
+    assert select(RESULTS, max_latency=25) == "medium"
+    assert select(RESULTS, max_latency=1000) == "large"
+    assert select(RESULTS, max_latency=5) is None
+
+
+def test_set_config_values_keeps_comments(tmp_path):
+    cfg = tmp_path/"detect.cfg"
+    cfg.write_text("[yolov5]\n; weights available\nweights=a.pt\n\n"
+                   "[model]\n; the size\nsize=256\nbatch_size=1\n")
+    set_config_values(cfg, {("yolov5", "weights"): "b.pt", ("model", "size"): 512})
+    assert cfg.read_text() == ("[yolov5]\n; weights available\nweights=b.pt\n\n"
+                               "[model]\n; the size\nsize=512\nbatch_size=1\n")
+
+    with pytest.raises(KeyError):
+        set_config_values(cfg, {("yolov5", "size"): 512})
+
+
+def test_measure_without_frames(tmp_path, monkeypatch):
+    from therapy_aid_tool import autotune
+
+    monkeypatch.setattr(autotune, "load_detector", lambda *args, **kwargs: pytest.fail())
+    with pytest.raises(ValueError):
+        autotune.measure("full1-yolov5s-img256-bs1.pt", str(tmp_path/"clip.mp4"), 0)
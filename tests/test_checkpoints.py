@@ -0,0 +1,27 @@
+from therapy_aid_tool.models._checkpoints import CheckpointStore
+import numpy as np
+
+
+def test_save_load_remove(tmp_path):
+    store = CheckpointStore(tmp_path, every=10)
+    assert store.load("a") is None
+
+    detections = np.full((20, 3, 5), np.nan)
+    detected = np.zeros(20, dtype=bool)
+    detections[::2], detected[::2] = 0.5, True
+    store.save("a", detections, detected)
+    store.save("a", detections[:10], detected[:10])  # replaces the previous one
+
+    loaded_detections, loaded_detected = store.load("a")
+    np.testing.assert_array_equal(loaded_detections, detections[:10])
+    np.testing.assert_array_equal(loaded_detected, detected[:10])
+    assert [path.name for path in tmp_path.iterdir()] == ["a.npz"]  # no temporary files
+
+    store.remove("a")
+    store.remove("a")
+    assert store.load("a") is None
+
+
+def test_damaged_checkpoint_is_ignored(tmp_path):
+    (tmp_path/"a.npz").write_bytes(b"not a checkpoint")
+    assert CheckpointStore(tmp_path).load("a") is None
@@ -0,0 +1,66 @@
+from therapy_aid_tool.DAOs._codec import (
+    encode_closeness,
+    encode_interactions,
+    encode_detections,
+    decode,
+    decode_detections,
+    is_encoded,
+)
+import numpy as np
+import json
+
+
+def sample_video_values(n_frames=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    closeness = {}
+    for key in ["td_ct", "td_pm", "ct_pm"]:
+        values = rng.random(n_frames)
+        values[rng.random(n_frames) < 0.2] = np.nan
+        values[rng.random(n_frames) < 0.2] = 0.0
+        closeness[key] = values.tolist()
+    interactions = {key: (np.array(values) > 0.6).tolist()
+                    for key, values in closeness.items()}
+    return closeness, interactions
+
+
+def test_interactions_roundtrip():
+    _, interactions = sample_video_values(1001)  # not a multiple of 8
+    blob = encode_interactions(interactions)
+    assert is_encoded(blob)
+    assert decode(blob) == interactions
+
+
+def test_closeness_roundtrip():
+    closeness, _ = sample_video_values()
+    tolerances = {"float32": 1e-7, "float16": 1e-3, "uint8": 1 / 254}
+    for dtype, tolerance in tolerances.items():
+        decoded = decode(encode_closeness(closeness, dtype))
+        assert list(decoded) == list(closeness)
+        for key, values in closeness.items():
+            values, decoded_values = np.array(values), np.array(decoded[key])
+            assert (np.isnan(values) == np.isnan(decoded_values)).all()
+            assert np.nanmax(np.abs(values - decoded_values)) <= tolerance
+            assert (decoded_values[values == 0] == 0).all()
+
+
+def test_reads_json_rows():
+    closeness, interactions = sample_video_values(10)
+    assert not is_encoded(json.dumps(closeness))
+    assert decode(json.dumps(interactions)) == interactions
+    assert np.allclose(decode(json.dumps(closeness))["td_ct"], closeness["td_ct"],
+                       equal_nan=True)
+
+
+def test_smaller_than_json():
+    closeness, interactions = sample_video_values(10000)
+    assert len(encode_closeness(closeness)) < len(json.dumps(closeness)) / 5
+    assert len(encode_interactions(interactions)) < len(json.dumps(interactions)) / 20
+
+
+def test_detections_roundtrip():
+    rng = np.random.default_rng(0)
+    detections = rng.random((50, 3, 5)).astype(np.float32).astype(np.float64)
+    detections[rng.random((50, 3)) < 0.2] = np.nan
+    decoded, names = decode_detections(encode_detections(detections, ["td", "ct", "pm"]))
+    assert names == ["td", "ct", "pm"]
+    np.testing.assert_array_equal(decoded, detections)
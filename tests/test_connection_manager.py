@@ -0,0 +1,65 @@
+from therapy_aid_tool.DAOs.connection import ConnectionManager, get_connection_manager
+from threading import Thread
+import pytest
+
+
+def test_one_connection_per_thread(tmp_path):
+    manager = ConnectionManager(tmp_path/"test.db")
+    con = manager.connection()
+    assert manager.connection() is con
+
+    other = []
+    thread = Thread(target=lambda: other.append(manager.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not con
+
+    # Connections of finished threads are closed when a new one is opened
+    thread = Thread(target=manager.connection)
+    thread.start()
+    thread.join()
+    with pytest.raises(Exception):
+        other[0].execute("SELECT 1")
+    manager.close_all()
+
+
+def test_pragmas(tmp_path):
+    manager = ConnectionManager(tmp_path/"test.db", synchronous="FULL",
+                                cache_size=-2000, mmap_size=0)
+    con = manager.connection()
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    assert con.execute("PRAGMA cache_size").fetchone()[0] == -2000
+    assert con.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    manager.close()
+
+
+def test_transaction(tmp_path):
+    manager = ConnectionManager(tmp_path/"test.db")
+    con = manager.connection()
+    con.execute("CREATE TABLE t(x)")
+    manager.commit()
+
+    with manager.transaction():
+        con.execute("INSERT INTO t VALUES(1)")
+        manager.commit()  # no-op inside the block
+        with manager.transaction():
+            con.execute("INSERT INTO t VALUES(2)")
+        assert manager.in_transaction()
+    assert not manager.in_transaction()
+
+    with pytest.raises(ValueError):
+        with manager.transaction():
+            con.execute("INSERT INTO t VALUES(3)")
+            raise ValueError
+
+    reader = ConnectionManager(tmp_path/"test.db")
+    values = reader.connection().execute("SELECT x FROM t").fetchall()
+    assert values == [(1,), (2,)]
+    reader.close_all()
+    manager.close_all()
+
+
+def test_shared_manager(tmp_path):
+    database = tmp_path/"test.db"
+    assert get_connection_manager(database) is get_connection_manager(str(database))
@@ -0,0 +1,61 @@
+from therapy_aid_tool.DAOs._create_db_squema import create_schema, migrate, SCHEMA_VERSION
+import sqlite3
+import pytest
+
+
+LEGACY_SCHEMA = """
+    CREATE TABLE toddlers(id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE videos(id INTEGER PRIMARY KEY, filepath TEXT, closeness TEXT,
+                        interactions TEXT, interactions_statistics TEXT);
+    CREATE TABLE sessions(id INTEGER PRIMARY KEY, toddler_id, video_id, date TEXT);
+    """
+
+
+def indexes(database):
+    con = sqlite3.connect(database)
+    res = con.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    con.close()
+    return {name for name, in res}
+
+
+def test_create_schema(tmp_path):
+    database = tmp_path/"test.db"
+    create_schema(database)
+    assert migrate(database) == SCHEMA_VERSION
+    assert {"toddlers_name", "videos_filepath", "sessions_toddler_date"} <= indexes(database)
+
+    con = sqlite3.connect(database)
+    con.execute("INSERT INTO toddlers(name) VALUES('Ana')")
+    with pytest.raises(sqlite3.IntegrityError):
+        con.execute("INSERT INTO toddlers(name) VALUES('Ana')")
+    con.close()
+
+
+def test_upgrade_legacy_database(tmp_path):
+    database = tmp_path/"test.db"
+    con = sqlite3.connect(database)
+    con.executescript(LEGACY_SCHEMA)
+    con.execute("INSERT INTO toddlers(name) VALUES('Ana')")
+    con.commit()
+    con.close()
+
+    assert migrate(database) == 0
+    assert "toddlers_name" in indexes(database)
+    con = sqlite3.connect(database)
+    assert con.execute("SELECT name FROM toddlers").fetchall() == [("Ana",)]
+    con.close()
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    database = tmp_path/"test.db"
+    con = sqlite3.connect(database)
+    con.executescript(LEGACY_SCHEMA)
+    con.executescript("INSERT INTO toddlers(name) VALUES('Ana'), ('Ana');")
+    con.close()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        migrate(database)
+    assert "toddlers_name" not in indexes(database)
+    con = sqlite3.connect(database)
+    assert con.execute("SELECT MAX(version) FROM schema_version").fetchone() == (1,)
+    con.close()
@@ -0,0 +1,66 @@
+from therapy_aid_tool.models._detections import (
+    BBox,
+    interpolate_detections,
+    closeness_from_detections,
+    bboxes_from_detections,
+)
+import numpy as np
+import math
+
+
+def random_detections(n_frames, n_classes=3, seed=0):
+    """Random detections with missing ones, zero sized boxes and touching edges"""
+    rng = np.random.default_rng(seed)
+    # Coarse values so boxes often share edges
+    detections = rng.integers(0, 10, size=(n_frames, n_classes, 5)) / 10
+    detections[..., 4] = rng.random((n_frames, n_classes))
+    detections[rng.random((n_frames, n_classes)) < 0.2] = np.nan
+    return detections
+
+
+def test_closeness_matches_bbox_niou():
+    detections = random_detections(2000)
+    closeness = closeness_from_detections(detections)
+    bbs = bboxes_from_detections(detections)
+
+    for key, niou in closeness.items():
+        first, second = key.split("_")
+        expected = [bb1.niou(bb2) for bb1, bb2 in zip(bbs[first], bbs[second])]
+        for value, expected_value in zip(niou.tolist(), expected):
+            if math.isnan(expected_value):
+                assert math.isnan(value)
+            else:
+                assert value == expected_value
+
+
+def test_bbox_from_detection():
+    detections = np.full((3, 5), np.nan)
+    detections[2] = [0.5, 0.5, 0.1, 0.1, 0.8]
+
+    assert BBox.from_detection(1, detections[1]).xywhc is None
+    assert BBox.from_detection(2, detections[2]).xywhc == [0.5, 0.5, 0.1, 0.1, 0.8]
+
+
+def test_interpolate_detections():
+    detections = np.full((6, 1, 5), np.nan)
+    detected = np.array([True, False, False, True, False, False])
+    detections[0, 0] = [0.0, 0.0, 0.3, 0.3, 0.9]
+    detections[3, 0] = [0.3, 0.6, 0.6, 0.3, 0.6]
+
+    filled = interpolate_detections(detections, detected)
+
+    assert np.allclose(filled[1, 0], [0.1, 0.2, 0.4, 0.3, 0.8])
+    assert np.allclose(filled[2, 0], [0.2, 0.4, 0.5, 0.3, 0.7])
+    # After the last detected frame it repeats it
+    assert (filled[4:, 0] == detections[3, 0]).all()
+
+
+def test_interpolate_missing_detection_copies_closest():
+    detections = np.full((5, 1, 5), np.nan)
+    detected = np.array([True, False, False, False, True])
+    detections[0, 0] = [0.5, 0.5, 0.2, 0.2, 0.9]
+
+    filled = interpolate_detections(detections, detected)
+
+    assert (filled[1, 0] == detections[0, 0]).all()
+    assert np.isnan(filled[2:, 0]).all()
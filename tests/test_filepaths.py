@@ -0,0 +1,29 @@
+from therapy_aid_tool.utils.filepaths import file_sha256, link_or_copy, save_stream
+import hashlib
+import io
+import os
+
+
+def test_save_stream_hashes_while_writing(tmp_path):
+    content = os.urandom(3 * 1024 + 17)
+    stream = io.BytesIO(content)
+    stream.read(10)  # already read, e.g. by a previous rerun
+
+    sha256 = save_stream(stream, tmp_path/"dir"/"video.mp4", chunk_size=1024)
+    assert (tmp_path/"dir"/"video.mp4").read_bytes() == content
+    assert sha256 == hashlib.sha256(content).hexdigest() == file_sha256(tmp_path/"dir"/"video.mp4")
+    assert os.listdir(tmp_path/"dir") == ["video.mp4"]  # no temporary file left
+
+
+def test_link_or_copy_replaces_atomically(tmp_path):
+    (tmp_path/"upload.mp4").write_bytes(b"new")
+    (tmp_path/"videos").mkdir()
+    (tmp_path/"videos"/"session.mp4").write_bytes(b"old")
+
+    link_or_copy(tmp_path/"upload.mp4", tmp_path/"videos"/"session.mp4")
+    assert (tmp_path/"videos"/"session.mp4").read_bytes() == b"new"
+
+    # Replacing the upload leaves the session video untouched
+    save_stream(io.BytesIO(b"another"), tmp_path/"upload.mp4")
+    assert (tmp_path/"videos"/"session.mp4").read_bytes() == b"new"
+    assert os.listdir(tmp_path/"videos") == ["session.mp4"]
@@ -0,0 +1,57 @@
+from therapy_aid_tool.models._inference_cache import InferenceCache, cache_key
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def test_cache_key():
+    key = cache_key("abc", "weights/full1-yolov5s-img256-bs1.pt", 256, 0.75, 0.45, 1)
+    assert key == cache_key("abc", "other/full1-yolov5s-img256-bs1.pt", 256, 0.75, 0.45, 1)
+    assert key != cache_key("abd", "weights/full1-yolov5s-img256-bs1.pt", 256, 0.75, 0.45, 1)
+    assert key != cache_key("abc", "weights/full1-yolov5s-img256-bs1.pt", 256, 0.75, 0.45, 2)
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = InferenceCache(tmp_path)
+    detections = np.random.default_rng(0).random((10, 3, 5))
+    detections[2, 1] = np.nan
+
+    assert cache.get("a") is None
+    cache.put("a", detections)
+    np.testing.assert_array_equal(cache.get("a"), detections)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+
+    # Another instance on the same directory, like another process, shares it
+    np.testing.assert_array_equal(InferenceCache(tmp_path).get("a"), detections)
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+
+
+def test_lru_eviction(tmp_path):
+    detections = np.zeros((100, 3, 5))
+    probe = InferenceCache(tmp_path/"probe")
+    probe.put("x", detections)
+    entry_size = probe.stats()["bytes"]
+    cache = InferenceCache(tmp_path/"cache", max_bytes=2 * entry_size)
+
+    cache.put("a", detections)
+    cache.put("b", detections)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", detections)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert not (tmp_path/"cache"/"b.npy").exists()
+
+
+def test_concurrent_access(tmp_path):
+    cache = InferenceCache(tmp_path)
+
+    def put_get(i):
+        detections = np.full((50, 3, 5), float(i))
+        cache.put(str(i % 4), detections)
+        res = cache.get(str(i % 4))
+        return res is not None and res.shape == detections.shape
+
+    with ThreadPoolExecutor(8) as executor:
+        assert all(executor.map(put_get, range(64)))
+    assert cache.stats()["hits"] == 64
@@ -0,0 +1,86 @@
+from therapy_aid_tool import ingest as ingest_module
+from therapy_aid_tool.ingest import entries_from_dir, entries_from_manifest, ingest, Entry
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.models.video import VideoBuilder
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+
+
+def test_entries_from_dir(tmp_path):
+    for filename in ["Ana-Maria_2022-11-30.mp4", "Bob_2022-12-01.avi", "notes.txt", "README.mp4"]:
+        (tmp_path/filename).touch()
+    assert entries_from_dir(tmp_path) == [
+        Entry(str(tmp_path/"Ana-Maria_2022-11-30.mp4"), "Ana Maria", "2022-11-30"),
+        Entry(str(tmp_path/"Bob_2022-12-01.avi"), "Bob", "2022-12-01"),
+    ]
+
+
+def test_entries_from_manifest(tmp_path):
+    manifest = tmp_path/"manifest.csv"
+    manifest.write_text("video,toddler,date\n"
+                        "videos/a.mp4,Ana Maria,2022-11-30\n"
+                        "/data/b.mp4, Bob ,2022-12-01\n")
+    assert entries_from_manifest(manifest) == [
+        Entry(str(tmp_path/"videos/a.mp4"), "Ana Maria", "2022-11-30"),
+        Entry("/data/b.mp4", "Bob", "2022-12-01"),
+    ]
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """The worker processes as threads, so the stubs are seen by the workers"""
+
+    def __init__(self, max_workers, mp_context=None, **kwargs):
+        super().__init__(max_workers, **kwargs)
+
+
+def fake_build_video(filepath):
+    if "broken" in filepath:
+        raise RuntimeError("could not decode")
+    detections = np.full((10, 3, 5), np.nan)
+    detections[:, :, :4] = [0.5, 0.5, 0.2, 0.2]
+    detections[:, :, 4] = 0.9
+    return VideoBuilder.from_detections(filepath, detections, 30).build(), 0.1
+
+
+def test_ingest(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_module, "ProcessPoolExecutor", ThreadPool)
+    monkeypatch.setattr(ingest_module, "_build_video", fake_build_video)
+    transactions, depth = [], []
+    transaction = ConnectionManager.transaction
+
+    @contextmanager
+    def counting_transaction(self):
+        if not depth:  # the DAOs nest their own transactions in the ones of ingest
+            transactions.append(1)
+        depth.append(1)
+        try:
+            with transaction(self):
+                yield
+        finally:
+            depth.pop()
+    monkeypatch.setattr(ConnectionManager, "transaction", counting_transaction)
+
+    database = tmp_path/"sessions.db"
+    summary = ingest([Entry("a.mp4", "Ana", "day 1")], database, log=lambda _: None)
+    assert summary["added"] == 1 and transactions == [1]
+
+    entries = [
+        Entry("a.mp4", "Ana", "day 1"),  # already in the database
+        Entry("b.mp4", "Ana", "day 2"),
+        Entry("b-again.mp4", "Ana", "day 2"),  # repeated
+        Entry("c.mp4", "Bob", "day 1"),
+        Entry("broken.mp4", "Bob", "day 2"),
+        Entry("d.mp4", "Bob", "day 3"),
+    ]
+    summary = ingest(entries, database, batch=2, log=lambda _: None)
+    assert (summary["added"], summary["skipped"], summary["failed"]) == (3, 2, 1)
+    assert summary["frames"] == 30
+    assert len(transactions) == 1 + 2  # 2 sessions, then the last one
+
+    session_dao = SessionDAO(database)
+    for toddler, date in [("Ana", "day 1"), ("Ana", "day 2"), ("Bob", "day 1"), ("Bob", "day 3")]:
+        assert session_dao._get_id(toddler, date)
+    assert not session_dao._get_id("Bob", "day 2")
+    assert session_dao.get("Ana", "day 2").video.filepath == "b.mp4"
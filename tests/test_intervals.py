@@ -0,0 +1,78 @@
+from therapy_aid_tool.models._intervals import (
+    intervals_from_mask,
+    mask_from_intervals,
+    intervals_statistics,
+    compare_intervals,
+    IntervalTracker,
+)
+from itertools import groupby
+import numpy as np
+
+
+def groupby_statistics(interaction: list, frame_time: float):
+    """The statistics as they were computed before the interval engine"""
+    groups_of_interaction = [list(group) for k, group in groupby(interaction) if k]
+    if not groups_of_interaction:
+        return dict.fromkeys(
+            ["n_interactions", "total_time", "min_time", "max_time", "mean_time"])
+    total_time = interaction.count(1) * frame_time
+    return {
+        "n_interactions": len(groups_of_interaction),
+        "total_time": total_time,
+        "min_time": len(min(groups_of_interaction)) * frame_time,
+        "max_time": len(max(groups_of_interaction)) * frame_time,
+        "mean_time": total_time / len(groups_of_interaction),
+    }
+
+
+def test_intervals_from_mask():
+    mask = [False, True, True, False, True]
+    assert intervals_from_mask(mask).tolist() == [[1, 3], [4, 5]]
+    assert intervals_from_mask([True] * 3).tolist() == [[0, 3]]
+    assert intervals_from_mask([]).shape == (0, 2)
+    assert mask_from_intervals(intervals_from_mask(mask), 5).tolist() == mask
+
+
+def test_statistics_match_groupby():
+    rng = np.random.default_rng(0)
+    frame_time = 1 / 29.97
+    for _ in range(200):
+        # runs of random lengths
+        interaction = np.repeat(rng.random(50) < 0.5, rng.integers(1, 30, 50)).tolist()
+        statistics = intervals_statistics(intervals_from_mask(interaction), frame_time)
+        assert statistics == groupby_statistics(interaction, frame_time)
+
+
+def test_percentiles_and_histogram():
+    intervals = np.array([[0, 10], [20, 40], [50, 80]])
+    statistics = intervals_statistics(intervals, 0.5, percentiles=(50,), bins=2)
+    assert statistics["p50_time"] == 10.0
+    assert statistics["histogram"] == {"counts": [1, 2], "edges": [5.0, 10.0, 15.0]}
+
+    empty = intervals_statistics(np.empty((0, 2)), 0.5, percentiles=(50,), bins=2)
+    assert empty["p50_time"] is None and empty["histogram"] is None
+
+
+def test_compare_intervals():
+    reference = np.array([[0, 10], [20, 30]])
+    other = np.array([[2, 10], [20, 32]])
+    res = compare_intervals(reference, other, 40)
+    assert res["n_reference"] == res["n_other"] == 2
+    assert res["agreement"] == 36 / 40
+    assert res["iou"] == 18 / 22
+    assert res["boundary"] == 1.0
+
+
+def test_interval_tracker_matches_whole_mask():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        mask = np.repeat(rng.random(20) < 0.5, rng.integers(1, 10, 20))
+        splits = np.sort(rng.integers(0, len(mask), 5))
+        tracker = IntervalTracker()
+        for segment in np.split(mask, splits):
+            tracker.update(segment)
+            expected = intervals_from_mask(mask[:tracker.n_frames])
+            assert tracker.intervals().tolist() == expected.tolist()
+            # Only the runs followed by a False frame are closed
+            open_run = len(expected) and expected[-1, 1] == tracker.n_frames
+            assert tracker.closed.tolist() == expected[:len(expected) - open_run].tolist()
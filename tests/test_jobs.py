@@ -0,0 +1,110 @@
+from therapy_aid_tool.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from therapy_aid_tool.utils.filepaths import save_stream
+import io
+import numpy as np
+import time
+
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(tmp_path/"jobs.db", tmp_path/"spool", **kwargs)
+
+
+def test_enqueue_once_per_content(tmp_path):
+    queue = make_queue(tmp_path)
+    (tmp_path/"a.mp4").write_bytes(b"video a")
+    (tmp_path/"copy.mp4").write_bytes(b"video a")
+    (tmp_path/"b.mp4").write_bytes(b"video b")
+
+    job_id = queue.enqueue(tmp_path/"a.mp4")
+    assert queue.enqueue(tmp_path/"copy.mp4") == job_id
+    assert queue.enqueue(tmp_path/"b.mp4") != job_id
+
+    # The job keeps its own link to the video, replacing the upload does not change it
+    save_stream(io.BytesIO(b"another upload"), tmp_path/"a.mp4")
+    job = queue.get(job_id)
+    assert job.state == QUEUED and open(job.filepath, "rb").read() == b"video a"
+
+
+def test_claim_respects_max_running(tmp_path):
+    queue = make_queue(tmp_path, max_running=1)
+    for name in "ab":
+        (tmp_path/f"{name}.mp4").write_bytes(name.encode())
+        queue.enqueue(tmp_path/f"{name}.mp4")
+
+    first = queue.claim()
+    assert first.state == RUNNING and first.attempts == 1
+    assert queue.claim() is None  # another worker has to wait
+
+    queue.finish(first.id, first.attempts, np.zeros((4, 3, 5)), 30)
+    second = queue.claim()
+    assert second.id != first.id and queue.claim() is None
+
+
+def test_retries_then_fails(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    (tmp_path/"a.mp4").write_bytes(b"a")
+    job_id = queue.enqueue(tmp_path/"a.mp4")
+
+    job = queue.claim()
+    assert queue.fail(job.id, job.attempts, "boom") == QUEUED
+    job = queue.claim()
+    assert queue.fail(job.id, job.attempts, "boom again") == FAILED
+    job = queue.get(job_id)
+    assert job.state == FAILED and job.attempts == 2 and job.error == "boom again"
+    # A failed video can be enqueued again
+    assert queue.enqueue(tmp_path/"a.mp4") != job_id
+
+
+def test_stale_job_is_claimed_again(tmp_path):
+    queue = make_queue(tmp_path, stale_after=0.05)
+    (tmp_path/"a.mp4").write_bytes(b"a")
+    job_id = queue.enqueue(tmp_path/"a.mp4")
+    stale = queue.claim()
+    time.sleep(0.1)  # the worker died without progress
+
+    job = queue.claim()
+    assert job.id == job_id and job.attempts == 2
+
+    # The first worker was only slow, it can not touch the job anymore
+    assert not queue.progress(stale.id, stale.attempts, 5, 10)
+    assert not queue.finish(stale.id, stale.attempts, np.zeros((10, 3, 5)), 30)
+    assert queue.fail(stale.id, stale.attempts, "late") is None
+    assert queue.get(job_id).state == RUNNING and queue.get(job_id).frames_done == 0
+    assert queue.progress(job.id, job.attempts, 5, 10)
+
+
+def test_result_of_done_job(tmp_path):
+    queue = make_queue(tmp_path)
+    (tmp_path/"a.mp4").write_bytes(b"a")
+    job = queue.get(queue.enqueue(tmp_path/"a.mp4"))
+    assert queue.result(job.id) is None
+
+    detections = np.full((10, 3, 5), np.nan)
+    detections[:, :, :4] = [0.5, 0.5, 0.2, 0.2]
+    detections[:, :, 4] = 0.9
+    claimed = queue.claim()
+    queue.finish(claimed.id, claimed.attempts, detections, 30)
+
+    video = queue.result(job.id)
+    assert queue.get(job.id).state == DONE
+    assert video.fps == 30 and len(video.closeness["td_ct"]) == 10
+    np.testing.assert_allclose(video.detections, detections)
+
+
+def test_run_does_not_hash_the_video_again(tmp_path, monkeypatch):
+    from therapy_aid_tool import jobs
+    from therapy_aid_tool.models.video import VideoBuilder
+    from therapy_aid_tool.utils.filepaths import file_sha256
+
+    queue = make_queue(tmp_path)
+    (tmp_path/"a.mp4").write_bytes(b"a")
+    job_id = queue.enqueue(tmp_path/"a.mp4", sha256="known")
+
+    class Stream:
+        def stream(filepath, on_progress=None, sha256=None):
+            assert sha256 == "known"
+            yield VideoBuilder.from_detections(filepath, np.zeros((2, 3, 5)), 30).build()
+
+    monkeypatch.setattr(jobs, "VideoBuilder", Stream)
+    assert queue.run(queue.claim()) == DONE
+    assert queue.get(job_id).video_sha256 == "known" != file_sha256(tmp_path/"a.mp4")
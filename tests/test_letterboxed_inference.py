@@ -0,0 +1,140 @@
+from therapy_aid_tool.models._video_inference import (
+    ModelRegistry,
+    TorchDetector,
+    model_stride,
+    detections_from_letterboxed,
+    load_detector,
+    non_max_suppression,
+)
+from therapy_aid_tool.utils.video import letterbox
+import numpy as np
+import pytest
+import torch
+
+
+class RawModel(torch.nn.Module):
+    """Returns the same raw YOLOv5 output for each image of the batch"""
+
+    conf, iou = 0.75, 0.45
+
+    def __init__(self, raw):
+        super().__init__()
+        self.raw = torch.nn.Parameter(torch.tensor(raw), requires_grad=False)
+
+    def forward(self, x):
+        return self.raw[None].expand(len(x), -1, -1), None
+
+
+RAW = [
+    # x, y, w, h (input pixels), objectness, scores of the 3 classes
+    [32, 32, 32, 19, 0.9, 0.1, 0.95, 0.2],  # class 1, conf 0.855
+    [33, 32, 32, 19, 0.9, 0.1, 0.9, 0.2],  # same box, lower conf: suppressed
+    [10, 20, 8, 8, 0.9, 0.5, 0.1, 0.1],  # conf 0.45: below the threshold
+    [60, 40, 10, 10, 0.99, 0.9, 0.1, 0.1],  # class 0, out of the frame on the right
+]
+
+
+def test_non_max_suppression():
+    kept, = non_max_suppression(torch.tensor([RAW]), 0.75, 0.45)
+    assert kept[:, 5].tolist() == [0, 1] or kept[:, 5].tolist() == [1, 0]
+    assert len(kept) == 2
+
+
+def test_detections_from_letterboxed():
+    box = letterbox(100, 60, 64)  # 64x38 frame, 13 rows of padding on top
+    assert (box.top, box.input_height) == (13, 64)
+    inputs = box.buffer(2)
+
+    detections = detections_from_letterboxed(RawModel(RAW), inputs, box, 3)
+    assert detections.shape == (2, 3, 5)
+    np.testing.assert_allclose(detections[0, 1], [0.5, (32 - 13) / 0.64 / 60, 0.5,
+                                                  19 / 0.64 / 60, 0.855], rtol=1e-5)
+    assert np.isnan(detections[:, 2]).all()
+    # Clipped to the right edge of the frame
+    x, _, w, _, _ = detections[1, 0]
+    np.testing.assert_allclose(x + w / 2, 1, rtol=1e-5)
+
+
+def test_load_detector_unknown_backend():
+    with pytest.raises(ValueError):
+        load_detector("tensorrt")
+
+
+def test_onnx_detector_gets_the_process_threads(monkeypatch):
+    from therapy_aid_tool.models import _video_inference
+
+    threads = []
+    monkeypatch.setattr(_video_inference, "OnnxDetector",
+                        lambda weights, conf_th, iou_th, n: threads.append(n))
+    monkeypatch.setattr(_video_inference, "_TORCH_THREADS", None)
+    monkeypatch.setattr(_video_inference, "TORCH_INTRA_OP_THREADS", 3)
+    load_detector("onnxruntime")
+    # e.g. set by the initializer of a worker process
+    monkeypatch.setattr(_video_inference, "_TORCH_THREADS", 2)
+    load_detector("onnxruntime")
+    assert threads == [3, 2]
+
+
+def test_registry_keys_by_backend():
+    torch_key = ModelRegistry.key("weights.pt", backend="torch")
+    assert torch_key != ModelRegistry.key("weights.pt", backend="onnxruntime")
+    assert ModelRegistry.key(backend="onnxruntime")[1].endswith(".onnx")
+
+
+def test_torch_detector_runs_in_inference_mode():
+    modes = []
+
+    class Recording(RawModel):
+        def forward(self, x):
+            modes.append(torch.is_inference_mode_enabled())
+            return super().forward(x)
+
+    box = letterbox(100, 60, 64)
+    detections = TorchDetector(Recording(RAW)).detect_letterboxed(box.buffer(1), box, 3)
+    assert modes == [True] and detections.shape == (1, 3, 5)
+
+    # Without the AutoShape and DetectMultiBackend wrappers
+    detector = TorchDetector(Recording(RAW), inference_mode=False, channels_last=True)
+    detector.detect_letterboxed(box.buffer(1), box, 3)
+    assert modes == [True, False]
+
+
+def test_model_stride():
+    class P6Network(RawModel):
+        stride = torch.tensor([8., 16., 32., 64.])
+
+    class AutoShape:
+        stride = 64
+
+    assert model_stride(P6Network(RAW)) == 64 and model_stride(AutoShape()) == 64
+    assert model_stride(RawModel(RAW)) == 32
+    assert TorchDetector(P6Network(RAW)).stride == 64
+
+
+def test_calibration_inputs_pad_to_the_stride(tmp_path):
+    import cv2
+    from therapy_aid_tool.models.export import calibration_inputs
+
+    filepath = str(tmp_path/"video.avi")
+    writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*"MJPG"), 30, (160, 90))
+    for _ in range(2):
+        writer.write(np.zeros((90, 160, 3), dtype=np.uint8))
+    writer.release()
+
+    inputs = list(calibration_inputs([filepath], 2, size=128, stride=64))
+    assert [x.shape for x in inputs] == [(1, 3, 128, 128)] * 2  # 72 rows padded to 128
+
+
+def test_onnx_stride_metadata(tmp_path):
+    onnx = pytest.importorskip("onnx")
+    from therapy_aid_tool.models.export import _set_metadata, onnx_stride
+
+    graph = onnx.helper.make_graph(
+        [onnx.helper.make_node("Identity", ["images"], ["output"])], "identity",
+        [onnx.helper.make_tensor_value_info("images", onnx.TensorProto.FLOAT, [1])],
+        [onnx.helper.make_tensor_value_info("output", onnx.TensorProto.FLOAT, [1])])
+    model = tmp_path/"model.onnx"
+    onnx.save(onnx.helper.make_model(graph), str(model))
+    assert onnx_stride(model) == 32  # exported before the stride was recorded
+    _set_metadata(model, {"stride": 64})
+    assert onnx_stride(model) == 64
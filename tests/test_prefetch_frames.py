@@ -0,0 +1,105 @@
+from therapy_aid_tool.utils.video import get_frame_size, letterbox, prefetch_frames
+from contextlib import closing
+import cv2
+import numpy as np
+import pytest
+
+
+class FakeCapture:
+    """Mimics cv2.VideoCapture.read() returning the frame index as the frame"""
+
+    def __init__(self, n_frames, fail_at=None):
+        self.n_frames = n_frames
+        self.fail_at = fail_at
+        self.idx = 0
+
+    def read(self):
+        if self.idx == self.fail_at:
+            raise RuntimeError("decoder failure")
+        if self.idx >= self.n_frames:
+            return False, None
+        self.idx += 1
+        return True, self.idx - 1
+
+
+def test_frames_in_order_until_eof():
+    frames = list(prefetch_frames(FakeCapture(50), 100, queue_size=4))
+    assert frames == list(range(50))
+
+
+def test_stops_at_n_frames():
+    frames = list(prefetch_frames(FakeCapture(50), 10, queue_size=4))
+    assert frames == list(range(10))
+
+
+def test_decoder_error_is_raised():
+    with pytest.raises(RuntimeError):
+        list(prefetch_frames(FakeCapture(50, fail_at=20), 50, queue_size=2))
+
+
+def test_early_close_stops_decoder():
+    cap = FakeCapture(1000)
+    frames = prefetch_frames(cap, 1000, queue_size=2)
+    with closing(frames):
+        for frame in frames:
+            if frame == 5:
+                break
+    # The decoder is joined on close and never gets more than the queue ahead
+    assert cap.idx <= 5 + 1 + 2 + 1
+
+
+def test_transform_runs_on_decoded_frames():
+    frames = list(prefetch_frames(FakeCapture(5), 5, queue_size=2, transform=lambda x: -x))
+    assert frames == [0, -1, -2, -3, -4]
+
+
+def test_letterbox():
+    box = letterbox(1920, 1080, 256)
+    assert (box.width, box.height) == (256, 144)
+    assert (box.input_width, box.input_height) == (256, 160)
+    assert (box.left, box.top) == (0, 8)
+
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    frame[..., 0] = 255  # blue, in BGR
+    inputs = box.buffer(2)
+    box.fill(inputs[1], box.resize(frame))
+    assert inputs.shape == (2, 160, 256, 3)
+    assert (inputs[1, 8:152, :, 2] == 255).all() and (inputs[1, 8:152, :, :2] == 0).all()
+    assert (inputs[1, :8] == 114).all() and (inputs[1, 152:] == 114).all()
+    assert (inputs[0] == 114).all()
+
+
+def test_letterbox_stride_64():
+    # The P6 models (e.g. yolov5n6) downsample 64 times, 736 rows would not fit
+    box = letterbox(1920, 1080, 1280, stride=64)
+    assert (box.width, box.height) == (1280, 720)
+    assert (box.input_width, box.input_height) == (1280, 768)
+    assert (box.left, box.top) == (0, 24)
+
+
+def test_frame_size_of_container_without_size(tmp_path):
+    filepath = str(tmp_path/"video.avi")
+    writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for _ in range(3):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+
+    class NoSizeCapture:
+        def __init__(self, filepath):
+            self.cap = cv2.VideoCapture(filepath)
+
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+
+        def get(self, prop):
+            if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+                return 0.0
+            return self.cap.get(prop)
+
+    cap = NoSizeCapture(filepath)
+    assert get_frame_size(cap) == (64, 48)
+    assert len(list(prefetch_frames(cap, 10))) == 3  # back at the first frame
+    cap.release()
+
+    with pytest.raises(ValueError):
+        letterbox(0, 0, 256)
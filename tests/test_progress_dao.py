@@ -0,0 +1,50 @@
+from therapy_aid_tool.DAOs._create_db_squema import create_schema
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
+from therapy_aid_tool.models.session import Session
+from therapy_aid_tool.models.toddler import Toddler
+from therapy_aid_tool.models.video import Video
+
+
+def make_video(filepath, n_interactions):
+    statistics = {
+        inter_type: {"n_interactions": n_interactions, "total_time": 1.5,
+                     "min_time": 0.5, "max_time": 1.0, "mean_time": 0.75}
+        for inter_type in ["td_ct", "td_pm", "ct_pm"]}
+    statistics["ct_pm"] = dict.fromkeys(statistics["ct_pm"])  # no interactions
+    return Video(filepath, {}, {}, statistics)
+
+
+def test_progress_follows_sessions(tmp_path):
+    database = tmp_path/"test.db"
+    create_schema(database)
+    manager = ConnectionManager(database)
+    toddler = Toddler("Ana")
+    ToddlerDAO(manager).add(toddler)
+    session_dao, progress_dao = SessionDAO(manager), ProgressDAO(manager)
+    for n, date in enumerate(["2022-01-03", "2022-01-01", "2022-01-02"], 1):
+        video = make_video(f"{date}.mp4", n)
+        VideoDAO(manager).add(video)
+        session_dao.add(Session(toddler, video, date))
+
+    progress = progress_dao.get("Ana")
+    assert progress["td_ct"]["n_interactions"] == [2, 3, 1]  # ordered by date
+    assert progress["td_pm"]["mean_time"] == [0.75] * 3
+    assert progress["ct_pm"]["n_interactions"] == [None] * 3
+
+    session_dao.update("Ana", "2022-01-03", Session(toddler, make_video("2022-01-03.mp4", 1),
+                                                    "2021-12-31"))
+    session_dao.remove("Ana", "2022-01-01")
+    assert progress_dao.get("Ana")["td_ct"]["n_interactions"] == [1, 3]
+
+    VideoDAO(manager).update("2022-01-02.mp4", make_video("new.mp4", 7))
+    assert progress_dao.get("Ana")["td_ct"]["n_interactions"] == [1, 7]
+
+    rows = progress_dao.get_all()
+    assert progress_dao.rebuild() == 2
+    assert sorted(progress_dao.get_all()) == sorted(rows)
+    assert progress_dao.get("Bob")["td_ct"]["n_interactions"] == []
+    manager.close_all()
@@ -0,0 +1,46 @@
+from therapy_aid_tool.DAOs._create_db_squema import create_schema
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.models.session import Session
+from therapy_aid_tool.models.toddler import Toddler
+from therapy_aid_tool.models.video import Video
+
+
+def make_video(filepath):
+    closeness = {"td_ct": [0.5, 0.25, 0.0]}
+    interactions = {"td_ct": [True, True, False]}
+    statistics = {"td_ct": {"n_interactions": 1, "total_time": 0.2}}
+    return Video(filepath, closeness, interactions, statistics)
+
+
+def test_sessions_load_per_frame_data_lazily(tmp_path):
+    database = tmp_path/"test.db"
+    create_schema(database)
+    manager = ConnectionManager(database)
+    toddler = Toddler("Ana")
+    ToddlerDAO(manager).add(toddler)
+    for date in ["2022-01-02", "2022-01-01"]:
+        video = make_video(f"{date}.mp4")
+        VideoDAO(manager).add(video)
+        SessionDAO(manager).add(Session(toddler, video, date))
+
+    statements = []
+    manager.connection().set_trace_callback(statements.append)
+    sessions = SessionDAO(manager).get_all_from_name("Ana")
+    assert len(statements) == 1
+    assert [session.date for session in sessions] == ["2022-01-02", "2022-01-01"]
+    assert sessions[0].toddler.name == "Ana"
+    assert sessions[0].video.interactions_statistics["td_ct"]["n_interactions"] == 1
+    assert len(statements) == 1
+
+    assert sessions[1].video.interactions == {"td_ct": [True, True, False]}
+    assert sessions[1].video.closeness == {"td_ct": [0.5, 0.25, 0.0]}
+    assert len(statements) == 3
+
+    session = SessionDAO(manager).get("Ana", "2022-01-01")
+    assert session.video.filepath == "2022-01-01.mp4"
+    assert SessionDAO(manager).get("Ana", "2022-01-03") is None
+    assert SessionDAO(manager).get_all_from_name("Bob") == []
+    manager.close_all()
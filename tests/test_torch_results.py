@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from therapy_aid_tool.models._video_inference import detections_from_xywhn
+
+
+def best_by_sort(preds, n_classes):
+    """The per class selection of the first `preds_from_torch_results`: a stable
+    sort by conf, the last one wins"""
+    best = [[float("-inf")] * 5 for _ in range(n_classes)]
+    for c in range(n_classes):
+        class_preds = [best[c]] + [pred[:5] for pred in preds if pred[5] == c]
+        best[c] = sorted(class_preds, key=lambda x: x[-1])[-1]
+    return [None if float("-inf") in pred else pred for pred in best]
+
+
+def test_selection_matches_per_class_sort():
+    rng = np.random.default_rng(0)
+    images = []
+    for n_preds in [0, 1, 2, 5, 12, 30]:
+        preds = rng.random((n_preds, 6)).astype(np.float32)
+        preds[:, 4] = rng.integers(0, 4, n_preds) / 4  # coarse conf, many ties
+        preds[:, 5] = rng.integers(0, 2, n_preds)  # class 2 is never predicted
+        images.append(preds)
+
+    detections = detections_from_xywhn([torch.tensor(preds) for preds in images], 3)
+
+    assert detections.shape == (len(images), 3, 5)
+    for preds, image_detections in zip(images, detections):
+        for expected, detection in zip(best_by_sort(preds.tolist(), 3), image_detections):
+            if expected is None:
+                assert np.isnan(detection).all()
+            else:
+                np.testing.assert_array_equal(detection, np.float32(expected))
+
+
+def test_batch_without_predictions():
+    detections = detections_from_xywhn([torch.zeros((0, 6)), torch.zeros((0, 6))], 3)
+    assert detections.shape == (2, 3, 5) and np.isnan(detections).all()
@@ -1,4 +1,5 @@
 from therapy_aid_tool.models.video import VideoBuilder
+from therapy_aid_tool.models._checkpoints import CheckpointStore
 from pathlib import Path
 import requests
 
@@ -17,7 +18,7 @@ def test_frames_count():
 
     # This video has 33 frames
     filepath = str(ROOT/"quick_video_plusme.mp4")
-    video = VideoBuilder(filepath).build()
+    video = VideoBuilder(filepath, cache=None, checkpoints=None).build()
 
     closeness = video.closeness
     interactions = video.interactions
@@ -29,3 +30,34 @@ def test_frames_count():
     assert frames_count2 == 33
 
     Path(ROOT/"quick_video_plusme.mp4").unlink()
+
+
+def test_stream_frames_count():
+    download_quick_video()
+
+    # This video has 33 frames
+    filepath = str(ROOT/"quick_video_plusme.mp4")
+    progress = []
+    videos = list(VideoBuilder.stream(filepath, chunk_size=10, on_progress=progress.append,
+                                      cache=None, checkpoints=None))
+
+    # Partial videos every 10 frames, then the complete one
+    assert [len(video.closeness["td_ct"]) for video in videos] == [10, 20, 30, 33]
+    assert progress[-1].frames_done == progress[-1].total_frames == 33
+    assert videos[-1].interactions == VideoBuilder(filepath, cache=None, checkpoints=None).build().interactions
+
+
+def test_resume_from_checkpoint(tmp_path):
+    download_quick_video()
+
+    filepath = str(ROOT/"quick_video_plusme.mp4")
+    checkpoints = CheckpointStore(tmp_path, every=10)
+    # Interrupted after 20 frames
+    videos = VideoBuilder.stream(filepath, chunk_size=10, cache=None, checkpoints=checkpoints)
+    next(videos), next(videos)
+    videos.close()
+    assert list(tmp_path.iterdir())
+
+    video = VideoBuilder(filepath, cache=None, checkpoints=checkpoints).build()
+    assert video.interactions == VideoBuilder(filepath, cache=None, checkpoints=None).build().interactions
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,61 @@
+from therapy_aid_tool.DAOs._create_db_squema import create_schema
+from therapy_aid_tool.DAOs.connection import ConnectionManager
+from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
+from therapy_aid_tool.models.session import Session
+from therapy_aid_tool.models.toddler import Toddler
+from therapy_aid_tool.models.video import Video, VideoBuilder
+import numpy as np
+
+
+def sample_detections(n_frames=300, seed=0):
+    """Actors moving around, sometimes undetected"""
+    rng = np.random.default_rng(seed)
+    detections = np.empty((n_frames, 3, 5), dtype=np.float32)
+    t = np.linspace(0, 10, n_frames)[:, None, None]
+    detections[..., :2] = 0.5 + 0.2 * np.sin(t + rng.random((3, 2)) * 6)
+    detections[..., 2:4] = 0.3
+    detections[..., 4] = rng.uniform(0.75, 1, (n_frames, 3))
+    detections[rng.random((n_frames, 3)) < 0.1] = np.nan
+    return detections.astype(np.float64)
+
+
+def test_recompute_from_stored_detections(tmp_path):
+    database = tmp_path/"test.db"
+    create_schema(database)
+    manager = ConnectionManager(database)
+    detections = sample_detections()
+    video = VideoBuilder.from_detections("a.mp4", detections, 30).build()
+    toddler = Toddler("Ana")
+    ToddlerDAO(manager).add(toddler)
+    VideoDAO(manager).add(video)
+    SessionDAO(manager).add(Session(toddler, video, "2022-01-01"))
+    # Stored before the detections were kept
+    VideoDAO(manager).add(Video("b.mp4", video.closeness, video.interactions,
+                                video.interactions_statistics))
+
+    stored = VideoDAO(manager).get("a.mp4")
+    np.testing.assert_array_equal(stored.detections, detections)
+    assert stored.fps == 30
+    # Percentiles and histograms of the durations, through the JSON
+    assert stored.interactions_statistics == video.interactions_statistics
+    for stat_group in stored.interactions_statistics.values():
+        assert {"p50_time", "p90_time", "histogram"} <= set(stat_group)
+        if stat_group["n_interactions"]:
+            assert sum(stat_group["histogram"]["counts"]) == stat_group["n_interactions"]
+            assert len(stat_group["histogram"]["edges"]) == VideoBuilder.DURATION_BINS + 1
+    assert SessionDAO(manager).get("Ana", "2022-01-01").video.detections.shape == (300, 3, 5)
+
+    assert VideoDAO(manager).recompute(closeness_threshold=0.2, conf_th=0.8) == (1, 1)
+    expected = VideoBuilder.from_detections("a.mp4", detections, 30, 0.2, 0.8).build()
+    recomputed = VideoDAO(manager).get("a.mp4")
+    assert recomputed.interactions == expected.interactions
+    assert recomputed.interactions_statistics == expected.interactions_statistics
+    assert recomputed.interactions_statistics != video.interactions_statistics
+
+    progress = ProgressDAO(manager).get("Ana")
+    assert progress["td_ct"]["n_interactions"] == [
+        expected.interactions_statistics["td_ct"]["n_interactions"]]
+    manager.close_all()
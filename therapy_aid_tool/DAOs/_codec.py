@@ -0,0 +1,179 @@
+"""Compact binary codec for the per-frame columns of the videos table
+
+A blob is a fixed header followed by the zlib compressed values:
+
+    magic     4s    b"TATC"
+    version   B     codec version (1)
+    kind      B     what is stored (closeness, interactions, detections)
+    dtype     B     how the values are stored (bits, uint8, float16, float32)
+    n_frames  I     frames count
+    n_names   B     number of series (e.g. the pairs 'td_ct', 'td_pm', 'ct_pm')
+    names           for each series, its utf-8 name prefixed by its length (B)
+
+The values are a (n_names, n_frames) array, in the order of the names:
+    closeness:    float16 (default), float32 or uint8 (value * 254, 255 for NaN)
+    interactions: one bit per frame, packed with np.packbits
+    detections:   float32, a (n_names, n_frames, 5) array with the x, y, w, h, conf
+                  of each class (the names) in each frame
+
+Rows written before the codec existed hold JSON text, `decode` reads both.
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+
+MAGIC = b"TATC"
+VERSION = 1
+
+KIND_CLOSENESS = 1
+KIND_INTERACTIONS = 2
+KIND_DETECTIONS = 3
+
+DTYPE_BITS = 0
+DTYPE_UINT8 = 1
+DTYPE_FLOAT16 = 2
+DTYPE_FLOAT32 = 3
+
+DTYPES = {
+    "uint8": DTYPE_UINT8,
+    "float16": DTYPE_FLOAT16,
+    "float32": DTYPE_FLOAT32,
+}
+
+_HEADER = struct.Struct("<4sBBBIB")
+_UINT8_NAN = 255
+_UINT8_SCALE = 254
+
+
+def is_encoded(value):
+    """Whether a column value was written by this codec (and not as JSON)"""
+    return isinstance(value, bytes) and value[:len(MAGIC)] == MAGIC
+
+
+def _pack(kind: int, dtype: int, n_frames: int, names: list, payload: bytes):
+    header = _HEADER.pack(MAGIC, VERSION, kind, dtype, n_frames, len(names))
+    for name in names:
+        name = name.encode()
+        header += struct.pack("<B", len(name)) + name
+    return header + zlib.compress(payload)
+
+
+def _unpack(blob: bytes):
+    magic, version, kind, dtype, n_frames, n_names = _HEADER.unpack_from(blob)
+    if version > VERSION:
+        raise ValueError(f"Unsupported codec version {version}")
+    offset = _HEADER.size
+    names = []
+    for _ in range(n_names):
+        length = blob[offset]
+        names.append(blob[offset + 1:offset + 1 + length].decode())
+        offset += 1 + length
+    return kind, dtype, n_frames, names, zlib.decompress(blob[offset:])
+
+
+def encode_closeness(closeness: dict, dtype: str = "float16"):
+    """Encode the closeness of a video
+
+    Args:
+        closeness (dict): Closeness for each frame, keyed by pair of actors
+            e.g. {'td_ct': [float, ...], 'td_pm': [...], 'ct_pm': [...]}
+        dtype (str, optional): "float16", "float32" or "uint8". float16 keeps
+            about 3 significant digits, uint8 steps of 1/254. Defaults to "float16".
+
+    Returns:
+        bytes: The encoded closeness
+    """
+    names = list(closeness)
+    values = np.array([closeness[name] for name in names], dtype=np.float64, ndmin=2)
+    if dtype == "uint8":
+        quantized = np.full(values.shape, _UINT8_NAN, dtype=np.uint8)
+        valid = ~np.isnan(values)
+        quantized[valid] = np.rint(np.clip(values[valid], 0, 1) * _UINT8_SCALE)
+        payload = quantized.tobytes()
+    else:
+        payload = values.astype(dtype).tobytes()
+    return _pack(KIND_CLOSENESS, DTYPES[dtype], values.shape[1], names, payload)
+
+
+def encode_interactions(interactions: dict):
+    """Encode the interactions of a video, one bit per frame
+
+    Args:
+        interactions (dict): Interactions for each frame, keyed by pair of actors
+            e.g. {'td_ct': [bool, ...], 'td_pm': [...], 'ct_pm': [...]}
+
+    Returns:
+        bytes: The encoded interactions
+    """
+    names = list(interactions)
+    values = np.array([interactions[name] for name in names], dtype=bool, ndmin=2)
+    payload = np.packbits(values, axis=1).tobytes()
+    return _pack(KIND_INTERACTIONS, DTYPE_BITS, values.shape[1], names, payload)
+
+
+def encode_detections(detections: np.ndarray, class_names: list):
+    """Encode the per-frame detections of a video
+
+    Args:
+        detections (np.ndarray): (frames, classes, 5) detections array, NaN
+            where a class was not detected
+        class_names (list): Name of each class, in the order of the array
+
+    Returns:
+        bytes: The encoded detections
+    """
+    values = np.asarray(detections, dtype=np.float32).transpose(1, 0, 2)
+    payload = np.ascontiguousarray(values).tobytes()
+    return _pack(KIND_DETECTIONS, DTYPE_FLOAT32, len(detections), list(class_names), payload)
+
+
+def decode_detections(value: bytes):
+    """Decode the detections written by `encode_detections`
+
+    Returns:
+        tuple[np.ndarray, list[str]]: The (frames, classes, 5) float64 detections
+            array and the name of each class
+    """
+    kind, dtype, n_frames, names, payload = _unpack(value)
+    if kind != KIND_DETECTIONS:
+        raise ValueError(f"Not encoded detections (kind {kind})")
+    values = np.frombuffer(payload, dtype=np.float32).reshape(len(names), n_frames, 5)
+    return values.transpose(1, 0, 2).astype(np.float64), names
+
+
+def decode(value):
+    """Decode a closeness or interactions column value
+
+    Args:
+        value (bytes | str): A blob written by this codec or the JSON text
+            written before it existed
+
+    Returns:
+        dict: The lists of values keyed by pair of actors, as they were encoded
+            (closeness values are rounded to the dtype they were stored with)
+    """
+    if not is_encoded(value):
+        return json.loads(value)
+
+    kind, dtype, n_frames, names, payload = _unpack(value)
+    if not names:
+        return {}
+    if dtype == DTYPE_BITS:
+        packed = np.frombuffer(payload, dtype=np.uint8).reshape(len(names), -1)
+        values = np.unpackbits(packed, axis=1, count=n_frames).astype(bool)
+    elif dtype == DTYPE_UINT8:
+        quantized = np.frombuffer(payload, dtype=np.uint8).reshape(len(names), n_frames)
+        values = quantized / _UINT8_SCALE
+        values[quantized == _UINT8_NAN] = np.nan
+    elif dtype == DTYPE_FLOAT16:
+        values = np.frombuffer(payload, dtype=np.float16).reshape(len(names), n_frames)
+        values = values.astype(np.float64)
+    elif dtype == DTYPE_FLOAT32:
+        values = np.frombuffer(payload, dtype=np.float32).reshape(len(names), n_frames)
+        values = values.astype(np.float64)
+    else:
+        raise ValueError(f"Unknown codec dtype {dtype}")
+    return {name: row.tolist() for name, row in zip(names, values)}
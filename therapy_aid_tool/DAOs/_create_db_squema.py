@@ -1,29 +1,25 @@
 import sqlite3
 from pathlib import Path
 
+from therapy_aid_tool.DAOs.progress_dao import _insert_progress
 
-def _create_schema(database):
-    con = sqlite3.connect(database)
-    cur = con.cursor()
-    cur.execute("PRAGMA foreign_keys = ON")
 
+def _create_tables(cur):
     # Toddlers Table
-    querry = "CREATE TABLE toddlers(id INTEGER PRIMARY KEY, name TEXT);"
+    querry = "CREATE TABLE IF NOT EXISTS toddlers(id INTEGER PRIMARY KEY, name TEXT);"
     cur.execute(querry)
-    con.commit()
 
     # Videos Table
-    querry = """CREATE TABLE videos(
+    querry = """CREATE TABLE IF NOT EXISTS videos(
         id INTEGER PRIMARY KEY,
         filepath TEXT,
         closeness TEXT,
         interactions TEXT,
         interactions_statistics TEXT);"""
     cur.execute(querry)
-    con.commit()
 
     # Sessions Table
-    querry = """CREATE TABLE sessions(
+    querry = """CREATE TABLE IF NOT EXISTS sessions(
         id INTEGER PRIMARY KEY,
         toddler_id,
         video_id,
@@ -32,22 +28,116 @@ def _create_schema(database):
         FOREIGN KEY(video_id) REFERENCES videos(id)
         );"""
     cur.execute(querry)
-    con.commit()
+
+
+def _create_lookup_indexes(cur):
+    # The keys the DAOs `_get_id` search by. The DAOs never insert duplicates,
+    # if an older database has some the migration fails and is rolled back.
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS toddlers_name ON toddlers(name)")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS videos_filepath ON videos(filepath)")
+    cur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS sessions_toddler_date
+                   ON sessions(toddler_id, date)""")
+    cur.execute("CREATE INDEX IF NOT EXISTS sessions_video ON sessions(video_id)")
+
+
+def _create_progress_table(cur):
+    # Maintained by SessionDAO, see ProgressDAO
+    querry = """CREATE TABLE IF NOT EXISTS toddler_progress(
+        session_id INTEGER NOT NULL,
+        toddler_id INTEGER NOT NULL,
+        date TEXT,
+        type TEXT NOT NULL,
+        n_interactions INTEGER,
+        total_time REAL,
+        min_time REAL,
+        max_time REAL,
+        mean_time REAL,
+        PRIMARY KEY(session_id, type),
+        FOREIGN KEY(session_id) REFERENCES sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY(toddler_id) REFERENCES toddlers(id)
+        );"""
+    cur.execute(querry)
+    cur.execute("""CREATE INDEX IF NOT EXISTS toddler_progress_toddler_date
+                   ON toddler_progress(toddler_id, date)""")
+    _insert_progress(cur)
+
+
+def _add_detections_columns(cur):
+    # The raw per-frame detections, to recompute the rest without the model
+    cur.execute("ALTER TABLE videos ADD COLUMN detections BLOB")
+    cur.execute("ALTER TABLE videos ADD COLUMN fps REAL")
+
+
+# Schema version -> migration upgrading the previous version to it.
+# Append new migrations at the end, never edit the ones already released.
+MIGRATIONS = {
+    1: _create_tables,
+    2: _create_lookup_indexes,
+    3: _create_progress_table,
+    4: _add_detections_columns,
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
+def _schema_version(cur):
+    """Version of the database schema, 0 for an empty database"""
+    cur.execute("CREATE TABLE IF NOT EXISTS schema_version(version INTEGER NOT NULL)")
+    res = cur.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return res[0] or 0
+
+
+def migrate(database):
+    """Upgrade the database schema in place to `SCHEMA_VERSION`
+
+    Each pending migration runs in its own transaction, with the version it
+    upgrades to, so an interrupted upgrade resumes from the last one applied.
+    Databases created before the versioning are at version 1 once the
+    `schema_version` table is added.
+
+    Args:
+        database (str | Path): Database path
+
+    Returns:
+        int: The schema version before the upgrade
+    """
+    con = sqlite3.connect(database, timeout=30, isolation_level=None)
+    cur = con.cursor()
+    cur.execute("PRAGMA foreign_keys = ON")
+    try:
+        cur.execute("BEGIN IMMEDIATE")  # one migrating connection at a time
+        initial_version = _schema_version(cur)
+        cur.execute("COMMIT")
+
+        for version in sorted(v for v in MIGRATIONS if v > initial_version):
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if _schema_version(cur) < version:
+                    MIGRATIONS[version](cur)
+                    cur.execute("INSERT INTO schema_version(version) VALUES(?)", [version])
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+    finally:
+        con.close()
+    return initial_version
 
 
 def create_schema(database):
+    """Create the database if it does not exist and upgrade its schema"""
     database = Path(database)
     if not database.is_file():
         with open(database, "wb"):  # create db file
             pass
-        _create_schema(database)
+    migrate(database)
 
 
 if __name__ == "__main__":
     ROOT = Path(__file__).parents[2].resolve()
     DATABASE = ROOT/"database/sessions.db"
     if DATABASE.is_file():
-        print(
-            f"\n{'----'*25}\n--> Database '{DATABASE}' already exists. <--\n{'----'*25}\n")
+        version = migrate(DATABASE)
+        print(f"\n{'----'*25}\n--> Database '{DATABASE}' already exists, "
+              f"schema upgraded from version {version} to {SCHEMA_VERSION}. <--\n{'----'*25}\n")
     else:
         create_schema(DATABASE)
@@ -0,0 +1,33 @@
+"""Rewrite the closeness and interactions of the videos table with the binary codec
+
+Usage:
+    python -m therapy_aid_tool.DAOs._migrate_codec [database] [--dtype float16]
+
+Rows stored as JSON by older versions are still readable, this only saves
+space and loading time. Make a copy of the database before running it.
+"""
+import argparse
+from pathlib import Path
+
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs._codec import DTYPES
+
+
+ROOT = Path(__file__).parents[2].resolve()
+DATABASE = ROOT/"database/sessions.db"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", nargs="?", default=DATABASE)
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float16",
+                        help="How the closeness is stored")
+    args = parser.parse_args()
+
+    if not Path(args.database).is_file():
+        print(f"--> Database '{args.database}' does not exist. <--")
+    else:
+        video_dao = VideoDAO(args.database, args.dtype)
+        n_rows = video_dao.migrate_to_binary()
+        video_dao.con.execute("VACUUM")  # give the freed pages back to the file system
+        print(f"--> {n_rows} videos rewritten in '{args.database}' <--")
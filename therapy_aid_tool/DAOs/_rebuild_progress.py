@@ -0,0 +1,30 @@
+"""Rebuild the toddler_progress table from the statistics of the videos
+
+Usage:
+    python -m therapy_aid_tool.DAOs._rebuild_progress [database]
+
+The table is filled when the schema is upgraded and kept up to date by the
+SessionDAO afterwards. Run this if it was modified by other means.
+"""
+import argparse
+from pathlib import Path
+
+from therapy_aid_tool.DAOs._create_db_squema import migrate
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
+
+
+ROOT = Path(__file__).parents[2].resolve()
+DATABASE = ROOT/"database/sessions.db"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", nargs="?", default=DATABASE)
+    args = parser.parse_args()
+
+    if not Path(args.database).is_file():
+        print(f"--> Database '{args.database}' does not exist. <--")
+    else:
+        migrate(args.database)  # databases that predate the table
+        n_sessions = ProgressDAO(args.database).rebuild()
+        print(f"--> Progress of {n_sessions} sessions rebuilt in '{args.database}' <--")
@@ -0,0 +1,41 @@
+"""Recompute the interactions of every video in the database under new thresholds
+
+Usage:
+    python -m therapy_aid_tool.DAOs._recompute_videos [database]
+        [--closeness-threshold 0.6] [--conf-th 0.8]
+
+Only the detections stored with each video are used, the model does not run.
+Videos stored before the detections were kept are skipped.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from therapy_aid_tool.DAOs._create_db_squema import migrate
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.models.video import VideoBuilder
+
+
+ROOT = Path(__file__).parents[2].resolve()
+DATABASE = ROOT/"database/sessions.db"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", nargs="?", default=DATABASE)
+    parser.add_argument("--closeness-threshold", type=float,
+                        default=VideoBuilder.CLOSENESS_THRESHOLD,
+                        help="Closeness above which there is an interaction")
+    parser.add_argument("--conf-th", type=float, default=None,
+                        help="Ignore the detections with a lower confidence")
+    args = parser.parse_args()
+
+    if not Path(args.database).is_file():
+        print(f"--> Database '{args.database}' does not exist. <--")
+    else:
+        migrate(args.database)
+        start = time.perf_counter()
+        n_videos, n_skipped = VideoDAO(args.database).recompute(args.closeness_threshold,
+                                                                args.conf_th)
+        print(f"--> {n_videos} videos recomputed in {time.perf_counter() - start:.2f}s, "
+              f"{n_skipped} skipped without detections, in '{args.database}' <--")
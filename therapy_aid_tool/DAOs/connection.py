@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock, current_thread
+
+import sqlite3
+
+
+# Default pragmas, see https://www.sqlite.org/pragma.html
+JOURNAL_MODE = "WAL"  # readers do not block the writer and vice versa
+SYNCHRONOUS = "NORMAL"  # safe with WAL, only the last commits may be lost on power loss
+CACHE_SIZE = -16000  # negative values are in KiB, so 16MB of page cache
+MMAP_SIZE = 256 * 1024 * 1024  # read the database through a 256MB memory map
+BUSY_TIMEOUT = 30  # seconds waiting for a lock held by another connection
+
+
+class ConnectionManager:
+    """Hands out one SQLite connection per thread for a database
+
+    All DAOs of a thread share the same connection instead of opening their own.
+    Each connection is configured once with WAL journal mode and the
+    `synchronous`, `cache_size` and `mmap_size` pragmas.
+
+    Streamlit runs every script rerun in a new thread, so the connections of
+    threads that finished are closed when a new connection is opened. Use
+    `close` or `close_all` to close them explicitly.
+    """
+
+    def __init__(self, database, journal_mode: str = JOURNAL_MODE,
+                 synchronous: str = SYNCHRONOUS, cache_size: int = CACHE_SIZE,
+                 mmap_size: int = MMAP_SIZE, timeout: float = BUSY_TIMEOUT) -> None:
+        """
+        Args:
+            database (str | Path): Database path
+            journal_mode (str, optional): Defaults to "WAL".
+            synchronous (str, optional): Defaults to "NORMAL".
+            cache_size (int, optional): Pages, or KiB if negative. Defaults to -16000.
+            mmap_size (int, optional): Bytes, 0 disables it. Defaults to 256MB.
+            timeout (float, optional): Seconds to wait for locks. Defaults to 30.
+        """
+        self.__database = str(database)
+        self.__pragmas = {
+            "journal_mode": journal_mode,
+            "synchronous": synchronous,
+            "cache_size": int(cache_size),
+            "mmap_size": int(mmap_size),
+        }
+        self.__timeout = timeout
+        self.__connections = {}  # thread -> [connection, transaction depth]
+        self.__lock = Lock()
+
+    def __repr__(self):
+        return f"ConnectionManager(database='{self.__database}')"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close_all()
+
+    @property
+    def database(self):
+        return self.__database
+
+    def __entry(self):
+        thread = current_thread()
+        with self.__lock:
+            entry = self.__connections.get(thread)
+            if entry is not None:
+                return entry
+            self.__close_finished_threads()
+
+        con = sqlite3.connect(self.__database, timeout=self.__timeout,
+                              check_same_thread=False)
+        con.execute("PRAGMA foreign_keys = ON")
+        for pragma, value in self.__pragmas.items():
+            con.execute(f"PRAGMA {pragma} = {value}")
+
+        entry = [con, 0]
+        with self.__lock:
+            self.__connections[thread] = entry
+        return entry
+
+    def __close_finished_threads(self):
+        for thread in [thread for thread in self.__connections if not thread.is_alive()]:
+            self.__connections.pop(thread)[0].close()
+
+    def connection(self):
+        """Return the connection of the current thread, opening it if needed
+
+        Returns:
+            sqlite3.Connection: The connection. It must only be used by this thread
+        """
+        return self.__entry()[0]
+
+    def in_transaction(self):
+        """Whether the current thread is inside a `transaction` block"""
+        return self.__entry()[1] > 0
+
+    @contextmanager
+    def transaction(self):
+        """Group the writes made inside the block in a single transaction
+
+        The DAOs do not commit inside the block (see `commit`). On exit the
+        transaction is committed, or rolled back if an exception was raised.
+        Nested blocks join the outermost one.
+
+        Yields:
+            sqlite3.Connection: The connection of the current thread
+        """
+        entry = self.__entry()
+        entry[1] += 1
+        try:
+            yield entry[0]
+        except BaseException:
+            entry[1] -= 1
+            if entry[1] == 0:
+                entry[0].rollback()
+            raise
+        entry[1] -= 1
+        if entry[1] == 0:
+            entry[0].commit()
+
+    def commit(self):
+        """Commit the current thread connection, unless inside a `transaction` block"""
+        con, depth = self.__entry()
+        if depth == 0:
+            con.commit()
+
+    def close(self):
+        """Close the connection of the current thread"""
+        with self.__lock:
+            entry = self.__connections.pop(current_thread(), None)
+        if entry is not None:
+            entry[0].close()
+
+    def close_all(self):
+        """Close the connections of every thread
+
+        Should only be called when no other thread is using them, e.g. on shutdown.
+        """
+        with self.__lock:
+            connections = [con for con, _ in self.__connections.values()]
+            self.__connections.clear()
+        for con in connections:
+            con.close()
+
+
+_MANAGERS = {}
+_MANAGERS_LOCK = Lock()
+
+
+def get_connection_manager(database, **pragmas):
+    """Return the ConnectionManager shared by everyone using this database
+
+    The `pragmas` (see `ConnectionManager`) are only used when the manager is
+    created, by the first call for this database.
+
+    Args:
+        database (str | Path): Database path
+
+    Returns:
+        ConnectionManager: The manager of the database
+    """
+    key = str(Path(database).resolve())
+    with _MANAGERS_LOCK:
+        if key not in _MANAGERS:
+            _MANAGERS[key] = ConnectionManager(database, **pragmas)
+        return _MANAGERS[key]
@@ -1,21 +1,33 @@
 from abc import ABC, abstractmethod
 
-import sqlite3
+from therapy_aid_tool.DAOs.connection import ConnectionManager, get_connection_manager
 
 
 class DAO(ABC):
     @abstractmethod
     def __init__(self, database) -> None:
-        self.__db = database
+        """
+        Args:
+            database (str | Path | ConnectionManager): Database path, or the manager
+                to borrow the connection from. With a path, the manager shared by
+                everyone using that database is used (see `get_connection_manager`).
+        """
+        if isinstance(database, ConnectionManager):
+            self.manager = database
+        else:
+            self.manager = get_connection_manager(database)
         self.con, self.cur = self.__establish_connection()
 
     def __establish_connection(self):
-        con = sqlite3.connect(self.__db)
+        # The connection of this thread, already with foreign keys allowed
+        con = self.manager.connection()
         cur = con.cursor()
-        # Allow foreign keys
-        cur.execute("PRAGMA foreign_keys = ON")
         return con, cur
 
+    def _commit(self):
+        """Commit, unless the DAO is used inside a `ConnectionManager.transaction` block"""
+        self.manager.commit()
+
     @abstractmethod
     def _adapt_values(self):
         """Adapt non-SQL compliant Python objects to be stored as SQL JSON formatted string"""
@@ -0,0 +1,129 @@
+from therapy_aid_tool.DAOs.dao import DAO
+
+import json
+
+
+INTERACTION_TYPES = ("td_ct", "td_pm", "ct_pm")
+STATISTICS = ("n_interactions", "total_time", "min_time", "max_time", "mean_time")
+
+# The interactions statistics of the sessions, with what the progress rows are keyed by
+_SESSIONS_QUERRY = """
+    SELECT sessions.id, sessions.toddler_id, sessions.date, videos.interactions_statistics
+    FROM sessions JOIN videos ON videos.id = sessions.video_id"""
+
+
+def _insert_progress(cur, where: str = "", params=()):
+    """Insert the progress rows of the sessions matching `where`
+
+    Shared with the schema migration that creates the table, so it only
+    needs a cursor.
+
+    Args:
+        cur (sqlite3.Cursor): Cursor of the connection to write with
+        where (str, optional): SQL condition on the sessions. Defaults to all.
+        params (optional): Parameters of the condition
+    """
+    querry = f"{_SESSIONS_QUERRY} {'WHERE ' + where if where else ''}"
+    rows = []
+    for session_id, toddler_id, date, interactions_statistics in cur.execute(querry, params).fetchall():
+        for inter_type, stat_group in json.loads(interactions_statistics).items():
+            stats = [stat_group.get(stat) for stat in STATISTICS]
+            rows.append((session_id, toddler_id, date, inter_type, *stats))
+
+    querry = f"""
+        INSERT INTO toddler_progress(session_id, toddler_id, date, type, {', '.join(STATISTICS)})
+        VALUES({', '.join('?' * (4 + len(STATISTICS)))})"""
+    cur.executemany(querry, rows)
+
+
+class ProgressDAO(DAO):
+    """Per session interactions statistics of each toddler, ordered by date
+
+    The `toddler_progress` table duplicates the statistics of the videos so the
+    progress of a toddler is read in one query, without loading the sessions.
+    SessionDAO keeps it up to date in the same transaction as its writes.
+    """
+
+    def __init__(self, database: str) -> None:
+        super().__init__(database)
+
+    def _adapt_values(self):
+        pass
+
+    def _convert_values(self, values_fetched):
+        """Reshape rows of (type, *STATISTICS) into lists over the sessions per type"""
+        statistics = {inter_type: {stat: [] for stat in STATISTICS}
+                      for inter_type in INTERACTION_TYPES}
+        for inter_type, *values in values_fetched:
+            stat_group = statistics.setdefault(inter_type, {stat: [] for stat in STATISTICS})
+            for stat, value in zip(STATISTICS, values):
+                stat_group[stat].append(value)
+        return statistics
+
+    def _get_id(self):
+        pass
+
+    def _get_from_id(self, id):
+        pass
+
+    def add(self, session_id: int):
+        """Add the progress of a session, from the statistics of its video"""
+        _insert_progress(self.cur, "sessions.id = ?", [session_id])
+        self._commit()
+
+    def update(self, session_id: int):
+        """Replace the progress of a session after it or its video changed"""
+        with self.manager.transaction():
+            self.remove(session_id)
+            self.add(session_id)
+
+    def remove(self, session_id: int):
+        querry = "DELETE FROM toddler_progress WHERE session_id = ?"
+        self.cur.execute(querry, [session_id])
+        self._commit()
+
+    def get(self, toddler_name: str):
+        """Get the progress of a toddler over their sessions
+
+        Return example for 4 existing sessions:
+            statistics = {
+                'td_ct': {'n_interactions': [int, int, int, int],
+                          'total_time': [float, float, float, float],
+                          'min_time': [float, float, float, float],
+                          'max_time': [float, float, float, float],
+                          'mean_time': [float, float, float, float]},
+                'td_pm': ...,
+                'ct_pm': ...,
+            }
+
+        Args:
+            toddler_name (str): The name of the toddler
+
+        Returns:
+            dict[str, dict[str, list]]: The statistics over the sessions, ordered by date
+        """
+        querry = f"""
+            SELECT type, {', '.join(STATISTICS)}
+            FROM toddler_progress
+            JOIN toddlers ON toddlers.id = toddler_progress.toddler_id
+            WHERE toddlers.name = ?
+            ORDER BY toddler_progress.date, toddler_progress.session_id"""
+        res = self.cur.execute(querry, [toddler_name]).fetchall()
+        return self._convert_values(res)
+
+    def get_all(self):
+        querry = "SELECT * FROM toddler_progress"
+        res = self.cur.execute(querry).fetchall()
+        return res
+
+    def rebuild(self):
+        """Recompute the progress of every session from the statistics of the videos
+
+        Returns:
+            int: Number of sessions
+        """
+        with self.manager.transaction():
+            self.cur.execute("DELETE FROM toddler_progress")
+            _insert_progress(self.cur)
+        res = self.cur.execute("SELECT COUNT(DISTINCT session_id) FROM toddler_progress")
+        return res.fetchone()[0]
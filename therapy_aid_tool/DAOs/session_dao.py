@@ -1,6 +1,7 @@
 from therapy_aid_tool.DAOs.dao import DAO
 from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
 from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
 
 from therapy_aid_tool.models.session import Session
 from therapy_aid_tool.models.toddler import Toddler
@@ -9,11 +10,21 @@ from therapy_aid_tool.models.video import Video
 import json
 
 
+# Sessions with their toddler and video metadata, without the per-frame columns
+_JOINED_QUERRY = """
+    SELECT toddlers.name, videos.id, videos.filepath, videos.interactions_statistics,
+           videos.fps, sessions.date
+    FROM sessions
+    JOIN toddlers ON toddlers.id = sessions.toddler_id
+    JOIN videos ON videos.id = sessions.video_id"""
+
+
 class SessionDAO(DAO):
     def __init__(self, database: str) -> None:
         super().__init__(database)
-        self.__toddler_dao = ToddlerDAO(database)
-        self.__video_dao = VideoDAO(database)
+        self.__toddler_dao = ToddlerDAO(self.manager)
+        self.__video_dao = VideoDAO(self.manager)
+        self.__progress_dao = ProgressDAO(self.manager)
 
     def _adapt_values(self, session: Session):
         toddler_id = self.__toddler_dao._get_id(session.toddler.name)
@@ -34,21 +45,23 @@ class SessionDAO(DAO):
         querry = f"SELECT id FROM sessions WHERE toddler_id = {toddler_id} AND date = '{date}'"
         res = self.cur.execute(querry).fetchone()
         if res:
-            self.con.commit()
+            self._commit()
             return res[0]
 
     def _get_from_id(self, id):
         pass
 
     def add(self, session: Session):
+        """Add the session and its progress (see ProgressDAO) in one transaction"""
         if not self._get_id(session.toddler.name, session.date):
             querry = """
                 INSERT INTO sessions(toddler_id, video_id, date) 
                 VALUES(?, ?, ?)"""
             toddler_id = self.__toddler_dao._get_id(session.toddler.name)
             video_id = self.__video_dao._get_id(session.video.filepath)
-            self.cur.execute(querry, [toddler_id, video_id, session.date])
-            self.con.commit()
+            with self.manager.transaction():
+                self.cur.execute(querry, [toddler_id, video_id, session.date])
+                self.__progress_dao.add(self.cur.lastrowid)
 
     def update(self, toddler_name: str, date: str, new_session: Session):
         id = self._get_id(toddler_name, date)
@@ -59,28 +72,31 @@ class SessionDAO(DAO):
                 WHERE id = ?;
                 """
             new_values = self._adapt_values(new_session)
-            self.cur.execute(querry, [*new_values, id])
-            self.con.commit()
+            with self.manager.transaction():
+                self.cur.execute(querry, [*new_values, id])
+                self.__progress_dao.update(id)
 
     def remove(self, toddler_name: str, date: str):
-        toddler_id = self.__toddler_dao._get_id(toddler_name)
-        if not toddler_id:
+        id = self._get_id(toddler_name, date)
+        if not id:
             return
-        querry = f"DELETE FROM sessions WHERE toddler_id = {toddler_id} AND date = {date!r}"
-        self.cur.execute(querry)
-        self.con.commit()
+        with self.manager.transaction():
+            self.__progress_dao.remove(id)
+            querry = "DELETE FROM sessions WHERE id = ?"
+            self.cur.execute(querry, [id])
+
+    def _from_joined(self, values_fetched):
+        """Session from a row of `_JOINED_QUERRY`, the per-frame data is read lazily"""
+        name, video_id, filepath, interactions_statistics, fps, date = values_fetched
+        video = self.__video_dao._lazy_video(video_id, filepath, interactions_statistics, fps)
+        return Session(Toddler(name), video, date)
 
     def get(self, toddler_name: str, date: str):
-        toddler_id = self.__toddler_dao._get_id(toddler_name)
-        if not toddler_id:
-            return
-        querry = f"""SELECT toddler_id, video_id, date
-                     FROM sessions WHERE toddler_id = {toddler_id} AND date = '{date}'"""
-        res = self.cur.execute(querry).fetchone()
+        querry = f"{_JOINED_QUERRY} WHERE toddlers.name = ? AND sessions.date = ?"
+        res = self.cur.execute(querry, [toddler_name, date]).fetchone()
         if res is None:
             return
-        res = self._convert_values(res)
-        return Session(*res)
+        return self._from_joined(res)
 
     def get_all(self):
         querry = f"SELECT * FROM sessions"
@@ -88,11 +104,14 @@ class SessionDAO(DAO):
         return res
 
     def get_all_from_name(self, toddler_name: str):
-        toddler_id = self.__toddler_dao._get_id(toddler_name)
-        querry = f"SELECT toddler_id, video_id, date FROM sessions WHERE toddler_id = ?"
-        res = self.cur.execute(querry, [toddler_id]).fetchall()
-        res = [Session(*self._convert_values(item)) for item in res if res]
-        return res
+        """All the sessions of a toddler, in a single query
+
+        Only the statistics of the videos are read, their closeness and
+        interactions are read when first accessed.
+        """
+        querry = f"{_JOINED_QUERRY} WHERE toddlers.name = ? ORDER BY sessions.id"
+        res = self.cur.execute(querry, [toddler_name]).fetchall()
+        return [self._from_joined(item) for item in res]
 
     def get_all_dates(self):
         querry = f"SELECT date FROM sessions"
@@ -16,7 +16,7 @@ class ToddlerDAO(DAO):
         querry = f"SELECT id FROM toddlers WHERE name = {name!r}"
         res = self.cur.execute(querry).fetchone()
         if res:
-            self.con.commit()
+            self._commit()
             return res[0]
 
     def _get_from_id(self, id):
@@ -30,7 +30,7 @@ class ToddlerDAO(DAO):
         if not self._get_id(toddler.name):
             querry = "INSERT INTO toddlers(name) VALUES(?)"
             self.cur.execute(querry, [toddler.name])
-            self.con.commit()
+            self._commit()
 
     def update(self, name, new_toddler: Toddler):
         if self._get_id(name) and not self._get_id(new_toddler.name):
@@ -40,12 +40,12 @@ class ToddlerDAO(DAO):
                 WHERE name = ?;
                 """
             self.cur.execute(querry, [new_toddler.name, name])
-            self.con.commit()
+            self._commit()
 
     def remove(self, name: str):
         querry = f"DELETE FROM toddlers WHERE name = {name!r}"
         self.cur.execute(querry)
-        self.con.commit()
+        self._commit()
 
     def get(self, name: str):
         querry = f"SELECT name FROM toddlers WHERE name = {name!r}"
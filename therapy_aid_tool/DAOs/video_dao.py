@@ -1,71 +1,131 @@
 from therapy_aid_tool.DAOs.dao import DAO
-from therapy_aid_tool.models.video import Video
+from therapy_aid_tool.DAOs import _codec
+from therapy_aid_tool.DAOs.progress_dao import ProgressDAO
+from therapy_aid_tool.models.video import Video, VideoBuilder
+from therapy_aid_tool.models._detections import CLASS_NAMES
 import json
 
 
+_COLUMNS = "filepath, closeness, interactions, interactions_statistics, detections, fps"
+
+
 class VideoDAO(DAO):
-    def __init__(self, database: str) -> None:
+    def __init__(self, database: str, closeness_dtype: str = "float16") -> None:
+        """
+        Args:
+            database (str | ConnectionManager): Database path or its manager
+            closeness_dtype (str, optional): How the closeness is stored, "float16",
+                "float32" or "uint8" (see `_codec.encode_closeness`). Defaults to "float16".
+        """
         super().__init__(database)
+        self.__closeness_dtype = closeness_dtype
 
     def _adapt_values(self, video: Video):
+        """Closeness, interactions and detections are stored with the binary `_codec`,
+        the statistics as JSON"""
         filepath = video.filepath
-        closeness = json.dumps(video.closeness)
-        interactions = json.dumps(video.interactions)
+        closeness = _codec.encode_closeness(video.closeness, self.__closeness_dtype)
+        interactions = _codec.encode_interactions(video.interactions)
         interactions_statistics = json.dumps(video.interactions_statistics)
-        return filepath, closeness, interactions, interactions_statistics
+        detections = None
+        if video.detections is not None:
+            detections = _codec.encode_detections(video.detections, CLASS_NAMES)
+        return filepath, closeness, interactions, interactions_statistics, detections, video.fps
 
     def _convert_values(self, values_fetched):
-        (filepath, _closeness,
-         _interactions, _interactions_statistics) = values_fetched
-        closeness = json.loads(_closeness)
-        interactions = json.loads(_interactions)
+        """Also reads the closeness and interactions of rows stored as JSON"""
+        (filepath, _closeness, _interactions,
+         _interactions_statistics, _detections, fps) = values_fetched
+        closeness = _codec.decode(_closeness)
+        interactions = _codec.decode(_interactions)
         interactions_statistics = json.loads(_interactions_statistics)
-        return filepath, closeness, interactions, interactions_statistics
+        detections = None
+        if _detections is not None:  # rows stored before detections were kept
+            detections, _ = _codec.decode_detections(_detections)
+        return filepath, closeness, interactions, interactions_statistics, None, detections, fps
 
     def _get_id(self, filepath):
         querry = f"SELECT id FROM videos WHERE filepath = '{filepath}'"
         res = self.cur.execute(querry).fetchone()
         if res:
-            self.con.commit()
+            self._commit()
             return res[0]
 
     def _get_from_id(self, id):
-        querry = f"""SELECT filepath, closeness, interactions, interactions_statistics
-                     FROM videos WHERE id = {id}"""
+        querry = f"SELECT {_COLUMNS} FROM videos WHERE id = {id}"
         res = self.cur.execute(querry).fetchone()
         if res is None:
             return
         res = self._convert_values(res)
         return Video(*res)
 
+    def _load_column(self, id, column: str):
+        """Read and decode the closeness or interactions of a video"""
+        querry = f"SELECT {column} FROM videos WHERE id = ?"
+        res = self.manager.connection().execute(querry, [id]).fetchone()
+        return _codec.decode(res[0])
+
+    def _load_detections(self, id):
+        """Read and decode the detections of a video, None if they were not stored"""
+        querry = "SELECT detections FROM videos WHERE id = ?"
+        res = self.manager.connection().execute(querry, [id]).fetchone()
+        if res[0] is not None:
+            return _codec.decode_detections(res[0])[0]
+
+    def _lazy_video(self, id, filepath: str, interactions_statistics: str, fps: float = None):
+        """The Video of a row whose closeness, interactions and detections are read
+        on first access
+
+        Args:
+            id (int): Video id
+            filepath (str): Video filepath
+            interactions_statistics (str): The statistics, as stored
+            fps (float, optional): Frames per second of the video
+
+        Returns:
+            Video: The video
+        """
+        return Video(filepath,
+                     lambda: self._load_column(id, "closeness"),
+                     lambda: self._load_column(id, "interactions"),
+                     json.loads(interactions_statistics),
+                     detections=lambda: self._load_detections(id),
+                     fps=fps)
+
     def add(self, video: Video):
         if not self._get_id(video.filepath):
-            querry = """
+            querry = f"""
                 INSERT INTO 
-                videos(filepath, closeness, interactions, interactions_statistics) 
-                VALUES(?, ?, ?, ?)"""
+                videos({_COLUMNS}) 
+                VALUES(?, ?, ?, ?, ?, ?)"""
             self.cur.execute(querry, [*self._adapt_values(video)])
-            self.con.commit()
+            self._commit()
 
     def update(self, filepath, new_video: Video):
         if self._get_id(filepath) and not self._get_id(new_video.filepath):
             querry = f"""
                 UPDATE videos
-                SET filepath = ?, closeness = ?, interactions = ?, interactions_statistics = ?
+                SET filepath = ?, closeness = ?, interactions = ?, interactions_statistics = ?,
+                    detections = ?, fps = ?
                 WHERE filepath = ?;
                 """
             new_values = self._adapt_values(new_video)
-            self.cur.execute(querry,[*new_values, filepath])
-            self.con.commit()
+            with self.manager.transaction():
+                self.cur.execute(querry,[*new_values, filepath])
+                # The progress of the sessions of this video has its statistics
+                progress_dao = ProgressDAO(self.manager)
+                querry = "SELECT id FROM sessions WHERE video_id = ?"
+                video_id = self._get_id(new_video.filepath)
+                for session_id, in self.cur.execute(querry, [video_id]).fetchall():
+                    progress_dao.update(session_id)
 
     def remove(self, filepath: str):
         querry = f"DELETE FROM videos WHERE filepath = '{filepath}'"
         self.cur.execute(querry)
-        self.con.commit()
+        self._commit()
 
     def get(self, filepath: str):
-        querry = f"""SELECT filepath, closeness, interactions, interactions_statistics
-                     FROM videos WHERE filepath = '{filepath}'"""
+        querry = f"SELECT {_COLUMNS} FROM videos WHERE filepath = '{filepath}'"
         res = self.cur.execute(querry).fetchone()
         if res is None:
             return
@@ -78,3 +138,74 @@ class VideoDAO(DAO):
         querry = f"SELECT * FROM videos"
         res = self.cur.execute(querry).fetchall()
         return res
+
+    def migrate_to_binary(self, batch_size: int = 100):
+        """Rewrite the closeness and interactions stored as JSON with the binary codec
+
+        Rows already in the binary format are left untouched, so it can run
+        more than once.
+
+        Args:
+            batch_size (int, optional): Rows rewritten per commit. Defaults to 100.
+
+        Returns:
+            int: Number of rows rewritten
+        """
+        querry = "SELECT id, closeness, interactions FROM videos"
+        rows = self.cur.execute(querry).fetchall()
+        rows = [row for row in rows
+                if not (_codec.is_encoded(row[1]) and _codec.is_encoded(row[2]))]
+
+        querry = "UPDATE videos SET closeness = ?, interactions = ? WHERE id = ?"
+        for i, (id, closeness, interactions) in enumerate(rows, 1):
+            closeness = _codec.encode_closeness(_codec.decode(closeness),
+                                                self.__closeness_dtype)
+            interactions = _codec.encode_interactions(_codec.decode(interactions))
+            self.cur.execute(querry, [closeness, interactions, id])
+            if i % batch_size == 0:
+                self._commit()
+        self._commit()
+        return len(rows)
+
+    def recompute(self, closeness_threshold: float = None, conf_th: float = None):
+        """Recompute the closeness, interactions and statistics of every video from
+        its stored detections, without running the model
+
+        Everything is rewritten in a single transaction, together with the
+        progress of the sessions (see ProgressDAO).
+
+        Args:
+            closeness_threshold (float, optional): Closeness above which there is an
+                interaction. Defaults to `VideoBuilder.CLOSENESS_THRESHOLD`.
+            conf_th (float, optional): Ignore the detections with a lower confidence.
+                It can only be stricter than the one the model ran with. Defaults to
+                None, keeping all of them.
+
+        Returns:
+            tuple[int, int]: Number of videos recomputed, and skipped because they
+                were stored without detections
+        """
+        querry = "SELECT id FROM videos WHERE detections IS NOT NULL AND fps IS NOT NULL"
+        ids = [id for id, in self.cur.execute(querry).fetchall()]
+        querry = "SELECT COUNT(*) FROM videos"
+        n_skipped = self.cur.execute(querry).fetchone()[0] - len(ids)
+
+        with self.manager.transaction():
+            for id in ids:
+                querry = "SELECT filepath, detections, fps FROM videos WHERE id = ?"
+                filepath, detections, fps = self.cur.execute(querry, [id]).fetchone()
+                detections, _ = _codec.decode_detections(detections)
+                video = VideoBuilder.from_detections(filepath, detections, fps,
+                                                     closeness_threshold, conf_th).build()
+                querry = """
+                    UPDATE videos
+                    SET closeness = ?, interactions = ?, interactions_statistics = ?
+                    WHERE id = ?;
+                    """
+                self.cur.execute(querry, [
+                    _codec.encode_closeness(video.closeness, self.__closeness_dtype),
+                    _codec.encode_interactions(video.interactions),
+                    json.dumps(video.interactions_statistics),
+                    id])
+            ProgressDAO(self.manager).rebuild()
+        return len(ids), n_skipped
@@ -0,0 +1,265 @@
+"""Pick the released weights that run best on this host and write them to the config
+
+Usage:
+    python -m therapy_aid_tool.autotune <clip> [--frames 300]
+        [--min-agreement 0.95 | --max-latency 40] [--reference full1-yolov5x-img256-bs1.pt]
+        [--rerun] [--dry-run]
+
+Every released weights (see `WEIGHTS_URLS`, downloaded if needed) runs on the
+first --frames frames of a reference clip, at the image size it was trained
+with. For each one it measures:
+    fps:        frames per second of the model alone, on the CPU
+    agreement:  fraction of frames where its interactions agree with the ones
+                of the --reference weights (the largest network), averaged over
+                the interaction types
+
+The best weights within the budget are written to the `detect.cfg` file
+(weights and size), unless --dry-run:
+    --min-agreement A:  the fastest weights agreeing at least A (the default, 0.95)
+    --max-latency MS:   the most agreeing weights running a frame in MS milliseconds
+
+The measures are cached per host (and clip and frames) in database/autotune,
+so running it again, e.g. with another budget, only measures the new weights.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from therapy_aid_tool.models._video_inference import (
+    CFG_FILE,
+    MODEL_WEIGHTS,
+    WEIGHTS_URLS,
+    load_detector,
+)
+from therapy_aid_tool.models._intervals import compare_intervals
+from therapy_aid_tool.models.video import VideoBuilder
+from therapy_aid_tool.utils.filepaths import file_sha256
+from therapy_aid_tool.utils.video import get_video_fps
+
+
+ROOT = Path(__file__).parents[1].resolve()
+AUTOTUNE_DIR = ROOT/"database/autotune"
+
+REFERENCE_WEIGHTS = "full1-yolov5x-img256-bs1.pt"
+
+N_CLASSES = 3
+
+
+def size_from_weights(weights):
+    """Return the image size the weights were trained with, from their name (e.g. img256)"""
+    match = re.search(r"img(\d+)", Path(weights).name)
+    if match is None:
+        raise ValueError(f"No image size in the name of the weights '{weights}'")
+    return int(match.group(1))
+
+
+def host_key():
+    """Return a key of this host: the CPU, the threads torch uses and its version"""
+    host = {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "torch": torch.__version__,
+        "threads": torch.get_num_threads(),
+    }
+    return hashlib.sha256(json.dumps(host, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def measure(weights, clip: str, n_frames: int):
+    """Run weights on the first frames of a clip
+
+    Args:
+        weights (str | Path): The weights
+        clip (str): The reference clip
+        n_frames (int): Frames of the clip to use
+
+    Returns:
+        tuple[float, np.ndarray]: The frames per second of the model alone and the
+            (frames, classes, 5) detections. ValueError if no frame can be decoded.
+    """
+    if n_frames < 1:
+        raise ValueError(f"At least one frame is needed, not {n_frames}")
+    size = size_from_weights(weights)
+    detector = load_detector("torch", device="cpu", weights=weights)
+    # The path measured below, whatever the `letterbox` in the detect.cfg file
+    detector.detect([np.zeros((size, size, 3), dtype=np.uint8)], N_CLASSES, size)
+
+    detections, elapsed = [], 0.0
+    cap = cv2.VideoCapture(clip)
+    try:
+        for _ in range(n_frames):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            start = time.perf_counter()
+            detections.append(detector.detect([frame[:, :, ::-1]], N_CLASSES, size)[0])
+            elapsed += time.perf_counter() - start
+    finally:
+        cap.release()
+    if not detections:
+        raise ValueError(f"Could not decode any frame of '{clip}'")
+    return len(detections) / max(elapsed, 1e-9), np.stack(detections)
+
+
+def agreement(reference, video):
+    """Return the fraction of frames where the interactions of two Videos agree,
+    averaged over the interaction types"""
+    values = []
+    for key, intervals in reference.interactions_intervals.items():
+        n_frames = len(reference.interactions[key])
+        res = compare_intervals(intervals, video.interactions_intervals[key], n_frames)
+        values.append(res["agreement"])
+    return sum(values) / len(values)
+
+
+def select(results: dict, min_agreement: float = None, max_latency: float = None):
+    """Return the best weights within a budget
+
+    Args:
+        results (dict): {'weights name': {'fps': float, 'agreement': float}}
+        min_agreement (float, optional): The fastest weights agreeing at least this
+            much. Used when there is no `max_latency`. Defaults to None, 0.95.
+        max_latency (float, optional): The most agreeing weights running a frame in
+            this many milliseconds, the fastest one on ties. Defaults to None.
+
+    Returns:
+        str | None: The name of the weights, None if no weights are within the budget
+    """
+    if max_latency is not None:
+        within = {name: res for name, res in results.items()
+                  if 1000 / res["fps"] <= max_latency}
+        key = lambda name: (within[name]["agreement"], within[name]["fps"])
+    else:
+        min_agreement = 0.95 if min_agreement is None else min_agreement
+        within = {name: res for name, res in results.items()
+                  if res["agreement"] >= min_agreement}
+        key = lambda name: (within[name]["fps"], within[name]["agreement"])
+    return max(within, key=key, default=None)
+
+
+def set_config_values(cfg_file, values: dict):
+    """Change values of a config file, keeping its comments and layout
+
+    Args:
+        cfg_file (str | Path): The config file
+        values (dict): {(section, option): value} to set, the options must exist
+    """
+    lines = Path(cfg_file).read_text().splitlines(keepends=True)
+    section, missing = None, dict(values)
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped[1:-1]
+            continue
+        option = stripped.split("=", 1)[0].strip()
+        if "=" in stripped and (section, option) in missing:
+            lines[i] = f"{option}={missing.pop((section, option))}\n"
+    if missing:
+        raise KeyError(f"Options not in '{cfg_file}': {list(missing)}")
+    Path(cfg_file).write_text("".join(lines))
+
+
+def autotune(clip: str, n_frames: int = 300, reference: str = REFERENCE_WEIGHTS,
+             rerun: bool = False, cache_dir=AUTOTUNE_DIR, log=print):
+    """Measure the fps and agreement of every released weights on a clip
+
+    Args:
+        clip (str): The reference clip
+        n_frames (int, optional): Frames of the clip to use. Defaults to 300.
+        reference (str, optional): Name of the weights the others are compared to.
+            Defaults to the largest network, `REFERENCE_WEIGHTS`.
+        rerun (bool, optional): Measure again the weights already cached for this
+            host. Defaults to False.
+        cache_dir (str | Path, optional): Where the measures are cached. Defaults
+            to database/autotune.
+        log (Callable[[str], None], optional): Where the progress is reported.
+            Defaults to print.
+
+    Returns:
+        dict: {'weights name': {'fps': float, 'agreement': float}}
+    """
+    cache_file = Path(cache_dir)/f"{host_key()}.json"
+    cache = json.loads(cache_file.read_text()) if cache_file.is_file() else {}
+    run_key = f"{file_sha256(clip)}:{n_frames}:{reference}"
+    results = {} if rerun else cache.get(run_key, {})
+
+    weights_dir = MODEL_WEIGHTS.parent
+    fps = get_video_fps(clip)
+    reference_video = None
+    for name in [reference] + sorted(set(WEIGHTS_URLS) - {reference}):
+        if name in results:
+            log(f"{name}: cached, {results[name]['fps']:.1f} fps, "
+                f"{results[name]['agreement']:.4f} agreement")
+            continue
+        model_fps, detections = measure(weights_dir/name, clip, n_frames)
+        video = VideoBuilder.from_detections(clip, detections, fps).build()
+        if reference_video is None:
+            if name != reference:  # the reference is cached, its intervals are not
+                _, reference_detections = measure(weights_dir/reference, clip, n_frames)
+                reference_video = VideoBuilder.from_detections(
+                    clip, reference_detections, fps).build()
+            else:
+                reference_video = video
+        results[name] = {"fps": model_fps, "agreement": agreement(reference_video, video)}
+        log(f"{name}: {model_fps:.1f} fps, {results[name]['agreement']:.4f} agreement")
+
+        # Cached as they come, an interrupted run keeps what it measured
+        cache[run_key] = results
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(cache, indent=2))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("clip", help="Reference clip, representative of the sessions")
+    parser.add_argument("--frames", type=int, default=300, help="Frames of the clip to use")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument("--min-agreement", type=float,
+                        help="Pick the fastest weights agreeing at least this much "
+                             "(default 0.95)")
+    budget.add_argument("--max-latency", type=float,
+                        help="Pick the most agreeing weights running a frame in this "
+                             "many milliseconds")
+    parser.add_argument("--reference", default=REFERENCE_WEIGHTS,
+                        help="Weights the others are compared to")
+    parser.add_argument("--rerun", action="store_true",
+                        help="Measure again the weights cached for this host")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report, do not change the config")
+    args = parser.parse_args()
+    if args.frames < 1:
+        parser.error("--frames must be at least 1")
+
+    results = autotune(args.clip, args.frames, args.reference, args.rerun)
+    print(f"\n{'weights':>32} | {'fps':>7} | {'ms/frame':>8} | {'agreement':>9}")
+    for name, res in sorted(results.items(), key=lambda item: -item[1]["fps"]):
+        print(f"{name:>32} | {res['fps']:>7.1f} | {1000 / res['fps']:>8.1f} | "
+              f"{res['agreement']:>9.4f}")
+
+    best = select(results, args.min_agreement, args.max_latency)
+    if best is None:
+        print("\n--> No weights within the budget, the config is unchanged")
+        return
+    weights = (MODEL_WEIGHTS.parent/best).relative_to(ROOT)
+    print(f"\n--> Best within the budget: {best}")
+    if not args.dry_run:
+        set_config_values(CFG_FILE, {("yolov5", "weights"): weights.as_posix(),
+                                     ("model", "size"): size_from_weights(best)})
+        print(f"--> Written to {CFG_FILE}")
+
+
+if __name__ == "__main__":
+    main()
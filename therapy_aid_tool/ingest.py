@@ -0,0 +1,192 @@
+"""Add recorded sessions to the database without the web app
+
+Usage:
+    python -m therapy_aid_tool.ingest <directory | manifest.csv> [--database PATH]
+        [--workers 2] [--torch-threads 0] [--batch 20]
+
+The sessions are given either as:
+    a directory: every video named like the app names them, <Toddler-Name>_<date>.mp4
+        (e.g. Ana-Maria_2022-11-30.mp4 is a session of "Ana Maria" on 2022-11-30)
+    a CSV manifest: with a header and the columns video, toddler, date. Relative
+        video paths are relative to the manifest.
+
+The videos are processed by a pool of worker processes and their sessions are
+written to the database in transactions of `--batch` sessions. Sessions already
+in the database (same toddler and date) are skipped, so an interrupted ingestion
+can be run again.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+import argparse
+import csv
+import multiprocessing
+import time
+
+from therapy_aid_tool.DAOs._create_db_squema import create_schema
+from therapy_aid_tool.DAOs.connection import get_connection_manager
+from therapy_aid_tool.DAOs.toddler_dao import ToddlerDAO
+from therapy_aid_tool.DAOs.video_dao import VideoDAO
+from therapy_aid_tool.DAOs.session_dao import SessionDAO
+from therapy_aid_tool.models.session import Session
+from therapy_aid_tool.models.toddler import Toddler
+from therapy_aid_tool.models.video import VideoBuilder, _init_detection_worker
+from therapy_aid_tool.utils.filepaths import get_filepaths_from_dir
+
+
+ROOT = Path(__file__).parents[1].resolve()
+DATABASE = ROOT/"database/sessions.db"
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+class Entry(NamedTuple):
+    """A session to ingest"""
+    video: str
+    toddler: str
+    date: str
+
+
+def entries_from_dir(dirpath):
+    """Return the sessions of the videos in a directory, named <Toddler-Name>_<date>.<ext>
+
+    Args:
+        dirpath (str | Path): The directory
+
+    Returns:
+        list[Entry]: The sessions, in the order of the file names
+    """
+    entries = []
+    for filepath in get_filepaths_from_dir(dirpath):
+        path = Path(filepath)
+        if path.suffix.lower() not in VIDEO_EXTENSIONS or "_" not in path.stem:
+            continue
+        name, date = path.stem.rsplit("_", 1)
+        entries.append(Entry(filepath, " ".join(name.split("-")), date))
+    return entries
+
+
+def entries_from_manifest(manifest):
+    """Return the sessions of a CSV manifest with the columns video, toddler, date
+
+    Args:
+        manifest (str | Path): The CSV file
+
+    Returns:
+        list[Entry]: The sessions, in the order of the manifest
+    """
+    manifest = Path(manifest)
+    with open(manifest, newline="") as f:
+        return [Entry(str((manifest.parent/row["video"]).resolve()),
+                      row["toddler"].strip(), row["date"].strip())
+                for row in csv.DictReader(f)]
+
+
+def _build_video(filepath: str):
+    """Process a video in a worker process"""
+    start = time.perf_counter()
+    video = VideoBuilder(filepath, workers=1).build()
+    return video, time.perf_counter() - start
+
+
+def ingest(entries: list, database=DATABASE, workers: int = 2, torch_threads: int = 0,
+           batch: int = 20, log=print):
+    """Process the videos of the sessions and add them to the database
+
+    Args:
+        entries (list[Entry]): The sessions
+        database (str | Path, optional): Database path. Defaults to the app database.
+        workers (int, optional): Videos processed at the same time, each one in its
+            own process. Defaults to 2.
+        torch_threads (int, optional): Threads torch can use in each worker process,
+            0 keeps the torch default. Defaults to 0.
+        batch (int, optional): Sessions written per transaction. Defaults to 20.
+        log (Callable[[str], None], optional): Where the progress is reported.
+            Defaults to print.
+
+    Returns:
+        dict: Summary with the number of sessions 'added', 'skipped' (already in
+            the database or repeated) and 'failed', the 'frames' processed and the
+            'elapsed' seconds
+    """
+    create_schema(database)
+    manager = get_connection_manager(database)
+    session_dao = SessionDAO(manager)
+
+    # Each session once, if it is not in the database yet
+    pending = list({(entry.toddler, entry.date): entry for entry in reversed(entries)
+                    if not session_dao._get_id(entry.toddler, entry.date)}.values())[::-1]
+    summary = {"added": 0, "skipped": len(entries) - len(pending), "failed": 0,
+               "frames": 0, "elapsed": 0.0}
+    start = time.perf_counter()
+
+    def write(done):
+        with manager.transaction():
+            for entry, video in done:
+                toddler = Toddler(entry.toddler)
+                ToddlerDAO(manager).add(toddler)
+                VideoDAO(manager).add(video)
+                session_dao.add(Session(toddler, video, entry.date))
+        summary["added"] += len(done)
+
+    done = []
+    # spawn: forking a process that already initialized torch may deadlock
+    with ProcessPoolExecutor(max_workers=max(1, workers),
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_detection_worker,
+                             initargs=(torch_threads,)) as executor:
+        futures = {executor.submit(_build_video, entry.video): entry for entry in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            entry = futures[future]
+            try:
+                video, elapsed = future.result()
+            except Exception as e:
+                summary["failed"] += 1
+                log(f"[{i}/{len(pending)}] FAILED {entry.video}: {e!r}")
+                continue
+            n_frames = len(next(iter(video.interactions.values()), []))
+            summary["frames"] += n_frames
+            log(f"[{i}/{len(pending)}] {entry.toddler} {entry.date}: "
+                f"{n_frames} frames in {elapsed:.1f}s")
+            done.append((entry, video))
+            if len(done) >= batch:
+                write(done)
+                done = []
+    if done:
+        write(done)
+
+    summary["elapsed"] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Directory of videos or CSV manifest")
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Videos processed at the same time")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Threads torch can use in each worker (0 = torch default)")
+    parser.add_argument("--batch", type=int, default=20,
+                        help="Sessions written per transaction")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    entries = entries_from_dir(source) if source.is_dir() else entries_from_manifest(source)
+    summary = ingest(entries, args.database, args.workers, args.torch_threads, args.batch)
+
+    elapsed = summary["elapsed"]
+    processed = summary["added"] + summary["failed"]
+    print(f"\n{'----'*25}")
+    print(f"--> {summary['added']} sessions added, {summary['skipped']} skipped (already "
+          f"in the database or repeated), {summary['failed']} failed")
+    if processed and elapsed > 0:
+        print(f"--> {elapsed:.1f}s, {processed / elapsed * 60:.1f} videos/min, "
+              f"{summary['frames'] / elapsed:.1f} frames/s")
+    print(f"{'----'*25}\n")
+
+
+if __name__ == "__main__":
+    main()
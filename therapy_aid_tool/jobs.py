@@ -0,0 +1,460 @@
+"""Queue of the videos waiting to be processed, stored in SQLite
+
+Usage:
+    python -m therapy_aid_tool.jobs [--database PATH] [--workers 1] [--torch-threads 0]
+
+The web app enqueues the uploaded videos and polls their jobs, while worker
+processes (started by the app, or by this command on their own) run
+`VideoBuilder` on them. A job goes through the states:
+
+    queued -> running -> done
+                      -> queued (retried, while attempts are left) -> ...
+                      -> failed
+
+A video is enqueued once: enqueuing the same content again, while its job is
+not failed, returns that job. The video is hard linked (or copied) to the queue
+spool when enqueued, so the upload can be replaced meanwhile, as long as it is
+replaced by a rename (see `save_stream`) and not rewritten in place. The
+detections of a done job are stored with it, its Video is rebuilt from them.
+
+A running job whose worker died (no progress for `stale_after` seconds) is
+queued again, and resumes from its checkpoint. At most `max_running` jobs run
+at the same time, whatever the number of worker processes, so the server is
+never oversubscribed.
+"""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from pathlib import Path
+from typing import NamedTuple
+import argparse
+import multiprocessing
+import sqlite3
+import time
+
+from therapy_aid_tool.DAOs import _codec
+from therapy_aid_tool.models._detections import CLASS_NAMES
+from therapy_aid_tool.models.video import VideoBuilder, _init_detection_worker
+from therapy_aid_tool.utils.filepaths import file_sha256, link_or_copy
+
+
+THIS_FILE = Path(__file__).resolve()
+ROOT = THIS_FILE.parents[1]
+
+# Read config file
+CFG_FILE = THIS_FILE.parent / "detect.cfg"
+PARSER = ConfigParser()
+PARSER.read(CFG_FILE)
+
+# Configs
+JOBS_DATABASE = ROOT/PARSER.get("jobs", "database", fallback="database/jobs.db")
+JOBS_SPOOL = ROOT/PARSER.get("jobs", "spool", fallback="database/jobs")
+JOB_WORKERS = PARSER.getint("jobs", "workers", fallback=1)
+MAX_RUNNING = PARSER.getint("jobs", "max_running", fallback=1)
+MAX_ATTEMPTS = PARSER.getint("jobs", "max_attempts", fallback=3)
+STALE_AFTER = PARSER.getfloat("jobs", "stale_after", fallback=600)
+POLL_INTERVAL = PARSER.getfloat("jobs", "poll_interval", fallback=1.0)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job(NamedTuple):
+    """A video in the queue"""
+    id: int
+    filepath: str  # the copy in the spool
+    video_sha256: str
+    state: str
+    attempts: int
+    frames_done: int
+    total_frames: int
+    error: str | None
+    started: float | None  # of the last attempt
+    updated: float  # last change, or progress
+
+
+_JOB_COLUMNS = ", ".join(Job._fields)
+
+
+class JobQueue:
+    """Jobs of the videos to process, shared by every thread and process
+    using the same database
+
+    Each call opens its own connection and the state changes run in
+    `BEGIN IMMEDIATE` transactions, so two workers never claim the same job.
+    """
+
+    def __init__(self, database=JOBS_DATABASE, spool=JOBS_SPOOL,
+                 max_running: int = MAX_RUNNING, max_attempts: int = MAX_ATTEMPTS,
+                 stale_after: float = STALE_AFTER) -> None:
+        """
+        Args:
+            database (str | Path, optional): The queue database. Defaults to the
+                `database` in the `detect.cfg` file.
+            spool (str | Path, optional): Where the videos enqueued are copied.
+                Defaults to the `spool` in the `detect.cfg` file.
+            max_running (int, optional): Jobs running at the same time, at most.
+                Defaults to the `max_running` in the `detect.cfg` file.
+            max_attempts (int, optional): Attempts of a job before it is failed.
+                Defaults to the `max_attempts` in the `detect.cfg` file.
+            stale_after (float, optional): Seconds without progress after which a
+                running job is considered dead. Defaults to the `stale_after` in
+                the `detect.cfg` file.
+        """
+        self.__db = Path(database)
+        self.__spool = Path(spool)
+        self.max_running = max(1, int(max_running))
+        self.max_attempts = max(1, int(max_attempts))
+        self.stale_after = stale_after
+        self.__ready = False
+
+    def __repr__(self):
+        return f"JobQueue(database='{self.__db}', max_running={self.max_running})"
+
+    @property
+    def database(self):
+        return self.__db
+
+    def __connect(self):
+        # Created on first use, so building the default queue has no side effects
+        if not self.__ready:
+            self.__db.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.__db, timeout=30)
+        if not self.__ready:
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS jobs(
+                id INTEGER PRIMARY KEY,
+                video_sha256 TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                frames_done INTEGER NOT NULL DEFAULT 0,
+                total_frames INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                detections BLOB,
+                fps REAL,
+                created REAL NOT NULL,
+                started REAL,
+                updated REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, id)")
+            con.execute("CREATE INDEX IF NOT EXISTS jobs_video ON jobs(video_sha256)")
+            con.commit()
+            self.__ready = True
+        return con
+
+    def __spool_copy(self, filepath, sha256: str):
+        """Link (or copy) the video to the spool, once per content"""
+        path = self.__spool/f"{sha256}{Path(filepath).suffix}"
+        if not path.exists():
+            link_or_copy(filepath, path)
+        return path
+
+    def enqueue(self, filepath, sha256: str = None):
+        """Add a job for a video, unless its content already has one
+
+        Args:
+            filepath (str | Path): The video
+            sha256 (str, optional): SHA-256 of the video, if it is already known
+                (e.g. from `save_stream`). Defaults to None, hash the file.
+
+        Returns:
+            int: The id of the job of the video, new or not
+        """
+        if sha256 is None:
+            sha256 = file_sha256(filepath)
+        con = self.__connect()
+        try:
+            querry = "SELECT id FROM jobs WHERE video_sha256 = ? AND state != ?"
+            res = con.execute(querry, [sha256, FAILED]).fetchone()
+            if res:
+                return res[0]
+
+            spooled = self.__spool_copy(filepath, sha256)
+            con.execute("BEGIN IMMEDIATE")
+            # Enqueued by someone else while copying
+            res = con.execute(querry, [sha256, FAILED]).fetchone()
+            if res:
+                con.commit()
+                return res[0]
+            now = time.time()
+            cur = con.execute("""INSERT INTO jobs(video_sha256, filepath, state, max_attempts,
+                                 created, updated) VALUES(?, ?, ?, ?, ?, ?)""",
+                              [sha256, str(spooled), QUEUED, self.max_attempts, now, now])
+            con.commit()
+            return cur.lastrowid
+        finally:
+            con.close()
+
+    def get(self, job_id: int):
+        """Return the job `job_id`, or None if there is no such job"""
+        con = self.__connect()
+        try:
+            res = con.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?",
+                              [job_id]).fetchone()
+        finally:
+            con.close()
+        return Job(*res) if res else None
+
+    def get_all(self, state: str = None):
+        """Return the jobs, oldest first
+
+        Args:
+            state (str, optional): Only the jobs in this state. Defaults to None, all.
+
+        Returns:
+            list[Job]: The jobs
+        """
+        querry = f"SELECT {_JOB_COLUMNS} FROM jobs"
+        params = []
+        if state is not None:
+            querry += " WHERE state = ?"
+            params.append(state)
+        con = self.__connect()
+        try:
+            res = con.execute(querry + " ORDER BY id", params).fetchall()
+        finally:
+            con.close()
+        return [Job(*row) for row in res]
+
+    def claim(self):
+        """Start the oldest queued job, if less than `max_running` jobs are running
+
+        The running jobs without progress for `stale_after` seconds are queued
+        again first (or failed, if they have no attempts left).
+
+        Returns:
+            Job | None: The job, now running, or None if there is nothing to run
+        """
+        con = self.__connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            stale = con.execute("SELECT id FROM jobs WHERE state = ? AND updated < ?",
+                                [RUNNING, now - self.stale_after]).fetchall()
+            for job_id, in stale:
+                self.__retry_or_fail(con, job_id, "No progress, the worker died", now)
+
+            running = con.execute("SELECT COUNT(*) FROM jobs WHERE state = ?",
+                                  [RUNNING]).fetchone()[0]
+            res = None
+            if running < self.max_running:
+                res = con.execute("SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                                  [QUEUED]).fetchone()
+            if res:
+                con.execute("""UPDATE jobs SET state = ?, attempts = attempts + 1,
+                               started = ?, updated = ? WHERE id = ?""",
+                            [RUNNING, now, now, res[0]])
+            con.commit()
+        finally:
+            con.close()
+        return self.get(res[0]) if res else None
+
+    def progress(self, job_id: int, attempt: int, frames_done: int, total_frames: int):
+        """Record the progress of a running job, which also tells it is alive
+
+        Args:
+            job_id (int): The job
+            attempt (int): The attempt making the progress, the `attempts` of the
+                job when it was claimed
+            frames_done (int): Frames processed so far
+            total_frames (int): Frames of the video
+
+        Returns:
+            bool: False if the attempt is not running anymore (e.g. the job was
+                queued again as stale), then nothing is recorded
+        """
+        con = self.__connect()
+        try:
+            cur = con.execute("""UPDATE jobs SET frames_done = ?, total_frames = ?, updated = ?
+                                 WHERE id = ? AND state = ? AND attempts = ?""",
+                              [frames_done, total_frames, time.time(), job_id, RUNNING,
+                               attempt])
+            con.commit()
+        finally:
+            con.close()
+        return cur.rowcount > 0
+
+    def finish(self, job_id: int, attempt: int, detections, fps: float):
+        """Store the detections of a job and mark it done
+
+        Args:
+            job_id (int): The job
+            attempt (int): The attempt that made the detections (see `progress`)
+            detections (np.ndarray): (frames, classes, 5) detections of the video
+            fps (float): Frames per second of the video
+
+        Returns:
+            bool: False if the attempt is not running anymore, then the job is
+                left as it is
+        """
+        blob = _codec.encode_detections(detections, CLASS_NAMES)
+        con = self.__connect()
+        try:
+            cur = con.execute("""UPDATE jobs SET state = ?, detections = ?, fps = ?, error = NULL,
+                                 frames_done = ?, total_frames = ?, updated = ?
+                                 WHERE id = ? AND state = ? AND attempts = ?""",
+                              [DONE, blob, fps, len(detections), len(detections), time.time(),
+                               job_id, RUNNING, attempt])
+            con.commit()
+            if not cur.rowcount:
+                return False
+            filepath, = con.execute("SELECT filepath FROM jobs WHERE id = ?",
+                                    [job_id]).fetchone()
+        finally:
+            con.close()
+        # The video is not needed anymore, its Video is rebuilt from the detections
+        Path(filepath).unlink(missing_ok=True)
+        return True
+
+    def fail(self, job_id: int, attempt: int, error: str):
+        """Record the error of a running job and queue it again, or fail it if
+        it has no attempts left
+
+        Args:
+            job_id (int): The job
+            attempt (int): The attempt that failed (see `progress`)
+            error (str): What went wrong
+
+        Returns:
+            str | None: The new state of the job, None if the attempt is not
+                running anymore, then the job is left as it is
+        """
+        con = self.__connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            state = None
+            if con.execute("SELECT 1 FROM jobs WHERE id = ? AND state = ? AND attempts = ?",
+                           [job_id, RUNNING, attempt]).fetchone():
+                state = self.__retry_or_fail(con, job_id, error, time.time())
+            con.commit()
+        finally:
+            con.close()
+        return state
+
+    def __retry_or_fail(self, con, job_id: int, error: str, now: float):
+        attempts, max_attempts = con.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ?", [job_id]).fetchone()
+        state = QUEUED if attempts < max_attempts else FAILED
+        con.execute("UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?",
+                    [state, error, now, job_id])
+        return state
+
+    def result(self, job_id: int):
+        """Return the Video of a done job
+
+        Args:
+            job_id (int): The job
+
+        Returns:
+            Video | None: The video, or None if the job is not done
+        """
+        con = self.__connect()
+        try:
+            querry = "SELECT filepath, detections, fps FROM jobs WHERE id = ? AND state = ?"
+            res = con.execute(querry, [job_id, DONE]).fetchone()
+        finally:
+            con.close()
+        if not res:
+            return None
+        filepath, blob, fps = res
+        detections, _ = _codec.decode_detections(blob)
+        return VideoBuilder.from_detections(filepath, detections, fps).build()
+
+    def run(self, job: Job):
+        """Process the video of a claimed job and finish it, or fail it
+
+        The run stops early if the job is taken from it meanwhile (e.g. queued
+        again as stale, and claimed by another worker).
+
+        Returns:
+            str | None: The new state of the job, None if it was taken from this run
+        """
+        def on_progress(progress):
+            if not self.progress(job.id, job.attempts, progress.frames_done,
+                                 progress.total_frames):
+                raise _Superseded
+
+        try:
+            # Hashed when enqueued, the video is not read again for the cache key
+            for video in VideoBuilder.stream(job.filepath, on_progress=on_progress,
+                                             sha256=job.video_sha256):
+                pass
+        except _Superseded:
+            return None
+        except Exception as e:
+            return self.fail(job.id, job.attempts, repr(e))
+        return DONE if self.finish(job.id, job.attempts, video.detections, video.fps) else None
+
+
+class _Superseded(Exception):
+    """Stops the run of a job that is not running anymore"""
+
+
+def work(database=JOBS_DATABASE, torch_threads: int = 0, stop=None,
+         poll_interval: float = POLL_INTERVAL):
+    """Run the jobs of the queue as they come, until `stop` is set
+
+    Args:
+        database (str | Path, optional): The queue database. Defaults to the
+            `database` in the `detect.cfg` file.
+        torch_threads (int, optional): Threads torch can use, 0 keeps the torch
+            default. Defaults to 0.
+        stop (multiprocessing.Event, optional): Set to stop after the current job.
+            Defaults to None, run forever.
+        poll_interval (float, optional): Seconds between two looks at an empty
+            (or full) queue. Defaults to the `poll_interval` in the `detect.cfg` file.
+    """
+    _init_detection_worker(torch_threads)
+    queue = JobQueue(database)
+    while stop is None or not stop.is_set():
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        queue.run(job)
+
+
+def start_workers(workers: int = JOB_WORKERS, database=JOBS_DATABASE,
+                  torch_threads: int = 0, stop=None):
+    """Start the worker processes of the queue
+
+    The processes are daemons, they end with the process that started them.
+
+    Args:
+        workers (int, optional): Number of processes. Defaults to the `workers` in
+            the `detect.cfg` file.
+        database, torch_threads, stop: See `work`
+
+    Returns:
+        list[multiprocessing.Process]: The started processes
+    """
+    # spawn: forking a process that already initialized torch may deadlock
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=work, args=(database, torch_threads, stop),
+                                 daemon=True)
+                 for _ in range(max(1, workers))]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=JOBS_DATABASE)
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS,
+                        help="Worker processes")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Threads torch can use in each worker (0 = torch default)")
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers, args.database, args.torch_threads)
+    print(f"--> {len(processes)} workers running the jobs of {args.database}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Checkpoints of the detections of the videos being processed
+
+While a video is processed its detections so far are saved every few frames,
+so a build interrupted by a crash or a restart resumes from the last checkpoint
+instead of starting over. Checkpoints are keyed like the `InferenceCache`
+entries (video content and model configuration, see `cache_key`) and removed
+once the video is done.
+"""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from pathlib import Path
+import os
+import tempfile
+
+import numpy as np
+
+
+THIS_FILE = Path(__file__).resolve()
+ROOT = THIS_FILE.parents[2]
+
+# Read config file
+CFG_FILE = THIS_FILE.parents[1] / "detect.cfg"
+PARSER = ConfigParser()
+PARSER.read(CFG_FILE)
+
+# Configs
+CHECKPOINTS_ENABLED = PARSER.getboolean("checkpoint", "enabled", fallback=False)
+CHECKPOINTS_DIR = ROOT/PARSER.get("checkpoint", "directory", fallback="database/checkpoints")
+CHECKPOINT_EVERY = PARSER.getint("checkpoint", "every", fallback=1800)
+
+
+class CheckpointStore:
+    """Directory of checkpoints, one .npz file per video and model configuration
+
+    A checkpoint holds the detections of the first frames of a video, up to
+    and including the last frame the model ran on. It is written to a
+    temporary file and renamed into place, so a crash while saving leaves the
+    previous checkpoint intact.
+    """
+
+    def __init__(self, directory=CHECKPOINTS_DIR, every: int = CHECKPOINT_EVERY) -> None:
+        """
+        Args:
+            directory (str | Path, optional): Where the checkpoints are written.
+                Defaults to the `directory` in the `detect.cfg` file.
+            every (int, optional): Frames processed between two checkpoints.
+                Defaults to the `every` in the `detect.cfg` file.
+        """
+        self.__dir = Path(directory)
+        self.every = max(1, int(every))
+
+    def __repr__(self):
+        return f"CheckpointStore(directory='{self.__dir}', every={self.every})"
+
+    @property
+    def directory(self):
+        return self.__dir
+
+    def __path(self, key: str):
+        return self.__dir/f"{key}.npz"
+
+    def load(self, key: str):
+        """Return the detections saved under `key`
+
+        Args:
+            key (str): The video key (see `cache_key`)
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] | None: The (frames, classes, 5) detections
+                and the bool array of the frames the model ran on, or None if there
+                is no (readable) checkpoint
+        """
+        try:
+            with np.load(self.__path(key)) as checkpoint:
+                return checkpoint["detections"], checkpoint["detected"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key: str, detections: np.ndarray, detected: np.ndarray):
+        """Atomically replace the checkpoint of `key`
+
+        Args:
+            key (str): The video key (see `cache_key`)
+            detections (np.ndarray): (frames, classes, 5) detections of the first frames
+            detected (np.ndarray): Bool array of the frames the model ran on
+        """
+        self.__dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.__dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, detections=detections, detected=detected)
+            os.replace(tmp, self.__path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def remove(self, key: str):
+        """Remove the checkpoint of `key`, if any"""
+        self.__path(key).unlink(missing_ok=True)
+
+
+CHECKPOINTS = CheckpointStore() if CHECKPOINTS_ENABLED else None
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+import math
+
+import numpy as np
+
+
+# Detections of a video are stored in an array of shape (frames, classes, 5) with
+# the x, y, w, h, conf of the best prediction of each class in each frame, or NaN
+# if that class was not detected in that frame.
+CLASS_NAMES = ("td", "ct", "pm")
+PAIR_NAMES = ("td_ct", "td_pm", "ct_pm")
+
+
+def interpolate_detections(detections: np.ndarray, detected: np.ndarray):
+    """Fill the frames where the model did not run by interpolating the detections
+
+    Used when the model runs only every few frames. For each class, the x, y, w, h
+    and conf values of a frame in a gap are linearly interpolated between the
+    frames before and after the gap. If the class was not detected in one of them
+    the frame copies the closest one (the one after the gap on ties). The frames
+    after the last frame where the model ran repeat it.
+
+    Args:
+        detections (np.ndarray): (frames, classes, 5) detections array
+        detected (np.ndarray): Bool array telling in which frames the model ran.
+            The model must have run in the first frame.
+
+    Returns:
+        np.ndarray: The (frames, classes, 5) detections array with every frame filled
+    """
+    if detected.all() or not detected.any():
+        return detections.copy()
+
+    keyframes = np.flatnonzero(detected)
+
+    frames = np.arange(len(detections))
+    right_pos = np.minimum(np.searchsorted(keyframes, frames), len(keyframes) - 1)
+    left_pos = np.maximum(np.searchsorted(keyframes, frames, side="right") - 1, 0)
+    left, right = keyframes[left_pos], keyframes[right_pos]
+
+    span = right - left
+    t = np.divide(frames - left, span, out=np.zeros(len(frames)), where=span > 0)
+    t = t[:, None, None]
+
+    start, end = detections[left], detections[right]
+    interpolated = start + (end - start) * t
+    # Without detection on one of the ends, copy the closest one
+    nearest = np.where(t < 0.5, start, end)
+    missing = np.isnan(start[..., 4:]) | np.isnan(end[..., 4:])
+    return np.where(missing, nearest, interpolated)
+
+
+def filter_detections(detections: np.ndarray, conf_th: float):
+    """Drop the detections with a confidence below `conf_th`
+
+    Only the best detection of each class is kept in the array, so this can only
+    make the confidence threshold the model ran with stricter.
+
+    Args:
+        detections (np.ndarray): (frames, classes, 5) detections array
+        conf_th (float): Confidence threshold
+
+    Returns:
+        np.ndarray: A copy of the detections, NaN where the confidence was below `conf_th`
+    """
+    detections = detections.copy()
+    with np.errstate(invalid="ignore"):  # NaN is already not detected
+        detections[detections[..., 4] < conf_th] = np.nan
+    return detections
+
+
+def _corners(boxes: np.ndarray):
+    """Return the x1, x2, y1, y2 corners of an array of x, y, w, h boxes"""
+    x, y, w, h = boxes[..., 0], boxes[..., 1], boxes[..., 2], boxes[..., 3]
+    return x - w / 2, x + w / 2, y - h / 2, y + h / 2
+
+
+def niou_array(boxes1: np.ndarray, boxes2: np.ndarray):
+    """Normalized IoU between two arrays of boxes, element wise
+
+    Vectorized version of `BBox.niou`, with the same results: (Area1 ∩ Area2) /
+    min(Area1, Area2) when the boxes overlap, 0 when they don't and NaN if any
+    of the boxes is missing (NaN) or the smallest one has no area.
+
+    Args:
+        boxes1 (np.ndarray): (..., 5) array of x, y, w, h, conf
+        boxes2 (np.ndarray): (..., 5) array of x, y, w, h, conf
+
+    Returns:
+        np.ndarray: The NIoU values, with the shape of boxes1[..., 0]
+    """
+    ax1, ax2, ay1, ay2 = _corners(boxes1)
+    bx1, bx2, by1, by2 = _corners(boxes2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        overlapping = (ax1 < bx2) & (ay1 < by2) & (bx1 < ax2) & (by1 < ay2)
+        intersection = ((np.minimum(ax2, bx2) - np.maximum(ax1, bx1))
+                        * (np.minimum(ay2, by2) - np.maximum(ay1, by1)))
+        min_area = np.minimum((ax2 - ax1) * (ay2 - ay1), (bx2 - bx1) * (by2 - by1))
+        niou = np.where(overlapping, intersection / min_area, 0.0)
+
+    niou[overlapping & (min_area == 0)] = np.nan
+    niou[np.isnan(boxes1[..., 4]) | np.isnan(boxes2[..., 4])] = np.nan
+    return niou
+
+
+def closeness_from_detections(detections: np.ndarray, class_names=CLASS_NAMES):
+    """Return the NIoU of every pair of classes for each frame
+
+    Args:
+        detections (np.ndarray): (frames, classes, 5) detections array
+        class_names (tuple, optional): Name of each class. Defaults to CLASS_NAMES.
+
+    Returns:
+        dict[str, np.ndarray]: NIoU for each frame, keyed by pair of classes,
+            e.g. {'td_ct': array([...]), 'td_pm': ..., 'ct_pm': ...}
+    """
+    n_classes = len(class_names)
+    first, second = np.triu_indices(n_classes, k=1)
+    niou = niou_array(detections[:, first], detections[:, second])
+    return {f"{class_names[i]}_{class_names[j]}": niou[:, k]
+            for k, (i, j) in enumerate(zip(first, second))}
+
+
+def bboxes_from_detections(detections: np.ndarray, class_names=CLASS_NAMES):
+    """Return a BBox for each class in each frame of a detections array
+
+    Args:
+        detections (np.ndarray): (frames, classes, 5) detections array
+        class_names (tuple, optional): Name of each class. Defaults to CLASS_NAMES.
+
+    Returns:
+        dict[str, list[BBox]]: The BBoxes of each frame, keyed by class name,
+            e.g. {'td': [BBox0, BBox1, ...], 'ct': ..., 'pm': ...}
+    """
+    return {name: [BBox.from_detection(c, row) for row in detections[:, c]]
+            for c, name in enumerate(class_names)}
+
+
+class BBox:
+    """Represents a Bounding Box prediction made by YOLOv5
+    """
+
+    def __init__(self, pred: Tuple) -> None:
+        """Initializes the BBox
+
+        A BBox prediction has two components, a class and the parameters 
+        of the bbox (x, y, w, h, conf).
+            x, y: center point of the bbox in the frame (float 0 -> 1)
+            w, h: width and height of the bbox (float 0 -> 1)
+            conf: confidence level of the bbox prediction.
+
+        Args:
+            pred (Tuple): Bounding Box Prediction, (cls, [x, y, w, h, conf])
+        """
+        self.pred = pred
+        self.cls = self.pred[0]
+        self.xywhc = self.pred[1]
+        self.create_corners()
+
+    @classmethod
+    def from_detection(cls, class_idx: int, detection: np.ndarray) -> BBox:
+        """Create a BBox from the x, y, w, h, conf row of a detections array
+
+        Args:
+            class_idx (int): The class of the detection
+            detection (np.ndarray): x, y, w, h, conf. NaN if there is no detection
+
+        Returns:
+            BBox: The BBox for that detection
+        """
+        xywhc = None if np.isnan(detection[4]) else detection.tolist()
+        return cls((class_idx, xywhc))
+
+    def __bool__(self):
+        return self.conf != None
+
+    def create_corners(self):
+        """Create the BBox corners x1, x2, y1, y2
+        """
+        if self.xywhc:
+            self.x, self.y, self.w, self.h, self.conf = self.xywhc
+            self.x1 = self.x - self.w / 2
+            self.x2 = self.x + self.w / 2
+            self.y1 = self.y - self.h / 2
+            self.y2 = self.y + self.h / 2
+        else:
+            self.x, self.y, self.w, self.h, self.conf = None, None, None, None, None
+            self.x1 = None,
+            self.x2 = None,
+            self.y1 = None,
+            self.y2 = None,
+
+    def rectangular_area(self, x1, x2, y1, y2):
+        return (x2 - x1) * (y2 - y1)
+
+    def intersection(self, other: BBox):
+        # Intersection corners
+        x1 = max(self.x1, other.x1)
+        y1 = max(self.y1, other.y1)
+        x2 = min(self.x2, other.x2)
+        y2 = min(self.y2, other.y2)
+
+        area = self.rectangular_area(x1, x2, y1, y2)
+        return area
+
+    def niou(self, other: BBox):
+        """Normalized IoU
+
+        This implements (Area1 ∩ Area2) / min(Area1, Area2)
+
+        Args:
+            other (BBox): The other bounding box to check for NIoU
+
+        Returns:    
+            float: the value of the normalized iou
+        """
+        niou = 0
+        try:
+            if self.is_overlapping(other):
+                intersection_area = self.intersection(other)
+                min_area = min(
+                    self.rectangular_area(self.x1, self.x2, self.y1, self.y2),
+                    other.rectangular_area(
+                        other.x1, other.x2, other.y1, other.y2)
+                )
+                niou = intersection_area / min_area
+            return niou
+        except:
+            return math.nan
+
+    def is_overlapping(self, other: BBox):
+        """Checks if this BBox is overlapping the another
+
+        Args:
+            other (BBox): The other BBox to check overlapping
+
+        Returns:
+            bool: Whether or not they it is overlapping
+        """
+        if self.xywhc and other.xywhc:
+            return (self.x1 < other.x2
+                    and self.y1 < other.y2
+                    and other.x1 < self.x2
+                    and other.y1 < self.y2)
+        raise Exception("Some bounding box was not detected")
@@ -0,0 +1,222 @@
+"""On-disk cache of the per-frame detections of the videos already processed
+
+The detections of a video only depend on its content and on the model
+configuration, so they are keyed by the SHA-256 of the video bytes together with
+the weights, image size, confidence and IoU thresholds and frame stride. A video
+uploaded again, even under another name, reuses them instead of running the model.
+
+Each entry is a .npy file in the cache directory. An SQLite index next to them
+keeps their size and last access, used for the LRU eviction, and the hit/miss
+counters. The index is shared by every thread and process using the directory.
+"""
+from __future__ import annotations
+
+from configparser import ConfigParser
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+
+THIS_FILE = Path(__file__).resolve()
+ROOT = THIS_FILE.parents[2]
+
+# Read config file
+CFG_FILE = THIS_FILE.parents[1] / "detect.cfg"
+PARSER = ConfigParser()
+PARSER.read(CFG_FILE)
+
+# Configs
+CACHE_ENABLED = PARSER.getboolean("cache", "enabled", fallback=False)
+CACHE_DIR = ROOT/PARSER.get("cache", "directory", fallback="database/cache")
+CACHE_MAX_BYTES = PARSER.getint("cache", "max_size_mb", fallback=1024) * 1024 * 1024
+
+
+def cache_key(video_sha256: str, weights, size: int, conf_th: float, iou_th: float,
+              frame_stride: int, letterbox: bool = False):
+    """Return the key of the detections of a video made with a model configuration
+
+    The weights are identified by their file name, the released weights are
+    never overwritten under the same name.
+
+    Args:
+        video_sha256 (str): SHA-256 of the video bytes (see `file_sha256`)
+        weights (str | Path): Weights of the model
+        size (int): Image size the model runs on
+        conf_th (float): Confidence threshold
+        iou_th (float): NMS IoU threshold
+        frame_stride (int): The model ran every `frame_stride` frames
+        letterbox (bool, optional): The frames were letterboxed before the model
+            instead of by its AutoShape wrapper. Defaults to False.
+
+    Returns:
+        str: SHA-256 hex digest of all of the above
+    """
+    config = {
+        "video": video_sha256,
+        "weights": Path(weights).name,
+        "size": int(size),
+        "conf_th": float(conf_th),
+        "iou_th": float(iou_th),
+        "frame_stride": int(frame_stride),
+    }
+    if letterbox:  # the keys made before it existed stay valid
+        config["letterbox"] = True
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class InferenceCache:
+    """Size bounded LRU cache of detections arrays, stored on disk
+
+    Safe to use from several threads and processes at the same time: the index
+    is an SQLite database (each call opens its own connection) and the entries
+    are written to a temporary file and renamed into place, so a reader never
+    sees a partial file.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        """
+        Args:
+            directory (str | Path, optional): Where the entries and their index are
+                stored. Defaults to the `directory` in the `detect.cfg` file.
+            max_bytes (int, optional): Size of the entries past which the least
+                recently used ones are evicted. Defaults to the `max_size_mb` in
+                the `detect.cfg` file.
+        """
+        self.__dir = Path(directory)
+        self.__max_bytes = max_bytes
+        self.__index = self.__dir/"index.db"
+        self.__ready = False
+
+    def __repr__(self):
+        return f"InferenceCache(directory='{self.__dir}', max_bytes={self.__max_bytes})"
+
+    @property
+    def directory(self):
+        return self.__dir
+
+    def __connect(self):
+        # Created on first use, so building the default cache has no side effects
+        if not self.__ready:
+            self.__dir.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.__index, timeout=30)
+        if not self.__ready:
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS entries(
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL)""")
+            con.execute("""CREATE TABLE IF NOT EXISTS counters(
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL)""")
+            con.executemany("INSERT OR IGNORE INTO counters VALUES(?, 0)",
+                            [("hits",), ("misses",)])
+            con.commit()
+            self.__ready = True
+        return con
+
+    def __entry_path(self, key: str):
+        return self.__dir/f"{key}.npy"
+
+    def get(self, key: str):
+        """Return the detections stored under `key`, counting a hit or a miss
+
+        Args:
+            key (str): The entry key (see `cache_key`)
+
+        Returns:
+            np.ndarray | None: The detections, or None if they are not cached
+        """
+        con = self.__connect()
+        try:
+            detections = None
+            if con.execute("SELECT 1 FROM entries WHERE key = ?", [key]).fetchone():
+                try:
+                    detections = np.load(self.__entry_path(key))
+                except (OSError, ValueError):  # evicted meanwhile, or damaged
+                    con.execute("DELETE FROM entries WHERE key = ?", [key])
+
+            counter = "misses" if detections is None else "hits"
+            con.execute("UPDATE counters SET value = value + 1 WHERE name = ?", [counter])
+            if detections is not None:
+                con.execute("UPDATE entries SET last_access = ? WHERE key = ?",
+                            [time.time(), key])
+            con.commit()
+        finally:
+            con.close()
+        return detections
+
+    def put(self, key: str, detections: np.ndarray):
+        """Store the detections under `key` and evict the least recently used
+        entries if the cache got too big
+
+        Args:
+            key (str): The entry key (see `cache_key`)
+            detections (np.ndarray): The detections array
+        """
+        con = self.__connect()
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.__dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, detections)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self.__entry_path(key))
+
+            con.execute("INSERT OR REPLACE INTO entries VALUES(?, ?, ?)",
+                        [key, size, time.time()])
+            con.commit()
+            self.__evict(con)
+        finally:
+            con.close()
+
+    def __evict(self, con):
+        con.execute("BEGIN IMMEDIATE")
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        evicted = []
+        if total > self.__max_bytes:
+            querry = "SELECT key, size FROM entries ORDER BY last_access"
+            for key, size in con.execute(querry).fetchall():
+                if total <= self.__max_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+            con.executemany("DELETE FROM entries WHERE key = ?", [[key] for key in evicted])
+        con.commit()
+        for key in evicted:
+            self.__entry_path(key).unlink(missing_ok=True)
+
+    def stats(self):
+        """Return the hit and miss counters and the size of the cache
+
+        Returns:
+            dict: {'hits': int, 'misses': int, 'entries': int, 'bytes': int}
+        """
+        con = self.__connect()
+        try:
+            stats = dict(con.execute("SELECT name, value FROM counters").fetchall())
+            stats["entries"], stats["bytes"] = con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        finally:
+            con.close()
+        return stats
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        con = self.__connect()
+        try:
+            keys = [key for key, in con.execute("SELECT key FROM entries").fetchall()]
+            con.execute("DELETE FROM entries")
+            con.execute("UPDATE counters SET value = 0")
+            con.commit()
+        finally:
+            con.close()
+        for key in keys:
+            self.__entry_path(key).unlink(missing_ok=True)
+
+
+INFERENCE_CACHE = InferenceCache() if CACHE_ENABLED else None
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def intervals_from_mask(mask):
+    """Run-length encode the True runs of a boolean array
+
+    Args:
+        mask (array_like): Bool for each frame, e.g. the interactions of a video
+
+    Returns:
+        np.ndarray: (N, 2) int array with the [start, end) frames of each run of
+            True values, in order
+
+            Example: [F, T, T, F, T] -> [[1, 3], [4, 5]]
+    """
+    mask = np.asarray(mask, dtype=bool)
+    padded = np.concatenate(([False], mask, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return changes.reshape(-1, 2)
+
+
+def mask_from_intervals(intervals: np.ndarray, n_frames: int):
+    """Inverse of `intervals_from_mask`
+
+    Args:
+        intervals (np.ndarray): (N, 2) array of [start, end) frames
+        n_frames (int): Length of the mask
+
+    Returns:
+        np.ndarray: Bool array, True inside the intervals
+    """
+    delta = np.zeros(n_frames + 1, dtype=np.int64)
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    np.add.at(delta, intervals[:, 0], 1)
+    np.add.at(delta, intervals[:, 1], -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+class IntervalTracker:
+    """Run-length encode a boolean array given in consecutive segments
+
+    Used to follow the interactions of a video while it is processed. A run
+    reaching the end of the frames given so far stays open until a False frame
+    (or `intervals`) closes it, so the result does not depend on how the array
+    was split.
+    """
+
+    def __init__(self) -> None:
+        self.__closed = []
+        self.__open_start = None
+        self.__n_frames = 0
+
+    @property
+    def n_frames(self):
+        """Number of frames given so far"""
+        return self.__n_frames
+
+    @property
+    def closed(self):
+        """(N, 2) int array with the [start, end) frames of the runs already closed"""
+        return np.array(self.__closed, dtype=np.int64).reshape(-1, 2)
+
+    def update(self, mask):
+        """Add the next frames
+
+        Args:
+            mask (array_like): Bool for each of the next frames
+        """
+        mask = np.asarray(mask, dtype=bool)
+        offset = self.__n_frames
+        self.__n_frames += len(mask)
+        if not len(mask):
+            return
+
+        intervals = intervals_from_mask(mask) + offset
+        if self.__open_start is not None:
+            if len(intervals) and intervals[0, 0] == offset:  # continues the open run
+                intervals[0, 0] = self.__open_start
+            else:
+                self.__closed.append([self.__open_start, offset])
+            self.__open_start = None
+        if len(intervals) and intervals[-1, 1] == self.__n_frames:
+            self.__open_start = int(intervals[-1, 0])
+            intervals = intervals[:-1]
+        self.__closed.extend(intervals.tolist())
+
+    def intervals(self):
+        """Return the runs so far, the open one ending at the last frame given
+
+        Returns:
+            np.ndarray: (N, 2) int array with the [start, end) frames of each run,
+                as `intervals_from_mask` of all the frames given so far
+        """
+        intervals = self.__closed
+        if self.__open_start is not None:
+            intervals = intervals + [[self.__open_start, self.__n_frames]]
+        return np.array(intervals, dtype=np.int64).reshape(-1, 2)
+
+
+def intervals_statistics(intervals: np.ndarray, frame_time: float,
+                         percentiles=(), bins: int = 0):
+    """Return statistics about the duration of the intervals
+
+    Everything is computed from the durations of the intervals (end - start) in
+    one go. Without intervals all the statistics are None.
+
+    Args:
+        intervals (np.ndarray): (N, 2) array of [start, end) frames
+        frame_time (float): Duration of one frame in seconds
+        percentiles (tuple, optional): Percentiles of the durations to add, like
+            (50, 90). Each one is added as a "p<q>_time" key. Defaults to ().
+        bins (int, optional): If > 0, add a "histogram" of the durations with this
+            many bins as {"counts": [...], "edges": [...]}, edges in seconds.
+            Defaults to 0.
+
+    Returns:
+        dict: The statistics, times in seconds.
+
+            Example: {
+                'n_interactions': int, 'total_time': float, 'min_time': float,
+                'max_time': float, 'mean_time': float, 'p50_time': float, ...
+            }
+    """
+    intervals = np.asarray(intervals).reshape(-1, 2)
+    durations = intervals[:, 1] - intervals[:, 0]
+
+    statistics = {
+        "n_interactions": None,
+        "total_time": None,
+        "min_time": None,
+        "max_time": None,
+        "mean_time": None,
+    }
+    statistics.update({f"p{q}_time": None for q in percentiles})
+    if bins > 0:
+        statistics["histogram"] = None
+    if len(durations) == 0:
+        return statistics
+
+    # Python ints times frame_time, like counting the frames in a list
+    n_interactions = len(durations)
+    total_time = int(durations.sum()) * frame_time
+    statistics["n_interactions"] = n_interactions
+    statistics["total_time"] = total_time
+    statistics["min_time"] = int(durations.min()) * frame_time
+    statistics["max_time"] = int(durations.max()) * frame_time
+    statistics["mean_time"] = total_time / n_interactions
+
+    if len(percentiles):
+        values = np.percentile(durations, percentiles) * frame_time
+        statistics.update({f"p{q}_time": float(v) for q, v in zip(percentiles, values)})
+    if bins > 0:
+        counts, edges = np.histogram(durations * frame_time, bins=bins)
+        statistics["histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+    return statistics
+
+
+def compare_intervals(reference: np.ndarray, other: np.ndarray, n_frames: int):
+    """Compare two sets of intervals of the same video, e.g. from different configs
+
+    Args:
+        reference (np.ndarray): (N, 2) array of [start, end) frames taken as truth
+        other (np.ndarray): (M, 2) array of [start, end) frames to compare
+        n_frames (int): Number of frames of the video
+
+    Returns:
+        dict: How much they agree
+            n_reference, n_other: number of intervals of each
+            agreement: fraction of frames where both are inside or outside intervals
+            iou: intersection over union of the frames inside intervals (1 if none)
+            boundary: mean distance in frames from each start/end of `other` to the
+                closest start/end of `reference` (NaN if any of them is empty)
+    """
+    reference = np.asarray(reference).reshape(-1, 2)
+    other = np.asarray(other).reshape(-1, 2)
+    ref_mask = mask_from_intervals(reference, n_frames)
+    other_mask = mask_from_intervals(other, n_frames)
+
+    union = np.count_nonzero(ref_mask | other_mask)
+    intersection = np.count_nonzero(ref_mask & other_mask)
+
+    boundary = float("nan")
+    if len(reference) and len(other):
+        # distance of each boundary to the closest one: (M, 1) - (1, N)
+        starts = np.abs(other[:, 0, None] - reference[None, :, 0]).min(axis=1)
+        ends = np.abs(other[:, 1, None] - reference[None, :, 1]).min(axis=1)
+        boundary = float(np.concatenate([starts, ends]).mean())
+
+    return {
+        "n_reference": len(reference),
+        "n_other": len(other),
+        "agreement": float(np.mean(ref_mask == other_mask)) if n_frames else 1.0,
+        "iou": intersection / union if union else 1.0,
+        "boundary": boundary,
+    }
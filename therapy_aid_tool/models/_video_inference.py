@@ -3,13 +3,18 @@ from __future__ import annotations
 from pathlib import Path
 from configparser import ConfigParser
 
-from typing import Tuple
+from threading import Lock
+import warnings
 
+import numpy as np
 import torch
-import math
+import torchvision
 
 import requests
 
+from therapy_aid_tool.models._detections import BBox
+from therapy_aid_tool.utils.video import Letterbox, letterbox
+
 
 THIS_FILE = Path(__file__).resolve()
 THIS_DIR = THIS_FILE.parent
@@ -24,69 +29,431 @@ PARSER.read(CFG_FILE)
 YOLO_REPO = "ultralytics/yolov5:v6.2"  # currently this is the latest version we tested
 MODEL_WEIGHTS = ROOT/PARSER.get("yolov5", "weights")
 MODEL_SIZE = PARSER.getint("model", "size")
+MODEL_CONF_TH = 0.75
+MODEL_IOU_TH = 0.45
+MODEL_BATCH_SIZE = PARSER.getint("model", "batch_size", fallback=1)
+MODEL_LETTERBOX = PARSER.getboolean("model", "letterbox", fallback=False)
+TORCH_INTRA_OP_THREADS = PARSER.getint("torch", "intra_op_threads", fallback=0)
+TORCH_INTER_OP_THREADS = PARSER.getint("torch", "inter_op_threads", fallback=0)
+TORCH_CHANNELS_LAST = PARSER.getboolean("torch", "channels_last", fallback=False)
+TORCH_COMPILE = PARSER.getboolean("torch", "compile", fallback=False)
+MODEL_BACKEND = PARSER.get("model", "backend", fallback="torch")
+MODEL_ONNX_WEIGHTS = ROOT/PARSER.get("model", "onnx_weights",
+                                     fallback=str(MODEL_WEIGHTS.with_suffix(".onnx")))
+PREFETCH_QUEUE_SIZE = PARSER.getint("pipeline", "queue_size", fallback=8)
+FRAME_STRIDE = PARSER.getint("pipeline", "frame_stride", fallback=1)
+WORKERS = PARSER.getint("pipeline", "workers", fallback=1)
+WORKER_TORCH_THREADS = PARSER.getint("pipeline", "torch_threads", fallback=0)
+STREAM_CHUNK_SIZE = PARSER.getint("pipeline", "chunk_size", fallback=300)
+
+
+# The released weights, by file name
+WEIGHTS_RELEASE = "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0"
+WEIGHTS_URLS = {
+    name: f"{WEIGHTS_RELEASE}/{name}" for name in [
+        "full1-yolov5m-img256-bs1.pt",
+        "full1-yolov5m-img512-bs1.pt",
+        "full1-yolov5n6-img1280-bs1.pt",
+        "full1-yolov5s-img256-bs1.pt",
+        "full1-yolov5s-img512-bs16.pt",
+        "full1-yolov5s-img640-bs1.pt",
+        "full1-yolov5x-img256-bs1.pt",
+    ]
+}
 
 
 def download_weights(save_location: Path):
     """Download pre trained weights from `therapy-aid-nn` v1.0.0 repo release
 
     The name of the weights to download is the filename content in the `save_location`
-    All the weights available are in the keys of the `urls` dictionary bellow
+    All the weights available are in the keys of the `WEIGHTS_URLS` dictionary
 
     Args:
         save_location (Path): Location to save the weights
     """
     weights_name = save_location.name
 
-    urls = {
-        "full1-yolov5m-img256-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5m-img256-bs1.pt",
-        "full1-yolov5m-img512-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5m-img512-bs1.pt",
-        "full1-yolov5n6-img1280-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5n6-img1280-bs1.pt",
-        "full1-yolov5s-img256-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5s-img256-bs1.pt",
-        "full1-yolov5s-img512-bs16.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5s-img512-bs16.pt",
-        "full1-yolov5s-img640-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5s-img640-bs1.pt",
-        "full1-yolov5x-img256-bs1.pt": "https://github.com/solisoares/therapy-aid-nn/releases/download/v1.0.0/full1-yolov5x-img256-bs1.pt",
-    }
-
-    req = requests.get(urls[weights_name])
+    req = requests.get(WEIGHTS_URLS[weights_name])
     with open(save_location, "wb") as f:
         f.write(req.content)
 
 
-def load_model(conf_th=0.75, iou_th=0.45):
+def load_model(conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH, device=None,
+               weights=MODEL_WEIGHTS):
     """Loads the best trained model
 
+    This always builds a new model, prefer `get_model` to share the already
+    loaded ones.
+
     Args:
         conf_th (float, optional): _description_. Defaults to 0.75.
         iou_th (float, optional): _description_. Defaults to 0.45.
+        device (str, optional): Device to load the model on, like "cpu" or "cuda:0".
+            Defaults to None, letting YOLOv5 pick the best one available.
+        weights (Path, optional): Weights of the model. Defaults to the `weights`
+            in the `detect.cfg` file.
 
     Returns:
         _type_: _description_
     """
+    weights = Path(weights)
+
     # Download weights if they do not exist already
-    if not MODEL_WEIGHTS.is_file():
-        download_weights(MODEL_WEIGHTS)
+    if not weights.is_file():
+        download_weights(weights)
 
     # Model
     model = torch.hub.load(
         repo_or_dir=YOLO_REPO,
         model="custom",
-        path=MODEL_WEIGHTS,
-        source="github"
+        path=weights,
+        source="github",
+        device=device,
     )
     model.conf = conf_th
     model.iou = iou_th
     return model
 
 
-def preds_from_torch_results(results, n_classes):
-    """Return the best predictions for each clas from the torch results of a model
+BACKENDS = ("torch", "onnxruntime")
+
+
+def model_stride(model):
+    """Return the largest stride of a YOLOv5 model (32, or 64 for the P6 models)
+
+    The sides of its letterboxed inputs have to be multiples of it (see `letterbox`).
+    The AutoShape wrapper has it as an int, the network as a tensor of the stride
+    of each output. Models without it get 32.
+    """
+    stride = getattr(model, "stride", 32)
+    return int(max(stride)) if hasattr(stride, "__len__") else int(stride)
+
+
+def default_weights(backend=MODEL_BACKEND):
+    """Return the weights a backend uses by default: the `weights` in the `detect.cfg`
+    file for torch, their ONNX export (the `onnx_weights`) for onnxruntime"""
+    return MODEL_ONNX_WEIGHTS if backend == "onnxruntime" else MODEL_WEIGHTS
+
+
+class TorchDetector:
+    """Detector backend running the YOLOv5 torch.hub model (see `load_model`)"""
+
+    # Also takes frames of any size, resized by the YOLOv5 AutoShape wrapper
+    letterbox_only = False
+
+    def __init__(self, model, inference_mode: bool = True,
+                 channels_last: bool = TORCH_CHANNELS_LAST,
+                 compile: bool = TORCH_COMPILE) -> None:
+        """
+        Args:
+            model: The YOLOv5 model (see `load_model`)
+            inference_mode (bool, optional): Run the model in `torch.inference_mode`,
+                without any autograd bookkeeping. Defaults to True.
+            channels_last (bool, optional): Convert the network to the channels last
+                memory format, usually faster for convolutions on CPU. Defaults to the
+                `channels_last` in the `detect.cfg` file.
+            compile (bool, optional): Compile the network with `torch.compile` (torch
+                2.0 or newer). The first calls, and the calls with a new input shape,
+                are slow while it compiles. Defaults to the `compile` in the
+                `detect.cfg` file.
+        """
+        self.model = model
+        self.stride = model_stride(model)
+        # inference_mode exists since torch 1.9, no_grad is the next best thing
+        self.__grad_mode = (getattr(torch, "inference_mode", torch.no_grad) if inference_mode
+                            else torch.enable_grad)
+
+        if channels_last or compile:
+            # The network is inside the AutoShape and DetectMultiBackend wrappers,
+            # when there are wrappers
+            parent = getattr(model, "model", model)
+            parent = parent if hasattr(parent, "model") else model
+            network = getattr(parent, "model", parent)
+            if channels_last:
+                network = network.to(memory_format=torch.channels_last)
+            if compile:
+                if hasattr(torch, "compile"):
+                    network = torch.compile(network)
+                else:
+                    warnings.warn(f"torch {torch.__version__} can not compile models, "
+                                  "it needs torch 2.0 or newer")
+            if hasattr(parent, "model"):
+                parent.model = network
+            else:
+                self.model = network
+
+    def __repr__(self):
+        return f"TorchDetector(conf={self.conf}, iou={self.iou})"
+
+    @property
+    def conf(self):
+        return self.model.conf
+
+    @property
+    def iou(self):
+        return self.model.iou
+
+    def detect(self, frames: list, n_classes: int, size: int = MODEL_SIZE):
+        """Return the (batch, classes, 5) detections of a batch of RGB frames of any size"""
+        with self.__grad_mode():
+            results = self.model(frames, size=size)
+            return detections_from_torch_results(results, n_classes)
+
+    def detect_letterboxed(self, inputs: np.ndarray, box: Letterbox, n_classes: int):
+        """Return the (batch, classes, 5) detections of a batch of letterboxed frames
+        (see `detections_from_letterboxed`)"""
+        with self.__grad_mode():
+            return detections_from_letterboxed(self.model, inputs, box, n_classes)
+
+    def warm_up(self, size: int = MODEL_SIZE, batch_size: int = MODEL_BATCH_SIZE):
+        """Run the model on a batch of blank images, the way the videos will run
+        it, so memory allocations (and compilations) happen before the first video"""
+        if MODEL_LETTERBOX:
+            box = letterbox(size, size, size, self.stride)
+            self.detect_letterboxed(box.buffer(batch_size), box, 1)
+        else:
+            self.detect([np.zeros((size, size, 3), dtype=np.uint8)] * batch_size, 1, size)
+
+
+class OnnxDetector:
+    """Detector backend running a YOLOv5 ONNX export (see `models.export`) on
+    ONNX Runtime, on the CPU
+
+    Needs the optional `onnxruntime` dependency (pip install therapy_aid_tool[onnx]).
+    """
+
+    # The raw network has no preprocessing, the frames have to be letterboxed
+    letterbox_only = True
+
+    def __init__(self, weights=MODEL_ONNX_WEIGHTS, conf_th=MODEL_CONF_TH,
+                 iou_th=MODEL_IOU_TH, threads: int = 0) -> None:
+        """
+        Args:
+            weights (Path, optional): The .onnx model. Defaults to the `onnx_weights`
+                in the `detect.cfg` file.
+            conf_th (float, optional): Confidence threshold. Defaults to 0.75.
+            iou_th (float, optional): NMS IoU threshold. Defaults to 0.45.
+            threads (int, optional): Threads ONNX Runtime uses for each operator,
+                0 keeps its default. Defaults to 0.
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnxruntime backend needs ONNX Runtime, install it with "
+                              "`pip install therapy_aid_tool[onnx]`") from e
+        weights = Path(weights)
+        if not weights.is_file():
+            raise FileNotFoundError(f"No ONNX model at '{weights}', export it with "
+                                    "`python -m therapy_aid_tool.models.export`")
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(weights), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.__input = self.session.get_inputs()[0].name
+        # Recorded by `export_onnx`, the older exports are of stride 32 networks
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.stride = int(metadata.get("stride", 32))
+        self.conf = conf_th
+        self.iou = iou_th
+
+    def __repr__(self):
+        return f"OnnxDetector(conf={self.conf}, iou={self.iou})"
+
+    def detect_letterboxed(self, inputs: np.ndarray, box: Letterbox, n_classes: int):
+        """Return the (batch, classes, 5) detections of a batch of letterboxed frames
+        (see `detections_from_letterboxed`)"""
+        images = inputs.transpose(0, 3, 1, 2).astype(np.float32) / 255
+        raw = self.session.run(None, {self.__input: images})[0]
+        return detections_from_raw(torch.from_numpy(raw), box, n_classes, self.conf, self.iou)
+
+    def warm_up(self, size: int = MODEL_SIZE):
+        box = letterbox(size, size, size, self.stride)
+        self.detect_letterboxed(box.buffer(1), box, 1)
+
+
+def load_detector(backend=MODEL_BACKEND, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+                  device=None, weights=None):
+    """Loads the detector of a backend
+
+    This always builds a new detector, prefer `get_model` to share the already
+    loaded ones.
+
+    Args:
+        backend (str, optional): One of `BACKENDS`. Defaults to the `backend` in the
+            `detect.cfg` file.
+        conf_th (float, optional): Confidence threshold. Defaults to 0.75.
+        iou_th (float, optional): NMS IoU threshold. Defaults to 0.45.
+        device (str, optional): Device of the torch backend, like "cpu" or "cuda:0".
+            Defaults to None, letting YOLOv5 pick the best one available.
+        weights (Path, optional): Weights of the model. Defaults to None, the
+            `default_weights` of the backend.
+
+    Returns:
+        TorchDetector | OnnxDetector: The detector
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    weights = default_weights(backend) if weights is None else weights
+    # The threads chosen for this process (e.g. by a worker initializer) win
+    if backend == "onnxruntime":
+        # Limited like torch, so the worker processes do not each take every core
+        threads = TORCH_INTRA_OP_THREADS if _TORCH_THREADS is None else _TORCH_THREADS
+        return OnnxDetector(weights, conf_th, iou_th, threads)
+    if _TORCH_THREADS is None:
+        set_torch_threads(TORCH_INTRA_OP_THREADS, TORCH_INTER_OP_THREADS)
+    return TorchDetector(load_model(conf_th, iou_th, device, weights))
+
+
+class ModelRegistry:
+    """Process-wide registry of loaded detectors
+
+    Loading a model (`torch.hub.load` + deserializing the weights, or building an
+    ONNX Runtime session) takes seconds and a full copy of the model in memory.
+    The registry loads each detector once, keyed by (backend, weights, conf_th,
+    iou_th, device), and hands out the same instance to everyone asking for it
+    afterwards.
+
+    It is thread safe: a model is loaded only once even if several threads (e.g.
+    Streamlit sessions) ask for it at the same time, while models with different
+    keys can be loaded in parallel.
+    """
+
+    def __init__(self) -> None:
+        self.__models = {}
+        self.__locks = {}  # one lock per key, held while that model loads
+        self.__lock = Lock()  # protects the two dicts above
+
+    @staticmethod
+    def key(weights=None, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+            device=None, backend=MODEL_BACKEND):
+        """Return the key that identifies a model in the registry"""
+        weights = default_weights(backend) if weights is None else weights
+        return (backend, str(Path(weights).resolve()), float(conf_th), float(iou_th),
+                None if device is None else str(device))
+
+    def get(self, weights=None, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+            device=None, backend=MODEL_BACKEND):
+        """Return the detector for this configuration, loading it if needed
+
+        Args:
+            weights (Path, optional): Weights of the model. Defaults to None, the
+                `default_weights` of the backend.
+            conf_th (float, optional): Confidence threshold. Defaults to 0.75.
+            iou_th (float, optional): NMS IoU threshold. Defaults to 0.45.
+            device (str, optional): Device of the model. Defaults to None.
+            backend (str, optional): One of `BACKENDS`. Defaults to the `backend`
+                in the `detect.cfg` file.
+
+        Returns:
+            TorchDetector | OnnxDetector: The shared detector
+        """
+        key = self.key(weights, conf_th, iou_th, device, backend)
+        with self.__lock:
+            if key in self.__models:
+                return self.__models[key]
+            key_lock = self.__locks.setdefault(key, Lock())
+
+        with key_lock:
+            with self.__lock:  # someone else may have loaded it meanwhile
+                if key in self.__models:
+                    return self.__models[key]
+            model = load_detector(backend, conf_th, iou_th, device, weights)
+            with self.__lock:
+                self.__models[key] = model
+        return model
+
+    def warm_up(self, weights=None, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+                device=None, size=MODEL_SIZE, backend=MODEL_BACKEND):
+        """Load the detector and run it once on a blank image
+
+        The first inference is slower than the next ones (memory allocations,
+        backend selection...), so this takes that cost out of the first video.
+
+        Returns:
+            TorchDetector | OnnxDetector: The shared detector
+        """
+        model = self.get(weights, conf_th, iou_th, device, backend)
+        model.warm_up(size)
+        return model
+
+    def evict(self, weights=None, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+              device=None, backend=MODEL_BACKEND):
+        """Remove a detector from the registry
+
+        The model memory is released once nobody else holds a reference to it.
+
+        Returns:
+            bool: Whether the detector was in the registry
+        """
+        key = self.key(weights, conf_th, iou_th, device, backend)
+        with self.__lock:
+            self.__locks.pop(key, None)
+            return self.__models.pop(key, None) is not None
+
+    def clear(self):
+        """Remove all detectors from the registry"""
+        with self.__lock:
+            self.__models.clear()
+            self.__locks.clear()
+
+    def keys(self):
+        """Return the keys of the loaded detectors"""
+        with self.__lock:
+            return list(self.__models)
+
 
-    When a model runs on an image or a video frame, the `results` can return information about
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_model(conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH, device=None,
+              weights=None, backend=MODEL_BACKEND):
+    """Return the shared detector for this configuration from the `MODEL_REGISTRY`
+
+    Same arguments as `load_detector`, but the detector is only loaded the first time.
+    """
+    return MODEL_REGISTRY.get(weights, conf_th, iou_th, device, backend)
+
+
+# The intra-op threads set by set_torch_threads in this process (0 = default),
+# None if it did not run. ONNX Runtime uses them too.
+_TORCH_THREADS = None
+
+
+def set_torch_threads(n_threads: int, inter_op_threads: int = 0):
+    """Set how many threads torch uses
+
+    The inter-op threads can only be set before torch runs anything in
+    parallel, later attempts are ignored with a warning.
+
+    Args:
+        n_threads (int): Threads for intra-op parallelism (e.g. inside a
+            convolution), 0 keeps the current number
+        inter_op_threads (int, optional): Threads for inter-op parallelism (independent
+            operators run at the same time), 0 keeps the current number. Defaults to 0.
+    """
+    global _TORCH_THREADS
+    _TORCH_THREADS = n_threads if n_threads > 0 else (_TORCH_THREADS or 0)
+    if n_threads > 0:
+        torch.set_num_threads(n_threads)
+    if inter_op_threads > 0 and inter_op_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            warnings.warn(f"Could not set the inter-op threads of torch: {e}")
+
+
+def detections_from_torch_results(results, n_classes):
+    """Return the best prediction of each class for each image from the torch results of a model
+
+    When a model runs on images or video frames, the `results` can return information about
     x, y, w, h, conf & class values for each prediction made. For a normalized return we look at
-    the `results.xywhn` generated from the model tha comes in form of a List[Tensor].
+    the `results.xywhn` generated from the model tha comes in form of a List[Tensor], one
+    tensor for each image of the batch.
 
     This function gets x, y, w, h, conf & class values for each prediction, and for each class,
-    return the prediction with highest conf score.
+    return the prediction with highest conf score. The selection is made for all images and
+    classes at once on the tensors, only the final (batch, classes, 5) array leaves the device.
 
     results.xywhn example output:
 
@@ -98,123 +465,161 @@ def preds_from_torch_results(results, n_classes):
                  device='cuda:0')]
 
     Args:
-        results: Torch predictions for a frame
-        n_classes (int): Number of classes. Used to create template for lacking predictions
+        results: Torch predictions for a batch of images (or a single one)
+        n_classes (int): Number of classes
 
     Returns:
-        list: Predictions for each class. Key, Value = class, [x,y,w,h,conf] | None
-            Example: [(0, [x, y, w, h, conf]), (1, [x, y, w, h, conf]), (2, None), ...]
+        np.ndarray: (batch, classes, 5) array with the x, y, w, h, conf of the best
+            prediction of each class in each image, NaN for the classes not predicted
     """
-    # Get predictions as list of lists
-    preds = results.xywhn[0].tolist()
-
-    # All class numbers initiate with a list with -inf values
-    preds_dict = {c: [[float("-inf")] * 5] for c in range(n_classes)}
+    return detections_from_xywhn(results.xywhn, n_classes)
 
-    # Separete predictions according to class number
-    for *xywhc, c in preds:
-        preds_dict[c].append(xywhc)
 
-    # Get predictions with highest conf for each class
-    for c in range(n_classes):
-        preds_dict[c] = sorted(preds_dict[c], key=lambda x: x[-1])[-1]
-        # the ones that still have -inf turn to None
-        if float("-inf") in preds_dict[c]:
-            preds_dict[c] = None
+def detections_from_xywhn(xywhn, n_classes):
+    """Return the best prediction of each class for each image from their xywhn tensors
 
-    return list(preds_dict.items())
+    See `detections_from_torch_results`.
 
+    Args:
+        xywhn (List[Tensor]): (predictions, 6) tensor for each image, each row
+            with the normalized x, y, w, h, conf & class of a prediction
+        n_classes (int): Number of classes
 
-class BBox:
-    """Represents a Bounding Box prediction made by YOLOv5
+    Returns:
+        np.ndarray: (batch, classes, 5) detections array
     """
+    xywhn = list(xywhn)
+    detections = torch.full((len(xywhn), n_classes, 5), float("nan"), dtype=torch.float64)
 
-    def __init__(self, pred: Tuple) -> None:
-        """Initializes the BBox
+    # Images with less predictions are padded with class -1, which matches no class
+    preds = torch.nn.utils.rnn.pad_sequence(xywhn, batch_first=True, padding_value=-1)
+    n_preds = preds.shape[1]
+    if n_preds == 0:
+        return detections.numpy()
 
-        A BBox prediction has two components, a class and the parameters 
-        of the bbox (x, y, w, h, conf).
-            x, y: center point of the bbox in the frame (float 0 -> 1)
-            w, h: width and height of the bbox (float 0 -> 1)
-            conf: confidence level of the bbox prediction.
+    conf, cls = preds[..., 4], preds[..., 5]
+    classes = torch.arange(n_classes, dtype=cls.dtype, device=cls.device)
 
-        Args:
-            pred (Tuple): Bounding Box Prediction, (cls, [x, y, w, h, conf])
-        """
-        self.pred = pred
-        self.cls = self.pred[0]
-        self.xywhc = self.pred[1]
-        self.create_corners()
+    # (batch, classes, preds) confidences, -inf where the prediction is of another class
+    conf_by_class = conf[:, None, :].expand(-1, n_classes, -1).masked_fill(
+        cls[:, None, :] != classes[None, :, None], float("-inf"))
 
-    def __bool__(self):
-        return self.conf != None
+    # Like a stable sort by conf, the last of the predictions with the same conf wins
+    best_conf, best = conf_by_class.flip(-1).max(dim=-1)
+    best = n_preds - 1 - best
 
-    def create_corners(self):
-        """Create the BBox corners x1, x2, y1, y2
-        """
-        if self.xywhc:
-            self.x, self.y, self.w, self.h, self.conf = self.xywhc
-            self.x1 = self.x - self.w / 2
-            self.x2 = self.x + self.w / 2
-            self.y1 = self.y - self.h / 2
-            self.y2 = self.y + self.h / 2
-        else:
-            self.x, self.y, self.w, self.h, self.conf = None, None, None, None, None
-            self.x1 = None,
-            self.x2 = None,
-            self.y1 = None,
-            self.y2 = None,
+    best_preds = preds.gather(1, best[..., None].expand(-1, -1, preds.shape[-1]))
+    found = (best_conf > float("-inf")).cpu()
+    detections[found] = best_preds[..., :5].double().cpu()[found]
+    return detections.numpy()
 
-    def rectangular_area(self, x1, x2, y1, y2):
-        return (x2 - x1) * (y2 - y1)
 
-    def intersection(self, other: BBox):
-        # Intersection corners
-        x1 = max(self.x1, other.x1)
-        y1 = max(self.y1, other.y1)
-        x2 = min(self.x2, other.x2)
-        y2 = min(self.y2, other.y2)
+def non_max_suppression(predictions, conf_th=MODEL_CONF_TH, iou_th=MODEL_IOU_TH,
+                        max_det=1000):
+    """Return the predictions kept by a per class non maximum suppression
 
-        area = self.rectangular_area(x1, x2, y1, y2)
-        return area
+    Same as the YOLOv5 NMS the AutoShape wrapper runs (one class per box, the
+    best one), for the raw output of a model called on an input tensor.
 
-    def niou(self, other: BBox):
-        """Normalized IoU
+    Args:
+        predictions (Tensor | list[Tensor]): (batch, boxes, 5 + classes) raw output,
+            each box with the x, y, w, h in input pixels, the objectness and the
+            score of each class. Only the first item of a list or tuple is used.
+        conf_th (float, optional): Confidence threshold. Defaults to 0.75.
+        iou_th (float, optional): NMS IoU threshold. Defaults to 0.45.
+        max_det (int, optional): Boxes kept per image at most. Defaults to 1000.
 
-        This implements (Area1 ∩ Area2) / min(Area1, Area2)
+    Returns:
+        list[Tensor]: (predictions, 6) tensor for each image, each row with the
+            x, y, w, h (input pixels), conf & class of a prediction
+    """
+    if isinstance(predictions, (list, tuple)):
+        predictions = predictions[0]
+    predictions = predictions.detach()  # of a model run with autograd enabled
+    kept = []
+    for preds in predictions:
+        preds = preds[preds[:, 4] > conf_th]
+        scores, classes = (preds[:, 5:] * preds[:, 4:5]).max(1)
+        preds, scores, classes = (x[scores > conf_th] for x in (preds, scores, classes))
+
+        xy, wh = preds[:, :2], preds[:, 2:4]
+        boxes = torch.cat([xy - wh / 2, xy + wh / 2], 1)
+        keep = torchvision.ops.batched_nms(boxes, scores, classes, iou_th)[:max_det]
+        kept.append(torch.cat([preds[keep, :4], scores[keep, None],
+                               classes[keep, None].to(preds.dtype)], 1))
+    return kept
+
+
+def detections_from_letterboxed(model, inputs: np.ndarray, box: Letterbox, n_classes: int):
+    """Run the model on a batch of letterboxed frames and return their detections
+
+    The frames are sent as a tensor, which skips the preprocessing (and the
+    NMS) of the YOLOv5 AutoShape wrapper: the NMS is `non_max_suppression`,
+    with the thresholds of the model, and the boxes are mapped back to the
+    frames like AutoShape does. The model runs in the grad mode of the caller
+    (see `TorchDetector`).
 
-        Args:
-            other (BBox): The other bounding box to check for NIoU
+    Args:
+        model: The YOLOv5 model (see `load_model`)
+        inputs (np.ndarray): (batch, input_height, input_width, 3) uint8 RGB frames
+            (see `Letterbox.fill`)
+        box (Letterbox): How the frames fit in the input
+        n_classes (int): Number of classes
 
-        Returns:    
-            float: the value of the normalized iou
-        """
-        niou = 0
-        try:
-            if self.is_overlapping(other):
-                intersection_area = self.intersection(other)
-                min_area = min(
-                    self.rectangular_area(self.x1, self.x2, self.y1, self.y2),
-                    other.rectangular_area(
-                        other.x1, other.x2, other.y1, other.y2)
-                )
-                niou = intersection_area / min_area
-            return niou
-        except:
-            return math.nan
-
-    def is_overlapping(self, other: BBox):
-        """Checks if this BBox is overlapping the another
+    Returns:
+        np.ndarray: (batch, classes, 5) detections array, normalized to the frames
+            (see `detections_from_torch_results`)
+    """
+    param = next(model.parameters())
+    tensor = torch.from_numpy(inputs).to(param.device).permute(0, 3, 1, 2)
+    tensor = tensor.to(param.dtype) / 255
+    raw = model(tensor)
+    return detections_from_raw(raw, box, n_classes, model.conf, model.iou)
 
-        Args:
-            other (BBox): The other BBox to check overlapping
 
-        Returns:
-            bool: Whether or not they it is overlapping
-        """
-        if self.xywhc and other.xywhc:
-            return (self.x1 < other.x2
-                    and self.y1 < other.y2
-                    and other.x1 < self.x2
-                    and other.y1 < self.y2)
-        raise Exception("Some bounding box was not detected")
+def detections_from_raw(raw, box: Letterbox, n_classes: int, conf_th=MODEL_CONF_TH,
+                        iou_th=MODEL_IOU_TH):
+    """Return the detections of the raw output of a model run on letterboxed frames
+
+    Args:
+        raw (Tensor | list[Tensor]): Raw output of the model (see `non_max_suppression`)
+        box (Letterbox): How the frames fit in the input of the model
+        n_classes (int): Number of classes
+        conf_th (float, optional): Confidence threshold. Defaults to 0.75.
+        iou_th (float, optional): NMS IoU threshold. Defaults to 0.45.
+
+    Returns:
+        np.ndarray: (batch, classes, 5) detections array, normalized to the frames
+    """
+    xywhn = []
+    for pred in non_max_suppression(raw, conf_th, iou_th):
+        # Input pixels to frame pixels, clipped to the frame
+        xy, wh = pred[:, :2], pred[:, 2:4]
+        offset = torch.tensor([box.left, box.top], dtype=pred.dtype, device=pred.device)
+        size = torch.tensor([box.frame_width, box.frame_height], dtype=pred.dtype,
+                            device=pred.device)
+        top_left = torch.minimum(((xy - wh / 2 - offset) / box.scale).clamp(min=0), size)
+        bottom_right = torch.minimum(((xy + wh / 2 - offset) / box.scale).clamp(min=0), size)
+        xywhn.append(torch.cat([(top_left + bottom_right) / 2 / size,
+                                (bottom_right - top_left) / size, pred[:, 4:]], 1))
+    return detections_from_xywhn(xywhn, n_classes)
+
+
+def preds_from_torch_results(results, n_classes, idx=0):
+    """Return the best predictions for each clas from the torch results of a model
+
+    Same as `detections_from_torch_results`, for one image of the batch, but in the
+    form of a list of (class, [x, y, w, h, conf] | None) tuples.
+
+    Args:
+        results: Torch predictions for a frame (or a batch of frames)
+        n_classes (int): Number of classes. Used to create template for lacking predictions
+        idx (int, optional): Index of the frame in the batch. Defaults to 0.
+
+    Returns:
+        list: Predictions for each class. Key, Value = class, [x,y,w,h,conf] | None
+            Example: [(0, [x, y, w, h, conf]), (1, [x, y, w, h, conf]), (2, None), ...]
+    """
+    detections = detections_from_xywhn([results.xywhn[idx]], n_classes)[0]
+    return [(c, None if np.isnan(detection[4]) else detection.tolist())
+            for c, detection in enumerate(detections)]
@@ -0,0 +1,205 @@
+"""Export the YOLOv5 weights to ONNX, for the onnxruntime backend
+
+Usage:
+    python -m therapy_aid_tool.models.export [WEIGHTS ...] [--opset 12]
+        [--int8 --calibration VIDEO [VIDEO ...] [--calibration-frames 200]]
+
+The weights are paths, or names of the released weights (e.g.
+full1-yolov5s-img256-bs1.pt, downloaded if needed). Defaults to the `weights`
+in the `detect.cfg` file. Each one is exported next to it with the .onnx
+suffix, with a dynamic batch size and input size.
+
+With --int8 it is also quantized to INT8 (-int8.onnx), with static
+quantization: the ranges of the activations are calibrated on frames sampled
+from the --calibration videos, letterboxed like they are for the model.
+
+Set `backend=onnxruntime` and `onnx_weights` (the .onnx or -int8.onnx) in the
+[model] section of the `detect.cfg` file to use them. Needs the optional
+dependencies: pip install therapy_aid_tool[onnx]
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import argparse
+
+import cv2
+import numpy as np
+import torch
+
+from therapy_aid_tool.models._video_inference import (
+    load_model,
+    model_stride,
+    MODEL_SIZE,
+    MODEL_WEIGHTS,
+)
+from therapy_aid_tool.utils.video import get_frame_size, get_video_frames_count, letterbox
+
+
+def weights_path(weights):
+    """Return the path of weights given by path or by the name of released weights"""
+    weights = Path(weights)
+    if weights.parent == Path(".") and not weights.is_file():
+        return MODEL_WEIGHTS.parent/weights.name
+    return weights
+
+
+def export_onnx(weights, output=None, opset: int = 12, size: int = MODEL_SIZE):
+    """Export YOLOv5 weights to an ONNX model of the raw network
+
+    The model takes (batch, 3, height, width) float RGB images in [0, 1], with
+    any batch size and input size (multiples of the stride of the network, 64
+    for the P6 models), and returns the raw (batch, boxes, 5 + classes)
+    predictions (see `non_max_suppression`). The stride is recorded in the
+    `stride` metadata of the model (see `onnx_stride`).
+
+    Args:
+        weights (str | Path): The .pt weights, downloaded if they are released ones
+        output (str | Path, optional): The .onnx model. Defaults to None, the weights
+            with the .onnx suffix.
+        opset (int, optional): ONNX opset version. Defaults to 12.
+        size (int, optional): Input size of the example input used to trace the
+            model. Defaults to the `size` in the `detect.cfg` file.
+
+    Returns:
+        Path: The .onnx model
+    """
+    weights = Path(weights)
+    output = weights.with_suffix(".onnx") if output is None else Path(output)
+
+    # The network inside the AutoShape and DetectMultiBackend wrappers
+    network = load_model(device="cpu", weights=weights).model
+    network = getattr(network, "model", network).float().eval()
+    stride = model_stride(network)
+    for module in network.modules():
+        if type(module).__name__ == "Detect":
+            module.inplace = False
+            module.export = True  # only the predictions, not the feature maps
+            # The grid follows the input size (onnx_dynamic before YOLOv5 v7.0)
+            module.dynamic = module.onnx_dynamic = True
+
+    example = torch.zeros(1, 3, size, size)
+    with torch.no_grad():
+        torch.onnx.export(network, example, str(output), opset_version=opset,
+                          input_names=["images"], output_names=["output"],
+                          dynamic_axes={"images": {0: "batch", 2: "height", 3: "width"},
+                                        "output": {0: "batch", 1: "boxes"}})
+    _set_metadata(output, {"stride": stride})
+    return output
+
+
+def _set_metadata(model, metadata: dict):
+    """Set metadata values of an ONNX model file"""
+    import onnx
+
+    onnx_model = onnx.load(str(model))
+    props = {prop.key: prop for prop in onnx_model.metadata_props}
+    for key, value in metadata.items():
+        prop = props[key] if key in props else onnx_model.metadata_props.add()
+        prop.key, prop.value = key, str(value)
+    onnx.save(onnx_model, str(model))
+
+
+def onnx_stride(model):
+    """Return the stride recorded in an ONNX model by `export_onnx`, 32 for the
+    models exported without it"""
+    import onnx
+
+    props = {prop.key: prop.value for prop in onnx.load(str(model)).metadata_props}
+    return int(props.get("stride", 32))
+
+
+def calibration_inputs(videos: list, n_frames: int = 200, size: int = MODEL_SIZE,
+                       stride: int = 32):
+    """Yield frames sampled evenly from videos, as inputs of the ONNX model
+
+    Args:
+        videos (list[str]): The videos
+        n_frames (int, optional): Frames sampled in total. Defaults to 200.
+        size (int, optional): Model size. Defaults to the `size` in the `detect.cfg` file.
+        stride (int, optional): Stride of the model (see `onnx_stride`). Defaults to 32.
+
+    Yields:
+        np.ndarray: (1, 3, height, width) float32 letterboxed RGB frame
+    """
+    per_video = max(1, n_frames // max(1, len(videos)))
+    for video in videos:
+        total = get_video_frames_count(str(video))
+        cap = cv2.VideoCapture(str(video))
+        try:
+            frame_size = get_frame_size(cap)
+            if not all(frame_size):  # no frame can be decoded
+                continue
+            box = letterbox(*frame_size, size, stride)
+            inputs = box.buffer(1)
+            for frame_idx in np.linspace(0, max(total - 1, 0), per_video).astype(int):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+                ok, frame = cap.read()
+                if not ok:
+                    continue
+                box.fill(inputs[0], box.resize(frame))
+                yield inputs.transpose(0, 3, 1, 2).astype(np.float32) / 255
+        finally:
+            cap.release()
+
+
+def quantize_int8(model, calibration, output=None):
+    """Quantize an ONNX model to INT8, calibrating the activations on sample inputs
+
+    Args:
+        model (str | Path): The float .onnx model (see `export_onnx`)
+        calibration (Iterable[np.ndarray]): Inputs of the model (see `calibration_inputs`)
+        output (str | Path, optional): The quantized model. Defaults to None, the
+            model with the -int8.onnx suffix.
+
+    Returns:
+        Path: The quantized .onnx model
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, inputs):
+            self.inputs = iter(inputs)
+
+        def get_next(self):
+            images = next(self.inputs, None)
+            return None if images is None else {"images": images}
+
+    model = Path(model)
+    output = model.with_name(f"{model.stem}-int8.onnx") if output is None else Path(output)
+    quantize_static(str(model), str(output), Reader(calibration),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    _set_metadata(output, {"stride": onnx_stride(model)})
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("weights", nargs="*", default=[MODEL_WEIGHTS],
+                        help="Weights paths or names of released weights")
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--int8", action="store_true", help="Also quantize to INT8")
+    parser.add_argument("--calibration", nargs="+", default=[],
+                        help="Videos the INT8 quantization is calibrated on")
+    parser.add_argument("--calibration-frames", type=int, default=200,
+                        help="Frames sampled from the calibration videos")
+    args = parser.parse_args()
+    if args.int8 and not args.calibration:
+        parser.error("--int8 needs --calibration videos")
+
+    for weights in args.weights:
+        onnx_model = export_onnx(weights_path(weights), opset=args.opset)
+        print(f"--> {onnx_model}")
+        if args.int8:
+            inputs = calibration_inputs(args.calibration, args.calibration_frames,
+                                        stride=onnx_stride(onnx_model))
+            print(f"--> {quantize_int8(onnx_model, inputs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,246 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import NamedTuple
+import multiprocessing
+import time
 
 from therapy_aid_tool.models._video_inference import (
-    load_model,
-    preds_from_torch_results,
+    get_model,
+    default_weights,
+    set_torch_threads,
+    MODEL_BACKEND,
+    TORCH_INTER_OP_THREADS,
     MODEL_SIZE,
-    BBox,
+    MODEL_CONF_TH,
+    MODEL_IOU_TH,
+    MODEL_BATCH_SIZE,
+    MODEL_LETTERBOX,
+    PREFETCH_QUEUE_SIZE,
+    FRAME_STRIDE,
+    WORKERS,
+    WORKER_TORCH_THREADS,
+    STREAM_CHUNK_SIZE,
 )
+from therapy_aid_tool.models._detections import (
+    interpolate_detections,
+    filter_detections,
+    closeness_from_detections,
+    bboxes_from_detections,
+)
+from therapy_aid_tool.models._intervals import (
+    IntervalTracker,
+    intervals_from_mask,
+    intervals_statistics,
+)
+from therapy_aid_tool.models._inference_cache import (
+    InferenceCache,
+    cache_key,
+    INFERENCE_CACHE,
+)
+from therapy_aid_tool.models._checkpoints import CheckpointStore, CHECKPOINTS
+from therapy_aid_tool.utils.video import (
+    get_frame_size,
+    letterbox,
+    prefetch_frames,
+    split_frame_ranges,
+)
+from therapy_aid_tool.utils.filepaths import file_sha256
 
 import cv2
+import numpy as np
+
+
+def _iter_detections(filepath: str, start: int, stop: int, n_classes: int,
+                     batch_size: int, queue_size: int, frame_stride: int):
+    """Run the model on the frames [start, stop) of a video, yielding each batch
+
+    It opens its own capture of the video, seeking to the `start` frame, so
+    different ranges of the same video can be processed by different processes.
+
+    Args:
+        filepath (str): Video path
+        start (int): First frame of the range. Should be a multiple of `frame_stride`
+        stop (int): Frame after the last one of the range
+        n_classes (int): Number of classes of the model
+        batch_size (int): How many frames are sent to the model in a single call
+        queue_size (int): How many frames the decoder thread can read ahead of the model
+        frame_stride (int): Run the model only every `frame_stride` frames
+
+    Yields:
+        tuple[int, list[int], np.ndarray]: The number of frames decoded so far, the
+            indexes (from `start`) of the frames of the batch and their (batch, classes, 5)
+            detections (see `detections_from_torch_results`). Once the range is
+            decoded, a last empty batch gives the final number of decoded frames.
+    """
+    model = get_model()
+    n_decoded = 0
+    cap = cv2.VideoCapture(filepath)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    box, transform = None, None
+    frame_size = get_frame_size(cap) if MODEL_LETTERBOX or model.letterbox_only else (0, 0)
+    if all(frame_size):  # else there is no frame to decode anyway
+        # Frames are downscaled in the decoder thread and copied, as RGB, to a
+        # buffer allocated once, that goes to the model as a tensor
+        box = letterbox(*frame_size, MODEL_SIZE, model.stride)
+        transform, inputs = box.resize, box.buffer(batch_size)
+
+    def run_batch(batch):
+        frame_idxs = [frame_idx for frame_idx, _ in batch]
+        if box is not None:
+            return n_decoded, frame_idxs, model.detect_letterboxed(inputs[:len(batch)], box,
+                                                                   n_classes)
+        return n_decoded, frame_idxs, model.detect([frame for _, frame in batch], n_classes)
+
+    # Frames are collected in batches and the model runs once per batch
+    batch = []
+    frames = prefetch_frames(cap, stop - start, queue_size, frame_stride, transform)
+    try:
+        with closing(frames):
+            for frame_idx, frame in enumerate(frames):
+                n_decoded += 1
+                if frame is None:  # skipped by the stride
+                    continue
+                if box is not None:
+                    box.fill(inputs[len(batch)], frame)
+                    batch.append((frame_idx, None))
+                else:
+                    batch.append((frame_idx, frame[:, :, ::-1]))
+                if len(batch) == batch_size:
+                    yield run_batch(batch)
+                    batch = []
+        if batch:
+            yield run_batch(batch)
+    finally:
+        cap.release()
+    yield n_decoded, [], np.empty((0, n_classes, 5))
+
+
+def _detect_frames(filepath: str, start: int, stop: int, n_classes: int,
+                   batch_size: int, queue_size: int, frame_stride: int):
+    """Run the model on the frames [start, stop) of a video
+
+    Same arguments as `_iter_detections`.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The (frames, classes, 5) detections array of
+            the decoded frames of the range (see `detections_from_torch_results`) and
+            a bool array telling in which of them the model ran.
+    """
+    detections = np.full((stop - start, n_classes, 5), np.nan)
+    detected = np.zeros(stop - start, dtype=bool)
+    n_decoded = 0
+    for n_decoded, frame_idxs, batch_detections in _iter_detections(
+            filepath, start, stop, n_classes, batch_size, queue_size, frame_stride):
+        detections[frame_idxs] = batch_detections
+        detected[frame_idxs] = True
+    return detections[:n_decoded], detected[:n_decoded]
+
+
+def _detect_resumable(filepath: str, detections: np.ndarray, detected: np.ndarray,
+                      batch_size: int, queue_size: int, frame_stride: int,
+                      checkpoints: CheckpointStore = None, key: str = None):
+    """Run the model on a whole video, resuming from its checkpoint if there is one
+
+    The arrays are filled in place. Every `checkpoints.every` frames the detections
+    so far are saved, so an interrupted run can resume from there.
+
+    Args:
+        filepath (str): Video path
+        detections (np.ndarray): (frames, classes, 5) NaN array for the frame count
+            of the video, filled with the detections
+        detected (np.ndarray): False array for the frame count of the video, True
+            for the frames the model ran on
+        batch_size, queue_size, frame_stride: See `_iter_detections`
+        checkpoints (CheckpointStore, optional): Where the checkpoints are saved.
+            Defaults to None, without checkpoints.
+        key (str, optional): The video key in the `checkpoints` (see `cache_key`)
+
+    Yields:
+        tuple[int, int]: The frames decoded so far and the frame after the last one
+            the model ran on. The first one is yielded before running the model,
+            with the frames restored from the checkpoint.
+    """
+    ready = 0
+    if checkpoints is not None:
+        checkpoint = checkpoints.load(key)
+        if (checkpoint is not None and len(checkpoint[1]) <= len(detected)
+                and checkpoint[0].shape[1:] == detections.shape[1:]):
+            ready = len(checkpoint[1])
+            detections[:ready], detected[:ready] = checkpoint
+    yield ready, ready
+
+    # The model ran on the frame before `ready`, the stride goes on after it
+    start = min(-(-ready // frame_stride) * frame_stride, len(detected))
+    saved = ready
+    for n_decoded, frame_idxs, batch_detections in _iter_detections(
+            filepath, start, len(detected), detections.shape[1],
+            batch_size, queue_size, frame_stride):
+        frame_idxs = [start + frame_idx for frame_idx in frame_idxs]
+        detections[frame_idxs] = batch_detections
+        detected[frame_idxs] = True
+        if frame_idxs:
+            ready = frame_idxs[-1] + 1
+        if checkpoints is not None and ready - saved >= checkpoints.every:
+            checkpoints.save(key, detections[:ready], detected[:ready])
+            saved = ready
+        yield start + n_decoded, ready
+
+
+def _cached_detections(filepath: str, frame_stride: int, cache: InferenceCache | None,
+                       checkpoints: CheckpointStore | None, sha256: str | None = None):
+    """Return the key of a video in the cache and checkpoints, and its cached detections
+
+    Args:
+        filepath (str): Video path
+        frame_stride (int): The model runs every `frame_stride` frames
+        cache (InferenceCache | None): Where the detections are looked up
+        checkpoints (CheckpointStore | None): Where the detections are saved while
+            the video is processed, only needs the key
+        sha256 (str, optional): SHA-256 of the video, if it is already known.
+            Defaults to None, hash the file.
+
+    Returns:
+        tuple[str | None, np.ndarray | None]: The key (see `cache_key`), None without
+            cache nor checkpoints, and the cached (frames, classes, 5) detections,
+            None if they are not in the cache
+    """
+    if cache is None and checkpoints is None:
+        return None, None
+    # The batch size and workers only change how fast the detections are made
+    # The weights name tells the backend (and the quantization) apart
+    sha256 = file_sha256(filepath) if sha256 is None else sha256
+    key = cache_key(sha256, default_weights(MODEL_BACKEND), MODEL_SIZE,
+                    MODEL_CONF_TH, MODEL_IOU_TH, frame_stride, MODEL_LETTERBOX)
+    return key, cache.get(key) if cache is not None else None
+
+
+def _store_detections(key: str, detections: np.ndarray, cache: InferenceCache | None,
+                      checkpoints: CheckpointStore | None):
+    """Put the detections of a processed video in the cache and drop its checkpoint"""
+    if cache is not None:
+        cache.put(key, detections)
+    if checkpoints is not None:
+        checkpoints.remove(key)
+
+
+def _init_detection_worker(torch_threads: int):
+    """Limit the threads torch (and ONNX Runtime) uses in each worker process, so
+    they do not compete"""
+    if torch_threads > 0:
+        set_torch_threads(torch_threads, TORCH_INTER_OP_THREADS)
+
+
+class BuildProgress(NamedTuple):
+    """How far `VideoBuilder.stream` is in a video"""
+    frames_done: int  # frames decoded
+    total_frames: int
+    elapsed: float  # seconds since the start
+    throughput: float  # frames per second
+    eta: float  # seconds left at the current throughput
 
 
 class VideoBuilder:
@@ -24,55 +254,287 @@ class VideoBuilder:
 
     n_classes: int = 3
     CLOSENESS_THRESHOLD: float = 0.6
+    # Percentiles and histogram bins of the durations of the interactions, in the statistics
+    DURATION_PERCENTILES: tuple = (50, 90)
+    DURATION_BINS: int = 10
+
+    def __init__(self, filepath: str, batch_size: int = MODEL_BATCH_SIZE,
+                 queue_size: int = PREFETCH_QUEUE_SIZE,
+                 frame_stride: int = FRAME_STRIDE,
+                 workers: int = WORKERS,
+                 torch_threads: int = WORKER_TORCH_THREADS,
+                 cache: InferenceCache | None = INFERENCE_CACHE,
+                 checkpoints: CheckpointStore | None = CHECKPOINTS,
+                 sha256: str | None = None) -> None:
+        """Initializes the builder and processes the whole video
 
-    def __init__(self, filepath: str) -> None:
+        Args:
+            filepath (str): Video path
+            batch_size (int, optional): How many frames are sent to the model in a
+                single call. Defaults to the `batch_size` in the `detect.cfg` file.
+            queue_size (int, optional): How many frames the decoder thread can read
+                ahead of the model. Defaults to the `queue_size` in the `detect.cfg` file.
+            frame_stride (int, optional): Run the model only every `frame_stride` frames,
+                the bounding boxes of the frames in between are interpolated.
+                Defaults to the `frame_stride` in the `detect.cfg` file.
+            workers (int, optional): Number of processes that run the model, each one
+                on a contiguous range of frames. Defaults to the `workers` in the
+                `detect.cfg` file.
+            torch_threads (int, optional): Threads torch can use in each worker process,
+                0 keeps the torch default. Only used when `workers` > 1. Defaults to
+                the `torch_threads` in the `detect.cfg` file.
+            cache (InferenceCache, optional): Where the detections of the videos
+                already processed are looked up and stored, None to always run the
+                model. Defaults to the cache configured in the `detect.cfg` file.
+            checkpoints (CheckpointStore, optional): Where the detections are saved
+                while the video is processed, to resume an interrupted build. None to
+                not save them. Only used with a single worker. Defaults to the
+                checkpoints configured in the `detect.cfg` file.
+            sha256 (str, optional): SHA-256 of the video, if it is already known
+                (e.g. from `save_stream`), for the keys of the cache and checkpoints.
+                Defaults to None, hash the file when they are used.
+        """
         self.__fp = filepath
-        self.__cap = cv2.VideoCapture(self.__fp)
-        self.__total_frames = int(self.__cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.__fps = float(self.__cap.get(cv2.CAP_PROP_FPS))
+        self.__batch_size = max(1, int(batch_size))
+        self.__queue_size = max(1, int(queue_size))
+        self.__frame_stride = max(1, int(frame_stride))
+        self.__workers = max(1, int(workers))
+        self.__torch_threads = max(0, int(torch_threads))
+        self.__cache = cache
+        self.__checkpoints = checkpoints
+        self.__sha256 = sha256
+        self.__key = None
+        cap = cv2.VideoCapture(self.__fp)
+        self.__total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.__fps = float(cap.get(cv2.CAP_PROP_FPS))
+        cap.release()
         # Long initialization
-        self.__bbs = self.__bboxes()
-        self.__clos = self.__closeness()
-        self.__inter = self.__interactions()
-        self.__stat = self.__interactions_statistics(self.__inter)
+        self.__dets = self.__detections()
+        self.__metrics()
 
-    def __bboxes(self):
-        """Return present bounding boxes for each frame
+    @classmethod
+    def from_detections(cls, filepath: str, detections: np.ndarray, fps: float,
+                        closeness_threshold: float = None, conf_th: float = None):
+        """Build from detections already made, without running the model
 
-        The output is stored in a dictionary (defaultdict) with the
-        keys being the actual classes of detection available, for
-        now there are 3 classes (actors): toddler, caretaker and plusme
+        Used to apply other thresholds to the videos already processed, e.g.
+        the detections stored in the database.
 
-        Each bounding box, being a instance of a BBox, can be used to
-        extract its coordinates and other parameters to detect how
-        close actors are. It can be used also to detect if there are
-        interactions happening, or to plot rectangular regions if desired.
+        Args:
+            filepath (str): Video path
+            detections (np.ndarray): (frames, classes, 5) detections array
+            fps (float): Frames per second of the video
+            closeness_threshold (float, optional): Closeness above which there is an
+                interaction. Defaults to `CLOSENESS_THRESHOLD`.
+            conf_th (float, optional): Ignore the detections with a lower confidence
+                (see `filter_detections`). Defaults to None, keeping all of them.
 
         Returns:
-            defaultdict: Bounding boxes for each frame. The keys are the
-                classes and the values are arrays/lists contaning a BBox
-                instance for that class key in that frame index.
+            VideoBuilder: The builder, ready to `build`
+        """
+        builder = cls.__new__(cls)
+        builder.__fp = filepath
+        builder.__fps = float(fps)
+        if closeness_threshold is not None:
+            builder.CLOSENESS_THRESHOLD = closeness_threshold
+        if conf_th is not None:
+            detections = filter_detections(detections, conf_th)
+        builder.__dets = detections
+        builder.__total_frames = len(detections)
+        builder.__metrics()
+        return builder
+
+    @classmethod
+    def stream(cls, filepath: str, chunk_size: int = STREAM_CHUNK_SIZE, on_progress=None,
+               batch_size: int = MODEL_BATCH_SIZE, queue_size: int = PREFETCH_QUEUE_SIZE,
+               frame_stride: int = FRAME_STRIDE,
+               cache: InferenceCache | None = INFERENCE_CACHE,
+               checkpoints: CheckpointStore | None = CHECKPOINTS,
+               sha256: str | None = None):
+        """Process a video chunk by chunk, yielding the Video so far after each chunk
+
+        The partial videos hold the closeness, interactions, intervals and
+        statistics of the frames processed so far, as NumPy arrays (views of
+        the buffers being filled, do not modify them). An interaction still
+        going on at the end of a chunk is counted up to that frame.
+
+        The last video yielded is complete and the same `build` returns, with lists.
+        The video is processed in this process only (no `workers`).
 
-                Return example: {
-                    'td': [BBox0, BBox1, ...],
-                    'ct': [BBox0, BBox1, ...],
-                    'pm': [BBox0, BBox1, ...],
-                    }
+        Args:
+            filepath (str): Video path
+            chunk_size (int, optional): Frames processed between two partial videos.
+                Defaults to the `chunk_size` in the `detect.cfg` file.
+            on_progress (Callable[[BuildProgress], None], optional): Called after
+                each chunk with how far the processing is. Defaults to None.
+            batch_size, queue_size, frame_stride, cache, checkpoints, sha256: See
+                `__init__`
+
+        Yields:
+            Video: The video so far
+        """
+        batch_size, queue_size = max(1, int(batch_size)), max(1, int(queue_size))
+        chunk_size, frame_stride = max(1, int(chunk_size)), max(1, int(frame_stride))
+        start_time = time.perf_counter()
+        cap = cv2.VideoCapture(filepath)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = float(cap.get(cv2.CAP_PROP_FPS))
+        cap.release()
+
+        def report(frames_done, total_frames):
+            if on_progress is None:
+                return
+            elapsed = time.perf_counter() - start_time
+            throughput = frames_done / elapsed if elapsed > 0 else 0.0
+            eta = (total_frames - frames_done) / throughput if throughput else float("inf")
+            on_progress(BuildProgress(frames_done, total_frames, elapsed, throughput, eta))
+
+        key, detections = _cached_detections(filepath, frame_stride, cache, checkpoints,
+                                             sha256)
+        if detections is not None:
+            report(len(detections), len(detections))
+            yield cls.from_detections(filepath, detections, fps).build()
+            return
+
+        detections = np.full((total_frames, cls.n_classes, 5), np.nan)
+        detected = np.zeros(total_frames, dtype=bool)
+        closeness, interactions = {}, {}
+        trackers = {}
+        ready = 0  # the frames before are final: detected or interpolated
+
+        def process(stop):
+            """Interpolate the detections of the frames [ready, stop) and derive the rest"""
+            nonlocal ready
+            # The frame before `ready` was detected, it bounds the gap
+            first = max(ready - 1, 0)
+            segment = interpolate_detections(detections[first:stop], detected[first:stop])
+            detections[ready:stop] = segment[ready - first:]
+            for pair, niou in closeness_from_detections(detections[ready:stop]).items():
+                with np.errstate(invalid="ignore"):  # NaN closeness is not an interaction
+                    interaction = niou > cls.CLOSENESS_THRESHOLD
+                if pair not in closeness:
+                    closeness[pair] = np.full(total_frames, np.nan)
+                    interactions[pair] = np.zeros(total_frames, dtype=bool)
+                closeness[pair][ready:stop] = niou
+                interactions[pair][ready:stop] = interaction
+                trackers.setdefault(pair, IntervalTracker()).update(interaction)
+            ready = stop
+
+        def partial_video():
+            intervals = {pair: tracker.intervals() for pair, tracker in trackers.items()}
+            statistics = {pair: intervals_statistics(pair_intervals, 1 / fps,
+                                                     cls.DURATION_PERCENTILES,
+                                                     cls.DURATION_BINS)
+                          for pair, pair_intervals in intervals.items()}
+            return Video(filepath,
+                         {pair: values[:ready] for pair, values in closeness.items()},
+                         {pair: values[:ready] for pair, values in interactions.items()},
+                         statistics, intervals, detections=detections[:ready], fps=fps)
+
+        n_decoded = 0
+        for n_decoded, detected_until in _detect_resumable(filepath, detections, detected,
+                                                           batch_size, queue_size,
+                                                           frame_stride, checkpoints, key):
+            if detected_until - ready >= chunk_size:
+                process(detected_until)
+                report(n_decoded, total_frames)
+                yield partial_video()
+
+        process(n_decoded)  # the frames after the last detected one
+        # The frame count in the header may be off, trust the decoded frames
+        detections = detections[:n_decoded]
+        _store_detections(key, detections, cache, checkpoints)
+        report(n_decoded, n_decoded)
+        yield cls.from_detections(filepath, detections, fps).build()
+
+    def __metrics(self):
+        """Compute everything the Video holds from the detections"""
+        self.__clos = self.__closeness()
+        self.__inter = self.__interactions()
+        self.__intervals = self.__interactions_intervals()
+        self.__stat = self.__interactions_statistics(self.__intervals)
+
+    def __detect(self):
+        """Return the detections array and in which frames the model ran (see `_detect_frames`)
+
+        With more than one worker the video is split in contiguous frame ranges
+        (aligned to the stride), each range is processed by a worker process and
+        the detections are merged back in order.
         """
-        model = load_model()
-        bbs = defaultdict(list)
+        ranges = split_frame_ranges(self.__total_frames, self.__workers,
+                                    align=self.__frame_stride)
+        if len(ranges) < 2:
+            detections = np.full((self.__total_frames, self.n_classes, 5), np.nan)
+            detected = np.zeros(self.__total_frames, dtype=bool)
+            n_decoded = 0
+            for n_decoded, _ in _detect_resumable(self.__fp, detections, detected,
+                                                  self.__batch_size, self.__queue_size,
+                                                  self.__frame_stride, self.__checkpoints,
+                                                  self.__key):
+                pass
+            return detections[:n_decoded], detected[:n_decoded]
+
+        # spawn: forking a process that already initialized torch may deadlock
+        with ProcessPoolExecutor(max_workers=len(ranges),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_detection_worker,
+                                 initargs=(self.__torch_threads,)) as executor:
+            futures = [executor.submit(_detect_frames, self.__fp, start, stop,
+                                       self.n_classes, self.__batch_size,
+                                       self.__queue_size, self.__frame_stride)
+                       for start, stop in ranges]
+            results = [future.result() for future in futures]
+
+        for (start, stop), (range_detections, _) in zip(ranges[:-1], results):
+            if len(range_detections) != stop - start:
+                raise RuntimeError(
+                    f"Could not decode frames {start + len(range_detections)} "
+                    f"to {stop - 1} of '{self.__fp}'")
+        return (np.concatenate([detections for detections, _ in results]),
+                np.concatenate([detected for _, detected in results]))
+
+    def __detections(self):
+        """Return the best detection of each class for each frame
+
+        The detections are stored in a NumPy array of shape (frames, classes, 5)
+        where, for now, there are 3 classes (actors): toddler, caretaker and plusme
+        (see `CLASS_NAMES`). Each detection is the x, y, w, h, conf of the bounding
+        box of that class in that frame, or NaN if it was not detected.
+
+        The bounding boxes can be used to detect how close actors are. They can be
+        used also to detect if there are interactions happening, or to plot
+        rectangular regions if desired. Use `bboxes` to get them as BBox instances.
+
+        Frames are decoded in a background thread (see `prefetch_frames`) so the
+        decoding of the next frames overlaps with the inference of the current ones.
+
+        With a `frame_stride` k > 1 the model only runs on every k-th frame and the
+        bounding boxes of the frames in between are linearly interpolated (see
+        `interpolate_detections`), so there is still one detection per frame.
+
+        The detections of a video already processed with the same model
+        configuration are read from the `InferenceCache` instead. A build
+        interrupted before the end resumes from its last checkpoint.
 
-        for i in range(self.__total_frames):
-            _, frame = self.__cap.read()
-            inference = model(frame[:, :, ::-1], size=MODEL_SIZE)
-            preds = preds_from_torch_results(inference,
-                                             self.n_classes)  # returns three preds
+        Returns:
+            np.ndarray: (frames, classes, 5) detections array
+        """
+        self.__key, detections = _cached_detections(self.__fp, self.__frame_stride,
+                                                    self.__cache, self.__checkpoints,
+                                                    self.__sha256)
+        if detections is not None:
+            self.__total_frames = len(detections)
+            return detections
 
-            bbs["td"].append(BBox(preds[0]))
-            bbs["ct"].append(BBox(preds[1]))
-            bbs["pm"].append(BBox(preds[2]))
+        detections, detected = self.__detect()
 
-        return bbs
+        # The frame count in the header may be off, trust the decoded frames
+        self.__total_frames = len(detections)
+
+        if self.__frame_stride > 1:
+            detections = interpolate_detections(detections, detected)
+        _store_detections(self.__key, detections, self.__cache, self.__checkpoints)
+        return detections
 
     def __closeness(self):
         """Return how close actors' bounding box pairs are based on NIoU for each frame
@@ -81,16 +543,17 @@ class VideoBuilder:
         can use the Normalized Intersection over Union.
 
         This metric is measured for each pair of actors relation for each frame and
-        return in form of a dictionary.
+        return in form of a dictionary. It is computed for all frames and pairs at
+        once from the detections array (see `niou_array`).
 
         This results can generate a "YouTube" like bar of "best" moments, or in our case,
         moments of closeness.
 
         Returns:
-            defaultdict: How much close are the three main actors for each frame.
+            dict: How much close are the three main actors for each frame.
                 The keys are the three relation classes available and the values
-                are arrays/lists containing a float between 0~1 for that class key
-                in that frame index
+                are lists containing a float between 0~1 for that class key
+                in that frame index, or NaN if any of the actors was not detected
 
                 Return example: {
                     'td_ct': [NIoU0(td, ct), NIoU1(td, ct), ...],
@@ -98,15 +561,8 @@ class VideoBuilder:
                     'ct_pm': [NIoU0(ct, pm), NIoU1(ct, pm), ...]
                     }
         """
-        closeness = defaultdict(list)
-        bbs = self.__bbs
-
-        for idx in range(self.__total_frames):
-            closeness["td_ct"].append(bbs["td"][idx].niou(bbs["ct"][idx]))
-            closeness["td_pm"].append(bbs["td"][idx].niou(bbs["pm"][idx]))
-            closeness["ct_pm"].append(bbs["ct"][idx].niou(bbs["pm"][idx]))
-
-        return closeness
+        closeness = closeness_from_detections(self.__dets)
+        return {key: niou.tolist() for key, niou in closeness.items()}
 
     def __interactions(self):
         """Return whether or not there is an interaction present for each frame
@@ -124,9 +580,9 @@ class VideoBuilder:
         making an array of bools for one interaction class
 
         Returns:
-            defaultdict: The interactions for each frame.
+            dict: The interactions for each frame.
                 The keys are the three relation classes available and the values
-                are arrays/lists containing a Bool for that class key in that frame index
+                are lists containing a Bool for that class key in that frame index
 
                 Return example: {
                     'td_ct': [Bool, Bool, ...],
@@ -134,38 +590,44 @@ class VideoBuilder:
                     'ct_pm': [Bool, Bool, ...]
                     }
         """
-        interactions = defaultdict(list)
-        bbs = self.__bbs
-        closeness = self.__clos
-
-        for idx in range(self.__total_frames):
-            interactions["td_ct"].append(
-                True if (closeness["td_ct"][idx] >
-                         self.CLOSENESS_THRESHOLD) else False
-            )
-            interactions["td_pm"].append(
-                True if (closeness["td_pm"][idx] >
-                         self.CLOSENESS_THRESHOLD) else False
-            )
-            interactions["ct_pm"].append(
-                True if (closeness["ct_pm"][idx] >
-                         self.CLOSENESS_THRESHOLD) else False
-            )
-
-        return interactions
-
-    def __interactions_statistics(self, interactions: dict):
+        with np.errstate(invalid="ignore"):  # NaN closeness is not an interaction
+            return {key: (np.array(closeness) > self.CLOSENESS_THRESHOLD).tolist()
+                    for key, closeness in self.__clos.items()}
+
+    def __interactions_intervals(self):
+        """Return the [start, end) frames of each interaction in the video
+
+        Returns:
+            dict: (N, 2) int array for each of the three relation classes, with the
+                first frame and the frame after the last one of each interaction
+                (see `intervals_from_mask`)
+
+                Return example: {
+                    'td_ct': array([[12, 40], [97, 130], ...]),
+                    'td_pm': ...,
+                    'ct_pm': ...
+                }
+        """
+        return {key: intervals_from_mask(interaction)
+                for key, interaction in self.__inter.items()}
+
+    def __interactions_statistics(self, intervals: dict):
         """Return statistics for interactions in the video
 
+        All of them are computed from the interactions intervals
+        (see `intervals_statistics`).
+
         Args:
-            interactions (dict): The interactions for each frame.
-                The keys are the three relation classes available and the values
-                are arrays/lists containing a Bool for that class key in that frame index
+            intervals (dict): The (N, 2) [start, end) frames of each interaction.
+                The keys are the three relation classes available
 
         Returns:
             dict: Statistics for all the interactions instances that happened in the video
                 It can be used in a pandas.DataFrame to output a chart view.
 
+                With the `DURATION_PERCENTILES` (p50_time, ...) and a histogram of
+                the durations in `DURATION_BINS` bins.
+
                 Return example: {
                     'td_ct': {n_interactions: int', total_time: float, ...},
                     'td_pm': {n_interactions: int', total_time: float, ...},
@@ -173,65 +635,96 @@ class VideoBuilder:
                 }
         """
         frame_time = 1 / self.__fps  # time one frame takes to run
+        return {key: intervals_statistics(key_intervals, frame_time,
+                                          self.DURATION_PERCENTILES, self.DURATION_BINS)
+                for key, key_intervals in intervals.items()}
+
+    @property
+    def detections(self):
+        """(frames, classes, 5) array with the x, y, w, h, conf of each detection"""
+        return self.__dets
 
-        data_template = {
-            "n_interactions": int,
-            "total_time": float,
-            "min_time": float,
-            "max_time": float,
-            "mean_time": float,
-        }
-        statistics = {
-            "td_ct": data_template.copy(),
-            "td_pm": data_template.copy(),
-            "ct_pm": data_template.copy(),
-        }
-
-        for key, interaction in interactions.items():
-            # Groups of interaction and non interactions (1s and 0s)
-            groups = groupby(interaction)
-
-            # Generate metrics for interaction
-            groups_of_interaction = []  # the chunks of 1s
-            idxs = []  # start and end indexes of each chunk
-            count = 0  # auxiliary to get indexes
-            for k, group in groups:
-                group = list(group)
-                count += len(group)
-                if k == 1:
-                    idx1 = count - len(group)
-                    idx2 = count
-                    idxs.append((idx1, idx2))
-                    groups_of_interaction.append(group)
-
-            if groups_of_interaction:
-                n_interactions = len(groups_of_interaction)
-                total_time = interaction.count(1) * frame_time
-                mean_time = total_time / len(groups_of_interaction)
-                max_time = len(max(groups_of_interaction)) * frame_time
-                min_time = len(min(groups_of_interaction)) * frame_time
-            else:
-                (n_interactions, total_time,
-                 mean_time, max_time, min_time) = (None, None, None, None, None,)
-
-            statistics[key]["n_interactions"] = n_interactions
-            statistics[key]["total_time"] = total_time
-            statistics[key]["min_time"] = min_time
-            statistics[key]["max_time"] = max_time
-            statistics[key]["mean_time"] = mean_time
-
-        return statistics
+    def bboxes(self):
+        """Return the detections as BBox instances
+
+        Returns:
+            dict[str, list[BBox]]: The BBoxes of each frame, keyed by class name,
+                e.g. {'td': [BBox0, BBox1, ...], 'ct': ..., 'pm': ...}
+        """
+        return bboxes_from_detections(self.__dets)
 
     def build(self):
-        return Video(self.__fp, self.__clos, self.__inter, self.__stat)
+        return Video(self.__fp, self.__clos, self.__inter, self.__stat, self.__intervals,
+                     detections=self.__dets, fps=self.__fps)
 
 
 class Video:
-    def __init__(self, filepath, closeness, interactions, interactions_statistics) -> None:
+    def __init__(self, filepath, closeness, interactions, interactions_statistics,
+                 interactions_intervals=None, detections=None, fps=None) -> None:
+        """
+        Args:
+            filepath (str): Video path
+            closeness (dict | Callable[[], dict]): Closeness for each frame, keyed
+                by relation class, or a function loading it on first access
+            interactions (dict | Callable[[], dict]): Interactions for each frame,
+                keyed by relation class, or a function loading them on first access
+            interactions_statistics (dict): Statistics for each relation class
+            interactions_intervals (dict, optional): [start, end) frames of each
+                interaction. Computed from the interactions when None.
+            detections (np.ndarray | Callable[[], np.ndarray], optional): The
+                (frames, classes, 5) detections the rest was computed from, or a
+                function loading them on first access. None if unknown.
+            fps (float, optional): Frames per second of the video. None if unknown.
+        """
         self.filepath = filepath
         self.closeness = closeness
         self.interactions = interactions
         self.interactions_statistics = interactions_statistics
+        self.__intervals = interactions_intervals
+        self.detections = detections
+        self.fps = fps
+
+    @property
+    def detections(self):
+        if callable(self.__detections):
+            self.__detections = self.__detections()
+        return self.__detections
+
+    @detections.setter
+    def detections(self, detections):
+        self.__detections = detections
+
+    @property
+    def closeness(self):
+        if callable(self.__closeness):
+            self.__closeness = self.__closeness()
+        return self.__closeness
+
+    @closeness.setter
+    def closeness(self, closeness):
+        self.__closeness = closeness
+
+    @property
+    def interactions(self):
+        if callable(self.__interactions):
+            self.__interactions = self.__interactions()
+        return self.__interactions
+
+    @interactions.setter
+    def interactions(self, interactions):
+        self.__interactions = interactions
+        self.__intervals = None
+
+    @property
+    def interactions_intervals(self):
+        """The (N, 2) [start, end) frames of each interaction, for each relation class
+
+        Computed from the interactions when they were not given.
+        """
+        if self.__intervals is None:
+            self.__intervals = {key: intervals_from_mask(interaction)
+                                for key, interaction in self.interactions.items()}
+        return self.__intervals
 
     def __repr__(self):
         return f"Video(filepath='{self.filepath}', closeness='{self.closeness}', interactions='{self.interactions}', interactions_statistics='{self.interactions_statistics}')"
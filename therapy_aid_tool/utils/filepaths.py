@@ -1,7 +1,80 @@
+from pathlib import Path
+import hashlib
 import os
+import shutil
+import tempfile
+
 
 def get_filepaths_from_dir(dirpath, key=None):
     filenames = sorted(os.listdir(dirpath), key=key)
     filepaths = [os.path.join(os.path.abspath(dirpath), filename)
                  for filename in filenames]
-    return filepaths
\ No newline at end of file
+    return filepaths
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file content, read in chunks of `chunk_size` bytes"""
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def save_stream(stream, location, chunk_size=1024 * 1024):
+    """Write a binary file-like object to `location`, chunk by chunk, and hash it on the way
+
+    The content is written to a temporary file next to `location` and renamed
+    into place, so `location` is never left half written. Only one chunk is in
+    memory at a time.
+
+    Args:
+        stream: Readable binary file-like object, read from its start if it is seekable
+        location (str | Path): Where to write it
+        chunk_size (int, optional): Bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: SHA-256 hex digest of the content
+    """
+    if stream.seekable():
+        stream.seek(0)
+    location = Path(location)
+    location.parent.mkdir(parents=True, exist_ok=True)
+    sha256 = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=location.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                sha256.update(chunk)
+                f.write(chunk)
+        os.replace(tmp, location)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return sha256.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Atomically make `dst` a hard link to `src`, or a copy where links are not possible
+
+    A hard link (same filesystem) costs no write at all. The link or the copy is
+    made under a temporary name and renamed into place, replacing `dst` if it exists.
+
+    Args:
+        src (str | Path): Existing file
+        dst (str | Path): Where it is made available
+    """
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, suffix=".tmp")
+    os.close(fd)
+    os.unlink(tmp)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:  # another filesystem, or no hard links
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
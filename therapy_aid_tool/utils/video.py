@@ -1,6 +1,10 @@
 import os
 from pathlib import Path
+from queue import Queue, Full
+from threading import Event, Thread
+from typing import NamedTuple
 import cv2
+import numpy as np
 
 
 def get_video_frames_count(source: str):
@@ -18,8 +22,200 @@ def get_video_frames_count(source: str):
     return frames_count
 
 
+def split_frame_ranges(n_frames: int, n_ranges: int, align: int = 1):
+    """Split the frames of a video in contiguous [start, stop) ranges
+
+    Args:
+        n_frames (int): Total frames count
+        n_ranges (int): Maximum number of ranges
+        align (int, optional): Every range starts at a multiple of `align`. Defaults to 1.
+
+    Returns:
+        list[tuple[int, int]]: The (start, stop) of each range, in order
+    """
+    step = -(-n_frames // max(1, n_ranges))  # ceil division
+    step = max(align, -(-step // align) * align)
+    return [(start, min(start + step, n_frames)) for start in range(0, n_frames, step)]
+
+
 def get_video_fps(source: str):
     cap = cv2.VideoCapture(source)
     fps = float(cap.get(cv2.CAP_PROP_FPS))
     cap.release()
     return fps
+
+
+def get_frame_size(cap: cv2.VideoCapture):
+    """Return the width and height of the frames of an opened video
+
+    Some containers report a size of 0, then the next frame is decoded to get
+    it and the capture goes back to where it was.
+
+    Args:
+        cap (cv2.VideoCapture): Opened video capture
+
+    Returns:
+        tuple[int, int]: Width and height, (0, 0) if no frame can be decoded
+    """
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if width > 0 and height > 0:
+        return width, height
+    position = cap.get(cv2.CAP_PROP_POS_FRAMES)
+    ok, frame = cap.read()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+    return (frame.shape[1], frame.shape[0]) if ok else (0, 0)
+
+
+class Letterbox(NamedTuple):
+    """How the frames of a video fit in the model input, like YOLOv5 does it
+
+    The frames are resized (bilinear, like the YOLOv5 letterbox), keeping their
+    aspect ratio, so their longest side is the model size, and padded (centered,
+    gray) to a multiple of the model stride.
+    """
+    frame_width: int
+    frame_height: int
+    scale: float  # resized / original
+    width: int  # of the resized frame
+    height: int
+    left: int  # padding before the resized frame
+    top: int
+    input_width: int  # of the model input
+    input_height: int
+
+    def resize(self, frame: np.ndarray):
+        """Return the BGR frame resized (not padded) for the model input"""
+        if frame.shape[1] == self.width and frame.shape[0] == self.height:
+            return frame
+        return cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+
+    def fill(self, buffer: np.ndarray, resized: np.ndarray):
+        """Copy a resized BGR frame to the middle of an input buffer, as RGB
+
+        Args:
+            buffer (np.ndarray): (input_height, input_width, 3) uint8 RGB buffer,
+                its padding is left as it is
+            resized (np.ndarray): Frame returned by `resize`
+        """
+        np.copyto(buffer[self.top:self.top + self.height, self.left:self.left + self.width],
+                  resized[:, :, ::-1])
+
+    def buffer(self, batch_size: int):
+        """Return a (batch_size, input_height, input_width, 3) input buffer, gray padded"""
+        return np.full((batch_size, self.input_height, self.input_width, 3), 114, np.uint8)
+
+
+def letterbox(frame_width: int, frame_height: int, size: int, stride: int = 32):
+    """Return how frames of a size fit in a model input of `size`
+
+    Args:
+        frame_width (int): Width of the frames
+        frame_height (int): Height of the frames
+        size (int): Size of the longest side of the model input
+        stride (int, optional): The sides of the input are multiples of it, the
+            largest stride of the model (see `model_stride`, 64 for the P6 models).
+            Defaults to 32, the one of the P5 models.
+
+    Returns:
+        Letterbox: Sizes and padding of the frames in the input
+    """
+    if frame_width <= 0 or frame_height <= 0:
+        raise ValueError(f"Frames of {frame_width}x{frame_height} can not be letterboxed, "
+                         "see `get_frame_size`")
+    scale = size / max(frame_width, frame_height)
+    width = max(1, round(frame_width * scale))
+    height = max(1, round(frame_height * scale))
+    input_width = -(-width // stride) * stride
+    input_height = -(-height // stride) * stride
+    return Letterbox(frame_width, frame_height, scale, width, height, (input_width - width) // 2,
+                     (input_height - height) // 2, input_width, input_height)
+
+
+class _DecodeError:
+    """Carries an exception raised in the decoder thread to the consumer"""
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+_EOF = object()  # sentinel put in the queue when there are no more frames
+
+
+def prefetch_frames(cap: cv2.VideoCapture, n_frames: int, queue_size: int = 8,
+                    stride: int = 1, transform=None):
+    """Yield up to `n_frames` frames decoded ahead of time by a background thread
+
+    A decoder thread reads the frames from `cap` and puts them in a bounded queue
+    while the caller consumes them, so decoding overlaps with whatever is done
+    with the frames (e.g. inference). The decoder never gets more than `queue_size`
+    frames ahead, which bounds the memory used.
+
+    The iteration stops at the end of the video (or after `n_frames`). An exception
+    raised while decoding is re-raised in the caller. If the caller stops early or
+    fails, closing the generator stops and joins the decoder thread.
+
+    With a `stride` k > 1 only every k-th frame (0, k, 2k, ...) is decoded. The
+    frames in between are just grabbed (skipping the color conversion) and yielded
+    as None, so the caller still gets one item per frame of the video.
+
+    A `transform` (e.g. `Letterbox.resize`) is applied to the decoded frames in
+    the decoder thread, so it overlaps with the caller too, and the queue holds
+    the transformed frames.
+
+    Args:
+        cap (cv2.VideoCapture): Opened video capture. It should not be used by anyone
+            else until the generator is exhausted or closed.
+        n_frames (int): Maximum number of frames to read
+        queue_size (int, optional): Maximum number of decoded frames waiting to be
+            consumed. Defaults to 8.
+        stride (int, optional): Decode only every `stride`-th frame. Defaults to 1.
+        transform (Callable[[np.ndarray], np.ndarray], optional): Applied to each
+            decoded frame. Defaults to None.
+
+    Yields:
+        np.ndarray | None: The decoded BGR frames (transformed), in order. None for
+            the frames skipped by the stride.
+    """
+    frames = Queue(maxsize=max(1, queue_size))
+    stop = Event()
+
+    def put(item):
+        # Do not block forever if the consumer is gone
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def decode():
+        try:
+            for idx in range(n_frames):
+                if idx % stride:
+                    ok, frame = cap.grab(), None
+                else:
+                    ok, frame = cap.read()
+                    if ok and transform is not None:
+                        frame = transform(frame)
+                if not ok or not put(frame):
+                    break
+        except BaseException as exc:
+            put(_DecodeError(exc))
+        finally:
+            put(_EOF)
+
+    decoder = Thread(target=decode, name="frame-decoder", daemon=True)
+    decoder.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is _EOF:
+                return
+            if isinstance(item, _DecodeError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        decoder.join()